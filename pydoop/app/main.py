@@ -30,6 +30,7 @@ from pydoop.version import version
 
 SUBMOD_NAMES = [
     "script",
+    "stacks",
     "submit",
 ]
 
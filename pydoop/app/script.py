@@ -106,6 +106,8 @@ class PydoopScript(object):
         args.keep_wd = False
         args.pstats_dir = None
         args.pstats_fmt = None
+        args.profile_phases = False
+        args.profile_sample = None
 
         self.args, self.unknown_args = args, unknown_args
 
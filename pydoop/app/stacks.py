@@ -0,0 +1,82 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright 2009-2024 CRS4.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""
+Merge the sampling profiles of a job's tasks.
+
+When a job is submitted with ``--profile-sample``, each task stores its
+samples in the pstats dir in the collapsed stacks format. This tool merges
+them into a single profile that can be fed to flame graph tools.
+"""
+
+import argparse
+import fnmatch
+import sys
+
+import pydoop.hdfs as hdfs
+from pydoop.mapreduce.profiling import dump_stacks, load_stacks
+
+DESCRIPTION = "Merge per-task sampling profiles into a single one"
+
+
+def merge(pstats_dir, pattern="*.stacks"):
+    counts = {}
+    for path in sorted(hdfs.ls(pstats_dir)):
+        if not fnmatch.fnmatch(hdfs.path.basename(path), pattern):
+            continue
+        load_stacks(hdfs.load(path, mode="rt").splitlines(), counts)
+    return counts
+
+
+def run(args, unknown_args=None):
+    counts = merge(args.pstats_dir, args.pattern)
+    if not counts:
+        raise RuntimeError("no samples found in %s" % args.pstats_dir)
+    if args.output:
+        with open(args.output, "w") as f:  # dump_stacks writes native str
+            dump_stacks(counts, f)
+    else:
+        dump_stacks(counts, sys.stdout)
+    return 0
+
+
+def add_parser_arguments(parser):
+    parser.add_argument(
+        'pstats_dir', metavar='PSTATS_DIR',
+        help="dir where task profiles are stored (i.e., --pstats-dir)"
+    )
+    parser.add_argument(
+        '-p', '--pattern', metavar='PATTERN', default="*.stacks",
+        help=("only merge profiles whose name matches this shell pattern "
+              "(e.g., 'm_*.stacks' for map tasks)")
+    )
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help="write merged profile to this (local) file instead of stdout"
+    )
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        "stacks",
+        description=DESCRIPTION,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    add_parser_arguments(parser)
+    parser.set_defaults(func=run)
+    return parser
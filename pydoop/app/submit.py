@@ -34,7 +34,10 @@ import pydoop.hadut as hadut
 import pydoop.utils as utils
 import pydoop.utils.conversion_tables as conv_tables
 from pydoop.mapreduce.api import AVRO_IO_MODES
-from pydoop.mapreduce.pipes import PSTATS_DIR, PSTATS_FMT
+from pydoop.mapreduce.pipes import (
+    PROFILE_PHASES, PSTATS_DIR, PSTATS_FMT, SAMPLE_INTERVAL
+)
+from pydoop.mapreduce.profiling import DEFAULT_SAMPLE_INTERVAL
 
 from .argparse_types import a_file_that_can_be_read, UpdateMap
 from .argparse_types import a_comma_separated_list, a_hdfs_file
@@ -221,6 +224,10 @@ class PydoopSubmitter(object):
             env[PSTATS_DIR] = self.args.pstats_dir
             if self.args.pstats_fmt:
                 env[PSTATS_FMT] = self.args.pstats_fmt
+        if self.args.profile_phases:
+            env[PROFILE_PHASES] = "1"
+        if self.args.profile_sample:
+            env[SAMPLE_INTERVAL] = str(self.args.profile_sample)
 
         executable = self.args.python_program
         if self.args.python_zip:
@@ -270,7 +277,8 @@ class PydoopSubmitter(object):
         return os.linesep.join(lines) + os.linesep
 
     def __validate(self):
-        if not hdfs.path.exists(self.args.input):
+        # the input path can be a glob pattern, as in Hadoop
+        if next(hdfs.iglob(self.args.input), None) is None:
             raise RuntimeError(
                 "Input path %r does not exist" % (self.args.input,)
             )
@@ -542,6 +550,19 @@ def add_parser_arguments(parser):
         '--pstats-fmt', metavar="STRING", type=str,
         help="pstats filename pattern (expert use only)"
     )
+    parser.add_argument(
+        '--profile-phases', action='store_true',
+        help=("Time each task phase and report it via counters (if "
+              "--pstats-dir is set, store JSON summaries there instead of "
+              "cProfile stats)")
+    )
+    parser.add_argument(
+        '--profile-sample', metavar="SECONDS", type=float, nargs='?',
+        const=DEFAULT_SAMPLE_INTERVAL,
+        help=("Use a statistical profiler (sampling every SECONDS of CPU "
+              "time) instead of cProfile and store collapsed stacks in the "
+              "--pstats-dir")
+    )
     parser.add_argument(
         '--keep-wd', action='store_true', help="Don't remove the work dir"
     )
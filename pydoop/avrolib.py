@@ -135,6 +135,9 @@ class AvroReader(RecordReader):
 class AvroWriter(RecordWriter):
 
     schema = None
+    # set to a positive value to overlap serialization with HDFS writes (see
+    # hdfs.fs.hdfs.open_file); write errors are then raised on close
+    max_inflight_bytes = 0
 
     def __init__(self, context):
         super(AvroWriter, self).__init__(context)
@@ -142,7 +145,7 @@ class AvroWriter(RecordWriter):
         part = int(job_conf['mapreduce.task.partition'])
         outdir = job_conf["mapreduce.task.output.dir"]
         outfn = "%s/part-r-%05d.avro" % (outdir, part)
-        wh = hdfs.open(outfn, "w")
+        wh = hdfs.open(outfn, "w", max_inflight_bytes=self.max_inflight_bytes)
         self.writer = DataFileWriter(wh, DatumWriter(), self.schema)
 
     def close(self):
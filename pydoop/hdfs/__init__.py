@@ -44,17 +44,24 @@ __all__ = [
     'reset',
     'hdfs',
     'default_is_local',
+    'session',
+    'enable_metadata_cache',
+    'disable_metadata_cache',
     'open',
     'dump',
     'load',
+    'parallel_read',
     'cp',
     'put',
     'get',
     'mkdir',
     'rm',
     'rmr',
+    'walk',
     'lsl',
     'ls',
+    'glob',
+    'iglob',
     'chmod',
     'move',
     'chown',
@@ -67,7 +74,14 @@ __all__ = [
 ]
 
 
+import collections
+import fnmatch
+import io
+import itertools
 import os
+import re
+import socket
+import time
 
 import pydoop
 from . import common, path
@@ -95,11 +109,16 @@ def reset():
 # ---------------------
 
 
-from .fs import hdfs, default_is_local
+from .fs import (
+    hdfs, default_is_local, session,
+    enable_metadata_cache, disable_metadata_cache,
+)
+from .fs import _project_info
 
 
 def open(hdfs_path, mode="r", buff_size=0, replication=0, blocksize=0,
-         user=None, encoding=None, errors=None):
+         user=None, encoding=None, errors=None, prefetch=0, mmap=False,
+         max_inflight_bytes=0):
     """
     Open a file, returning an :class:`~.file.hdfs_file` object.
 
@@ -110,7 +129,7 @@ def open(hdfs_path, mode="r", buff_size=0, replication=0, blocksize=0,
     host, port, path_ = path.split(hdfs_path, user)
     fs = hdfs(host, port, user)
     return fs.open_file(path_, mode, buff_size, replication, blocksize,
-                        encoding, errors)
+                        encoding, errors, prefetch, mmap, max_inflight_bytes)
 
 
 def dump(data, hdfs_path, **kwargs):
@@ -130,6 +149,12 @@ def dump(data, hdfs_path, **kwargs):
     fo.fs.close()
 
 
+# number of read-ahead chunks used by cp for sequential reads
+CP_PREFETCH = 4
+# bytes that cp can queue for background writing to HDFS
+CP_MAX_INFLIGHT_BYTES = 8 * 2**20
+
+
 def load(hdfs_path, **kwargs):
     """\
     Read the content of ``hdfs_path`` and return it.
@@ -149,16 +174,114 @@ def load(hdfs_path, **kwargs):
 def _cp_file(src_fs, src_path, dest_fs, dest_path, **kwargs):
     kwargs.pop("mode", None)
     kwargs["mode"] = "r"
-    with src_fs.open_file(src_path, **kwargs) as fi:
+    prefetch = kwargs.pop("prefetch", CP_PREFETCH)
+    inflight = kwargs.pop("max_inflight_bytes", CP_MAX_INFLIGHT_BYTES)
+    size = 0
+    with src_fs.open_file(src_path, prefetch=prefetch, **kwargs) as fi:
         kwargs["mode"] = "w"
-        with dest_fs.open_file(dest_path, **kwargs) as fo:
+        with dest_fs.open_file(dest_path, max_inflight_bytes=inflight,
+                               **kwargs) as fo:
             bufsize = common.BUFSIZE
             while 1:
                 chunk = fi.read(bufsize)
                 if chunk:
                     fo.write(chunk)
+                    size += len(chunk)
                 else:
                     break
+    return size
+
+
+# parallel copy: default size of the byte ranges large files are split into
+# (when copying to the local fs) and buffer size for each range copy
+DEFAULT_CP_CHUNK_SIZE = 128 * 2**20
+CP_RANGE_BUFSIZE = 2**20
+
+
+def _cp_range(src_fs, src_path, dest_path, offset, length):
+    # dest_path is a local file, already created with the right size
+    end = offset + length
+    buf = memoryview(bytearray(min(CP_RANGE_BUFSIZE, length)))
+    fd = os.open(dest_path, os.O_WRONLY)
+    try:
+        with src_fs.open_file(src_path, "r") as fi:
+            while offset < end:
+                n = fi.pread_chunk(offset, buf[:min(len(buf), end - offset)])
+                if n <= 0:
+                    raise IOError("%r: unexpected EOF at %d" % (
+                        src_path, offset
+                    ))
+                written = 0
+                while written < n:
+                    written += os.pwrite(fd, buf[written:n], offset + written)
+                offset += n
+    finally:
+        os.close(fd)
+    return length
+
+
+def _plan_cp(src_fs, src_path, dest_fs, dest_path):
+    """\
+    Resolve the destination (like :func:`cp` does), create all destination
+    directories and return a list of ``(src, dest, size)`` file copies.
+    """
+    try:
+        info = src_fs.get_path_info(src_path)
+    except IOError:
+        raise IOError("no such file or directory: %r" % (src_path))
+    if dest_fs.exists(dest_path):
+        if dest_fs.get_path_info(dest_path)["kind"] == "file":
+            raise IOError("%r already exists" % (dest_path))
+        dest_path = path.join(dest_path, path.basename(src_path))
+        if dest_fs.exists(dest_path):
+            raise IOError("%r already exists" % (dest_path))
+    if info["kind"] == "file":
+        return [(src_path, dest_path, info["size"])]
+    files, dirs = [], [(src_path, dest_path)]
+    while dirs:
+        s, d = dirs.pop()
+        dest_fs.create_directory(d)
+        for item in src_fs.list_directory(s):
+            item_path = path.split(item["name"])[2]
+            item_dest = path.join(d, path.basename(item_path))
+            if item["kind"] == "file":
+                files.append((item_path, item_dest, item["size"]))
+            else:
+                dirs.append((item_path, item_dest))
+    return files
+
+
+def _parallel_cp(src_fs, src_path, dest_fs, dest_path, workers,
+                 chunk_size=DEFAULT_CP_CHUNK_SIZE, **kwargs):
+    from multiprocessing.pool import ThreadPool
+    start = time.time()
+    files = _plan_cp(src_fs, src_path, dest_fs, dest_path)
+    split = not dest_fs.host and hasattr(os, "pwrite")
+    tasks = []
+    for s, d, size in files:
+        if split and size > chunk_size:
+            with io.open(d, "wb") as f:
+                f.truncate(size)
+            for offset in range(0, size, chunk_size):
+                tasks.append((_cp_range, (
+                    src_fs, s, d, offset, min(chunk_size, size - offset)
+                ), {}))
+        else:
+            tasks.append((_cp_file, (src_fs, s, dest_fs, d), kwargs))
+    pool = ThreadPool(workers)
+    try:
+        nbytes = sum(pool.imap_unordered(lambda t: t[0](*t[1], **t[2]), tasks))
+    finally:
+        pool.terminate()
+        pool.join()
+        dest_fs._invalidate(dest_path)  # ranges are written directly
+    elapsed = time.time() - start
+    return {
+        "files": len(files),
+        "bytes": nbytes,
+        "seconds": elapsed,
+        "throughput": nbytes / elapsed if elapsed > 0 else 0.0,
+    }
 
 
 def cp(src_hdfs_path, dest_hdfs_path, **kwargs):
@@ -168,13 +291,29 @@ def cp(src_hdfs_path, dest_hdfs_path, **kwargs):
     If ``src_hdfs_path`` is a directory, its contents will be copied
     recursively. Source file(s) are opened for reading and copies are
     opened for writing. Additional keyword arguments, if any, are
-    handled like in :func:`open`.
+    handled like in :func:`open`. Unless otherwise specified, source files
+    are read with ``prefetch=CP_PREFETCH`` and HDFS copies are written
+    with ``max_inflight_bytes=CP_MAX_INFLIGHT_BYTES``.
+
+    If the ``workers`` keyword argument is set to a positive integer, the
+    source tree is walked once and files are copied concurrently by that
+    many threads. When copying to the local file system, files larger than
+    ``chunk_size`` bytes (default: 128 MiB) are further split into byte
+    ranges that are copied in parallel. In this mode, the return value is
+    a dictionary with the number of ``files`` and ``bytes`` copied, the
+    elapsed time in ``seconds`` and the aggregated ``throughput`` (in bytes
+    per second).
     """
+    workers = kwargs.pop("workers", None)
     src, dest = {}, {}
     try:
         for d, p in ((src, src_hdfs_path), (dest, dest_hdfs_path)):
             d["host"], d["port"], d["path"] = path.split(p)
             d["fs"] = hdfs(d["host"], d["port"])
+        if workers:
+            return _parallel_cp(src["fs"], src["path"], dest["fs"],
+                                dest["path"], workers, **kwargs)
+        kwargs.pop("chunk_size", None)
         # --- does src exist? ---
         try:
             src["info"] = src["fs"].get_path_info(src["path"])
@@ -241,6 +380,146 @@ def get(src_hdfs_path, dest_path, **kwargs):
     cp(src_hdfs_path, path.abspath(dest_path, local=True), **kwargs)
 
 
+# parallel read: default number of threads
+PARALLEL_READ_WORKERS = 4
+
+
+def _local_hosts():
+    hosts = set(["localhost", "127.0.0.1"])
+    for name in socket.gethostname(), socket.getfqdn():
+        hosts.add(name.lower())
+        try:
+            hosts.add(socket.gethostbyname(name))
+        except socket.error:
+            pass
+    return hosts
+
+
+def _plan_read(fs, path_):
+    """\
+    Split ``path_`` on block boundaries. Return the ``(offset, length)``
+    ranges, the order in which to read them (blocks with no local replica
+    first, since they are the slowest to read) and the file size. Only the
+    order is affected: the HDFS client chooses which replica to read.
+    """
+    info = fs.get_path_info(path_)
+    if info["kind"] != "file":
+        raise IOError("%r is not a file" % (path_,))
+    size = info["size"]
+    bs = info["block_size"] or size or 1
+    ranges = [(off, min(bs, size - off)) for off in range(0, size, bs)]
+    order = list(range(len(ranges)))
+    if fs.host and ranges:
+        hosts = fs.get_hosts(path_, 0, size)
+        if len(hosts) == len(ranges):
+            local = _local_hosts()
+            order.sort(key=lambda i: any(
+                h.lower() in local for h in hosts[i]
+            ))
+    return ranges, order, size
+
+
+def _read_range(fs, path_, offset, length, buf=None):
+    # each range gets its own stream, so reads don't contend on one handle
+    with fs.open_file(path_, "r") as fi:
+        if buf is None:
+            data = fi.pread(offset, length)
+            while len(data) < length:
+                more = fi.pread(offset + len(data), length - len(data))
+                if not more:
+                    raise IOError("%r: unexpected EOF at %d" % (
+                        path_, offset + len(data)
+                    ))
+                data += more
+            return data
+        done = 0
+        while done < length:
+            n = fi.pread_chunk(offset + done, buf[done: length])
+            if n <= 0:
+                raise IOError("%r: unexpected EOF at %d" % (
+                    path_, offset + done
+                ))
+            done += n
+        return done
+
+
+def _iter_blocks(hdfs_path, workers, user):
+    from multiprocessing.pool import ThreadPool
+    host, port, path_ = path.split(hdfs_path, user)
+    fs = hdfs(host, port, user)
+    try:
+        ranges = iter(_plan_read(fs, path_)[0])
+        pool = ThreadPool(workers)
+        try:
+            # keep at most ``workers`` blocks in flight, yield them in order
+            pending = collections.deque(
+                pool.apply_async(_read_range, (fs, path_) + r)
+                for r in itertools.islice(ranges, workers)
+            )
+            while pending:
+                data = pending.popleft().get()
+                for r in itertools.islice(ranges, 1):
+                    pending.append(
+                        pool.apply_async(_read_range, (fs, path_) + r)
+                    )
+                yield data
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        fs.close()
+
+
+def _read_blocks_into(hdfs_path, buffer, workers, user):
+    from multiprocessing.pool import ThreadPool
+    buffer = memoryview(buffer)
+    host, port, path_ = path.split(hdfs_path, user)
+    fs = hdfs(host, port, user)
+    try:
+        ranges, order, size = _plan_read(fs, path_)
+        if len(buffer) < size:
+            raise ValueError("buffer too small: %d < %d" % (
+                len(buffer), size
+            ))
+        pool = ThreadPool(workers)
+        try:
+            return sum(pool.imap_unordered(
+                lambda r: _read_range(
+                    fs, path_, r[0], r[1], buffer[r[0]: r[0] + r[1]]
+                ), [ranges[i] for i in order]
+            ))
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        fs.close()
+
+
+def parallel_read(hdfs_path, workers=None, buffer=None, user=None):
+    """\
+    Read ``hdfs_path`` with up to ``workers`` threads (default:
+    ``PARALLEL_READ_WORKERS``).
+
+    The file is split on block boundaries and blocks are read
+    concurrently, each through its own stream. Replica selection is left
+    to the HDFS client, which reads each block from the closest DataNode
+    that holds a replica (a local one, if any): libhdfs offers no way to
+    pick a DataNode. Block locations (see :meth:`~.fs.hdfs.get_hosts`)
+    only affect the scheduling order: blocks that have no local replica
+    are started first, since they take longest.
+
+    If ``buffer`` is :obj:`None`, return an iterator over the file's
+    blocks, in order. At most ``workers`` blocks are held in memory at
+    any time. Otherwise, ``buffer`` must be a writable byte buffer (e.g.,
+    a :class:`bytearray`) at least as large as the file: the content is
+    read directly into it and the number of bytes read is returned.
+    """
+    workers = workers or PARALLEL_READ_WORKERS
+    if buffer is None:
+        return _iter_blocks(hdfs_path, workers, user)
+    return _read_blocks_into(hdfs_path, buffer, workers, user)
+
+
 def mkdir(hdfs_path, user=None):
     """
     Create a directory and its parents as needed.
@@ -271,7 +550,24 @@ def rmr(hdfs_path, user=None):
     return rm(hdfs_path, recursive=True, user=user)
 
 
-def lsl(hdfs_path, user=None, recursive=False):
+def walk(hdfs_path, user=None, **kwargs):
+    """
+    Generate infos for all paths in the tree rooted at ``hdfs_path``.
+
+    This is a streaming version of :func:`lsl` with ``recursive=True``:
+    the filesystem stays open until the generator is exhausted or closed.
+    Keyword arguments are passed to :meth:`.fs.hdfs.walk`.
+    """
+    host, port, path_ = path.split(hdfs_path, user)
+    fs = hdfs(host, port, user)
+    try:
+        for info in fs.walk(path_, **kwargs):
+            yield info
+    finally:
+        fs.close()
+
+
+def lsl(hdfs_path, user=None, recursive=False, fields=None):
     """
     Return a list of dictionaries of file properties.
 
@@ -280,21 +576,25 @@ def lsl(hdfs_path, user=None, recursive=False):
     :obj:`False`, each list item corresponds to a file or directory
     contained by it; if it is a directory and ``recursive`` is
     :obj:`True`, the list contains one item for every file or directory
-    in the tree rooted at ``hdfs_path``.
+    in the tree rooted at ``hdfs_path`` (see :func:`walk`).
+
+    If ``fields`` is not :obj:`None`, list items are tuples with only the
+    requested properties instead of dictionaries (see
+    :meth:`.fs.hdfs.list_directory`).
     """
     host, port, path_ = path.split(hdfs_path, user)
     fs = hdfs(host, port, user)
-    if not recursive:
-        dir_list = fs.list_directory(path_)
-    else:
-        treewalk = fs.walk(path_)
-        top = next(treewalk)
-        if top['kind'] == 'directory':
-            dir_list = list(treewalk)
-        else:
-            dir_list = [top]
-    fs.close()
-    return dir_list
+    try:
+        if not recursive:
+            return fs.list_directory(path_, fields=fields)
+        top = fs.get_path_info(path_)
+        if top['kind'] != 'directory':
+            return [top if fields is None else _project_info(top, fields)]
+        treewalk = fs.walk(top, fields=fields)
+        next(treewalk)  # skip top itself
+        return list(treewalk)
+    finally:
+        fs.close()
 
 
 def ls(hdfs_path, user=None, recursive=False):
@@ -304,8 +604,99 @@ def ls(hdfs_path, user=None, recursive=False):
     Works in the same way as :func:`lsl`, except for the fact that list
     items are hdfs paths instead of dictionaries of properties.
     """
-    dir_list = lsl(hdfs_path, user, recursive)
-    return [d["name"] for d in dir_list]
+    dir_list = lsl(hdfs_path, user, recursive, fields=("name",))
+    return [d[0] for d in dir_list]
+
+
+_GLOB_MAGIC = re.compile(r"[*?[]")
+
+
+def _list_for_glob(fs, dir_path):
+    try:
+        return fs.list_directory(dir_path, fields=("name", "kind"))
+    except IOError:
+        return []
+
+
+def iglob(pattern, user=None, workers=None):
+    """
+    Return an iterator over the paths matching ``pattern``.
+
+    Each path component of ``pattern`` may contain :mod:`fnmatch` style
+    wildcards (e.g., ``/data/2026-10-*/part-*``). The pattern is expanded
+    one component at a time, so that only directories matching the
+    pattern so far are listed, and components without wildcards are
+    checked with a single :meth:`~.fs.hdfs.get_path_infos` call per
+    level. If ``workers`` is greater than 1, directories at the same level
+    are listed concurrently by that many threads. Directories that cannot
+    be listed are silently skipped.
+
+    Matching paths are generated as fully qualified names.
+    """
+    host, port, path_ = path.split(pattern, user)
+    parts = [_ for _ in path_.split("/") if _]
+    i = 0
+    while i < len(parts) and not _GLOB_MAGIC.search(parts[i]):
+        i += 1
+    base = "/".join(parts[:i])
+    if path_.startswith("/"):
+        base = "/" + base
+    fs = hdfs(host, port, user)
+    pool = None
+    try:
+        info = fs.get_path_infos([base or "."])[0]
+        if isinstance(info, Exception):
+            return
+        if i == len(parts):
+            yield info["name"]
+            return
+        if info["kind"] != "directory":
+            return
+        dirs = [info["name"]]
+        rest = parts[i:]
+        for j, comp in enumerate(rest):
+            if _GLOB_MAGIC.search(comp):
+                if workers and workers > 1 and len(dirs) > 1 and not pool:
+                    from multiprocessing.pool import ThreadPool
+                    pool = ThreadPool(workers)
+                if pool:
+                    listings = pool.imap(
+                        lambda d: _list_for_glob(fs, d), dirs
+                    )
+                else:
+                    listings = (_list_for_glob(fs, d) for d in dirs)
+                matches = (
+                    (name, kind) for listing in listings
+                    for name, kind in listing
+                    if fnmatch.fnmatchcase(name.rsplit("/", 1)[-1], comp)
+                )
+            else:
+                infos = fs.get_path_infos([path.join(d, comp) for d in dirs])
+                matches = (
+                    (_["name"], _["kind"]) for _ in infos
+                    if not isinstance(_, Exception)
+                )
+            if j == len(rest) - 1:
+                for name, _ in matches:
+                    yield name
+                return
+            dirs = [name for name, kind in matches if kind == "directory"]
+            if not dirs:
+                return
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+        fs.close()
+
+
+def glob(pattern, user=None, workers=None):
+    """
+    Return a list of paths matching ``pattern``.
+
+    See :func:`iglob`.
+    """
+    return list(iglob(pattern, user=user, workers=workers))
 
 
 def chmod(hdfs_path, mode, user=None):
@@ -0,0 +1,384 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright 2009-2024 CRS4.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""
+pydoop.hdfs.aio -- Asyncio Front-End
+------------------------------------
+
+Coroutine versions of the :mod:`pydoop.hdfs` handles. Blocking calls
+(connecting, metadata operations, file I/O) run on a dedicated thread
+pool with a bounded number of workers, so that the event loop is never
+stalled and the number of threads attached to the JVM stays under
+control. Since the native calls release the GIL, many requests can be in
+flight at the same time::
+
+  async with await aio.connect() as fs:
+      async with await fs.open_file("data.txt", "rt") as f:
+          async for line in f:
+              process(line)
+
+Connections go through the same cache as :class:`~.fs.hdfs`, so an async
+handle and a blocking one for the same host, port and user share the
+underlying file system instance. The underlying blocking objects are
+available as the ``blocking`` attribute.
+
+Requires Python 3.5 or later.
+"""
+
+import asyncio
+import functools
+import itertools
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import common, path
+from . import fs as hdfs_fs
+from .file import PREADV_MAX_GAP
+
+__all__ = [
+    'connect',
+    'open',
+    'hdfs',
+    'File',
+]
+
+# maximum number of threads in the default executor
+DEFAULT_MAX_WORKERS = 32
+
+# number of lines fetched by each executor call when iterating over a file
+LINE_BATCH_SIZE = 256
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _default_executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(DEFAULT_MAX_WORKERS)
+        return _EXECUTOR
+
+
+def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def _take(iterator, n):
+    return list(itertools.islice(iterator, n))
+
+
+def _chunks(f, size):
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class _AsyncIterator(object):
+    """\
+    Async iterator over a blocking one.
+
+    Items are fetched ``batch_size`` at a time by a single executor call,
+    since a round trip per item would cost much more than, e.g., reading
+    a line from a buffer.
+    """
+
+    def __init__(self, executor, iterator, batch_size=1):
+        self.executor = executor
+        self.iterator = iterator
+        self.batch_size = batch_size
+        self.__items = deque()
+        self.__exhausted = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.__items:
+            if self.__exhausted:
+                raise StopAsyncIteration
+            items = await _run(
+                self.executor, _take, self.iterator, self.batch_size
+            )
+            if len(items) < self.batch_size:
+                self.__exhausted = True
+            if not items:
+                raise StopAsyncIteration
+            self.__items.extend(items)
+        return self.__items.popleft()
+
+
+def _delegate(name):
+    async def method(self, *args, **kwargs):
+        return await self._run(getattr(self.blocking, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = (
+        "Coroutine version of :meth:`pydoop.hdfs.fs.hdfs.%s`." % name
+    )
+    return method
+
+
+async def connect(host="default", port=0, user=None, executor=None):
+    """\
+    Connect to an HDFS instance, returning an :class:`hdfs` handle.
+
+    Arguments other than ``executor`` have the same meaning as in
+    :class:`~.fs.hdfs`. Blocking calls are run by ``executor`` (a
+    :class:`concurrent.futures.Executor`); by default, a module-level
+    thread pool with at most :data:`DEFAULT_MAX_WORKERS` threads is used.
+    """
+    executor = executor or _default_executor()
+    fs = await _run(executor, hdfs_fs.hdfs, host, port, user)
+    return hdfs(fs, executor)
+
+
+async def open(hdfs_path, mode="r", buff_size=0, replication=0, blocksize=0,
+               user=None, encoding=None, errors=None, prefetch=0,
+               mmap=False, max_inflight_bytes=0, executor=None):
+    """\
+    Coroutine version of :func:`pydoop.hdfs.open`.
+
+    Returns a :class:`File`. The connection it opens is released when
+    the file is closed.
+    """
+    host, port, path_ = path.split(hdfs_path, user)
+    fs = await connect(host, port, user, executor=executor)
+    try:
+        f = await fs.open_file(path_, mode, buff_size, replication,
+                               blocksize, encoding, errors, prefetch, mmap,
+                               max_inflight_bytes)
+    except BaseException:
+        await fs.close()
+        raise
+    f.close_fs = True
+    return f
+
+
+class hdfs(object):
+    """\
+    Asynchronous handle to an HDFS instance.
+
+    Objects from this class should not be instantiated directly: use
+    :func:`connect`. Methods that talk to the file system are coroutines
+    with the same signature as their :class:`~.fs.hdfs` counterparts.
+    Handles can be used as async context managers, and are closed on exit.
+    """
+
+    def __init__(self, blocking, executor):
+        self.blocking = blocking
+        self.executor = executor
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _run(self, func, *args, **kwargs):
+        return _run(self.executor, func, *args, **kwargs)
+
+    @property
+    def host(self):
+        return self.blocking.host
+
+    @property
+    def port(self):
+        return self.blocking.port
+
+    @property
+    def user(self):
+        return self.blocking.user
+
+    @property
+    def closed(self):
+        return self.blocking.closed
+
+    async def close(self):
+        """
+        Close the HDFS handle (disconnect).
+        """
+        await self._run(self.blocking.close)
+
+    async def open_file(self, path, mode="r", buff_size=0, replication=0,
+                        blocksize=0, encoding=None, errors=None, prefetch=0,
+                        mmap=False, max_inflight_bytes=0):
+        """
+        Open a file, returning a :class:`File`. See
+        :meth:`~.fs.hdfs.open_file` for a description of the arguments.
+        """
+        f = await self._run(self.blocking.open_file, path, mode, buff_size,
+                            replication, blocksize, encoding, errors,
+                            prefetch, mmap, max_inflight_bytes)
+        return File(f, self)
+
+    async def copy(self, from_path, to_hdfs, to_path):
+        """
+        Coroutine version of :meth:`pydoop.hdfs.fs.hdfs.copy`.
+        ``to_hdfs`` can be either an async or a blocking handle.
+        """
+        to_hdfs = getattr(to_hdfs, "blocking", to_hdfs)
+        return await self._run(self.blocking.copy, from_path, to_hdfs,
+                               to_path)
+
+    async def move(self, from_path, to_hdfs, to_path):
+        """
+        Coroutine version of :meth:`pydoop.hdfs.fs.hdfs.move`.
+        ``to_hdfs`` can be either an async or a blocking handle.
+        """
+        to_hdfs = getattr(to_hdfs, "blocking", to_hdfs)
+        return await self._run(self.blocking.move, from_path, to_hdfs,
+                               to_path)
+
+    def walk(self, top, **kwargs):
+        """
+        Async iterator version of :meth:`pydoop.hdfs.fs.hdfs.walk`.
+        """
+        return _AsyncIterator(
+            self.executor, self.blocking.walk(top, **kwargs), 64
+        )
+
+    capacity = _delegate("capacity")
+    create_directory = _delegate("create_directory")
+    default_block_size = _delegate("default_block_size")
+    delete = _delegate("delete")
+    exists = _delegate("exists")
+    get_hosts = _delegate("get_hosts")
+    get_path_info = _delegate("get_path_info")
+    get_path_infos = _delegate("get_path_infos")
+    list_directory = _delegate("list_directory")
+    rename = _delegate("rename")
+    set_replication = _delegate("set_replication")
+    set_working_directory = _delegate("set_working_directory")
+    used = _delegate("used")
+    working_directory = _delegate("working_directory")
+    chown = _delegate("chown")
+    chmod = _delegate("chmod")
+    utime = _delegate("utime")
+
+
+class File(object):
+    """\
+    Asynchronous file object.
+
+    Objects from this class should not be instantiated directly: use
+    :meth:`hdfs.open_file` or :func:`open`. I/O methods are coroutines
+    with the same signature as their :class:`~.file.FileIO` counterparts.
+    Files can be used as async context managers, and iterated over with
+    ``async for`` (yielding lines, see :meth:`lines`).
+    """
+
+    def __init__(self, blocking, fs):
+        self.blocking = blocking
+        self.fs = fs
+        self.close_fs = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __aiter__(self):
+        return self.lines()
+
+    def _run(self, func, *args, **kwargs):
+        return self.fs._run(func, *args, **kwargs)
+
+    @property
+    def name(self):
+        return self.blocking.name
+
+    @property
+    def size(self):
+        return self.blocking.size
+
+    @property
+    def mode(self):
+        return self.blocking.mode
+
+    @property
+    def closed(self):
+        return self.blocking.closed
+
+    async def close(self):
+        """
+        Close the file (and the connection, if opened by :func:`open`).
+        """
+        try:
+            await self._run(self.blocking.close)
+        finally:
+            if self.close_fs and not self.fs.closed:
+                self.close_fs = False
+                await self.fs.close()
+
+    def lines(self, batch_size=LINE_BATCH_SIZE):
+        """
+        Return an async iterator over the file's lines. Lines are read
+        ``batch_size`` at a time.
+        """
+        return _AsyncIterator(self.fs.executor, iter(self.blocking),
+                              batch_size)
+
+    def chunks(self, size=common.BUFSIZE):
+        """
+        Return an async iterator over consecutive chunks of at most
+        ``size`` bytes (or characters, in text mode), up to EOF.
+        """
+        return _AsyncIterator(self.fs.executor, _chunks(self.blocking, size))
+
+    async def read(self, length=-1):
+        return await self._run(self.blocking.read, length)
+
+    async def readline(self):
+        return await self._run(self.blocking.readline)
+
+    async def pread(self, position, length):
+        return await self._run(self.blocking.pread, position, length)
+
+    async def preadv(self, ranges, buffers=None, max_gap=PREADV_MAX_GAP,
+                     threads=1):
+        return await self._run(self.blocking.preadv, ranges, buffers,
+                               max_gap, threads)
+
+    async def read_chunk(self, chunk):
+        return await self._run(self.blocking.read_chunk, chunk)
+
+    async def pread_chunk(self, position, chunk):
+        return await self._run(self.blocking.pread_chunk, position, chunk)
+
+    async def seek(self, position, whence=os.SEEK_SET):
+        return await self._run(self.blocking.seek, position, whence)
+
+    async def tell(self):
+        return await self._run(self.blocking.tell)
+
+    async def available(self):
+        return await self._run(self.blocking.available)
+
+    async def write(self, data):
+        return await self._run(self.blocking.write, data)
+
+    async def flush(self):
+        return await self._run(self.blocking.flush)
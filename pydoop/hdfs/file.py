@@ -24,8 +24,22 @@ pydoop.hdfs.file -- HDFS File Objects
 import os
 import io
 import codecs
+import mmap as _mmap
+import threading
+from collections import deque
+
+try:
+    import queue
+except ImportError:  # py2
+    import Queue as queue
 
 from pydoop.hdfs import common
+from pydoop.utils.py3compat import _is_py3
+
+PREADV_MAX_GAP = 64 * 1024
+PREFETCH_CHUNK_SIZE = 2**20
+# number of lines fetched at a time by the native line splitter
+LINE_BATCH_SIZE = 1024
 
 
 def _complain_ifclosed(closed):
@@ -33,6 +47,233 @@ def _complain_ifclosed(closed):
         raise ValueError("I/O operation on closed HDFS file object")
 
 
+class _PrefetchingReader(io.RawIOBase):
+    """\
+    Raw reader that keeps up to ``depth`` chunks in flight.
+
+    A background thread reads consecutive chunks with ``pread`` (which
+    releases the GIL and leaves the raw file's position alone) and queues
+    them, so that network I/O overlaps with the processing of previously
+    read data. Seeking to a different position restarts the read-ahead.
+    Everything other than reading and seeking is delegated to the raw file.
+    """
+
+    def __init__(self, raw, depth, chunk_size=PREFETCH_CHUNK_SIZE):
+        super(_PrefetchingReader, self).__init__()
+        self.raw = raw
+        self.depth = depth
+        self.chunk_size = chunk_size
+        self.__thread = None
+        self.__start(raw.tell())
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __start(self, pos):
+        self.__pos = pos
+        self.__chunk = memoryview(b"")
+        self.__eof = False
+        self.__queue = queue.Queue(self.depth)
+        self.__stop = threading.Event()
+        # The producer must not hold a reference to self, so that a reader
+        # that is never closed gets collected (and closed, which stops it).
+        self.__thread = threading.Thread(target=self.__run, args=(
+            self.raw, self.chunk_size, pos, self.__queue, self.__stop
+        ))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    @staticmethod
+    def __run(raw, chunk_size, pos, q, stop):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        try:
+            while not stop.is_set():
+                data = raw.pread(pos, chunk_size)
+                if not put(data) or not data:
+                    break
+                pos += len(data)
+        except Exception as e:
+            put(e)
+
+    def __shutdown(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        while self.__thread.is_alive():  # unblock the producer, if needed
+            try:
+                while True:
+                    self.__queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.__thread.join(0.01)
+        self.__thread = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        if not len(self.__chunk):
+            if self.__eof:
+                return 0
+            data = self.__queue.get()
+            if isinstance(data, Exception):
+                self.__eof = True
+                raise data
+            if not data:
+                self.__eof = True
+                return 0
+            self.__chunk = memoryview(data)
+        n = min(len(b), len(self.__chunk))
+        b[:n] = self.__chunk[:n]
+        self.__chunk = self.__chunk[n:]
+        self.__pos += n
+        return n
+
+    def readall(self):
+        # one native read into a single buffer beats reassembling chunks
+        self.__shutdown()
+        self.raw.seek(self.__pos)
+        data = self.raw.readall()
+        self.__pos += len(data)
+        self.__chunk = memoryview(b"")
+        self.__eof = True
+        return data
+
+    def tell(self):
+        return self.__pos
+
+    def seek(self, position, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            position, whence = self.__pos + position, os.SEEK_SET
+        position = self.raw.seek(position, whence)  # validate
+        if position != self.__pos:
+            self.__shutdown()
+            self.__start(position)
+        return position
+
+    def close(self):
+        if not self.closed:
+            self.__shutdown()
+            self.raw.close()
+        super(_PrefetchingReader, self).close()
+
+
+class _BackgroundWriter(io.RawIOBase):
+    """\
+    Raw writer that hands data over to a background thread.
+
+    ``write`` queues a copy of the data and returns at once, unless more
+    than ``max_inflight`` bytes are already queued, in which case it blocks
+    until the background thread has written enough of them. Since the raw
+    file's ``write`` releases the GIL, the application thread can produce
+    more data while the previous one goes through the HDFS pipeline. Write
+    errors are raised by the next write, flush or close.
+    """
+
+    def __init__(self, raw, max_inflight):
+        super(_BackgroundWriter, self).__init__()
+        self.raw = raw
+        self.max_inflight = max_inflight
+        self.__pos = raw.tell()
+        self.__queue = deque()
+        self.__inflight = 0
+        self.__error = None
+        self.__done = False
+        self.__cond = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __run(self):
+        cond = self.__cond
+        while True:
+            with cond:
+                while not self.__queue and not self.__done:
+                    cond.wait()
+                if not self.__queue:
+                    return
+                data = self.__queue[0]
+            try:
+                view = memoryview(data)
+                while len(view):
+                    n = self.raw.write(view)
+                    if n <= 0:
+                        raise IOError("short write to %s" % self.raw.name)
+                    view = view[n:]
+            except Exception as e:
+                with cond:
+                    self.__error = e
+                    self.__queue.clear()
+                    self.__inflight = 0
+                    cond.notify_all()
+                return
+            with cond:
+                self.__queue.popleft()
+                self.__inflight -= len(data)
+                cond.notify_all()
+
+    def __check(self):
+        if self.__error is not None:
+            raise self.__error
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        # b may be a view of the buffered writer's own buffer
+        data = memoryview(b).tobytes()
+        n = len(data)
+        with self.__cond:
+            # a single write larger than the limit goes through alone
+            while (self.__inflight and self.__error is None and
+                   self.__inflight + n > self.max_inflight):
+                self.__cond.wait()
+            self.__check()
+            if n:
+                self.__queue.append(data)
+                self.__inflight += n
+                self.__cond.notify_all()
+        self.__pos += n
+        return n
+
+    def flush(self):
+        """\
+        Wait until all queued data has been written, then flush the raw file.
+        """
+        with self.__cond:
+            while self.__inflight and self.__error is None:
+                self.__cond.wait()
+            self.__check()
+        self.raw.flush()
+
+    def tell(self):
+        return self.__pos
+
+    def close(self):
+        if not self.closed:
+            try:
+                super(_BackgroundWriter, self).close()  # flushes
+            finally:
+                with self.__cond:
+                    self.__done = True
+                    self.__cond.notify_all()
+                self.__thread.join()
+                self.raw.close()
+
+
 class FileIO(object):
     """
     Instances of this class represent HDFS file objects.
@@ -44,7 +285,8 @@ class FileIO(object):
     ENCODING = "utf-8"
     ERRORS = "strict"
 
-    def __init__(self, raw_hdfs_file, fs, mode, encoding=None, errors=None):
+    def __init__(self, raw_hdfs_file, fs, mode, encoding=None, errors=None,
+                 prefetch=0, max_inflight_bytes=0):
         self.mode = mode
         self.base_mode, is_text = common.parse_mode(self.mode)
         self.buff_size = raw_hdfs_file.buff_size
@@ -66,6 +308,19 @@ class FileIO(object):
                 raise ValueError("binary mode doesn't take an errors argument")
             self.__encoding = self.__errors = None
         cls = io.BufferedReader if self.base_mode == "r" else io.BufferedWriter
+        # line reading bypasses the buffered reader, see __next_line
+        self.__native_lines = (
+            self.base_mode == "r" and prefetch <= 0 and
+            hasattr(raw_hdfs_file, "readlines_batch")
+        )
+        self.__lines = deque()
+        self.__raw_moved = False
+        if prefetch > 0 and self.base_mode == "r":
+            raw_hdfs_file = _PrefetchingReader(raw_hdfs_file, prefetch)
+        if max_inflight_bytes > 0 and self.base_mode != "r":
+            raw_hdfs_file = _BackgroundWriter(
+                raw_hdfs_file, max_inflight_bytes
+            )
         self.f = cls(raw_hdfs_file, buffer_size=self.buff_size)
         self.__fs = fs
         info = fs.get_path_info(self.f.raw.name)
@@ -104,6 +359,35 @@ class FileIO(object):
     def writable(self):
         return self.f.raw.writable()
 
+    def __next_line(self):
+        # The raw file splits lines natively, in batches, from its own
+        # buffer. Data held by the buffered reader is handed over to the
+        # raw file first.
+        if not self.__lines:
+            raw = self.f.raw
+            if not self.__raw_moved:
+                buffered = raw.tell() - self.f.tell()
+                if buffered > 0:
+                    raw.unread(self.f.read(buffered))
+                self.__raw_moved = True
+            self.__lines.extend(raw.readlines_batch(LINE_BATCH_SIZE))
+            if not self.__lines:
+                return b""
+        return self.__lines.popleft()
+
+    def _sync(self):
+        """\
+        Give back lines fetched in advance, so that the buffered reader and
+        the raw file agree on the current position. Must be called before
+        anything that reads or seeks.
+        """
+        if self.__lines:
+            self.f.raw.unread(b"".join(self.__lines))
+            self.__lines.clear()
+        if self.__raw_moved:
+            self.f.tell()  # refresh the buffered reader's raw position
+            self.__raw_moved = False
+
     def readline(self):
         """
         Read and return a line of text.
@@ -113,7 +397,10 @@ class FileIO(object):
           newline character
         """
         _complain_ifclosed(self.closed)
-        line = self.f.readline()
+        if self.__native_lines:
+            line = self.__next_line()
+        else:
+            line = self.f.readline()
         if self.__encoding:
             return line.decode(self.__encoding, self.__errors)
         else:
@@ -138,8 +425,26 @@ class FileIO(object):
         return line
 
     def __iter__(self):
+        if self.__native_lines:
+            return self.__iter_lines()
         return self
 
+    def __iter_lines(self):
+        lines = self.__lines
+        encoding, errors = self.__encoding, self.__errors
+        while True:
+            if not lines:
+                _complain_ifclosed(self.closed)
+                line = self.__next_line()  # refills the batch
+                if not line:
+                    return
+                lines.appendleft(line)
+            while lines:
+                if encoding:
+                    yield lines.popleft().decode(encoding, errors)
+                else:
+                    yield lines.popleft()
+
     def available(self):
         """
         Number of bytes that can be read from this input stream without
@@ -149,6 +454,7 @@ class FileIO(object):
         :return: available bytes
         """
         _complain_ifclosed(self.closed)
+        self._sync()
         return self.f.raw.available()
 
     def close(self):
@@ -157,8 +463,10 @@ class FileIO(object):
         """
         if not self.closed:
             self.closed = True
+            self.__lines.clear()
             retval = self.f.close()
             if self.base_mode != "r":
+                self.fs._invalidate(self.name)
                 self.__size = self.fs.get_path_info(self.name)["size"]
             return retval
 
@@ -196,10 +504,17 @@ class FileIO(object):
         :return: the chunk of data read from the file
         """
         _complain_ifclosed(self.closed)
+        self._sync()
+        if length < 0:
+            # the raw file's readall fills a single buffer, sized from
+            # the file length, rather than joining a list of chunks
+            data = self.f.read()
+            if self.__encoding:
+                return data.decode(self.__encoding, self.__errors)
+            else:
+                return data
         # NOTE: libhdfs read stops at block boundaries: it is *essential*
         # to ensure that we actually read the required number of bytes.
-        if length < 0:
-            length = self.size
         chunks = []
         while 1:
             if length <= 0:
@@ -227,6 +542,7 @@ class FileIO(object):
           and ``os.SEEK_END`` (relative to the file's end).
         """
         _complain_ifclosed(self.closed)
+        self._sync()
         return self.f.seek(position, whence)
 
     def tell(self):
@@ -237,6 +553,7 @@ class FileIO(object):
         :return: current offset in bytes
         """
         _complain_ifclosed(self.closed)
+        self._sync()
         return self.f.tell()
 
     def write(self, data):
@@ -260,7 +577,10 @@ class FileIO(object):
         Force any buffered output to be written.
         """
         _complain_ifclosed(self.closed)
-        return self.f.flush()
+        retval = self.f.flush()
+        if self.base_mode != "r":
+            self.f.raw.flush()  # not done by the buffered writer
+        return retval
 
 
 class hdfs_file(FileIO):
@@ -283,6 +603,36 @@ class hdfs_file(FileIO):
             raise IOError("position cannot be past EOF")
         return self.f.raw.pread_chunk(position, chunk)
 
+    def preadv(self, ranges, buffers=None, max_gap=PREADV_MAX_GAP,
+               threads=1):
+        r"""
+        Read several ``(position, length)`` ranges with a single call.
+
+        Ranges that are less than ``max_gap`` bytes apart are merged and
+        read together, so that many small scattered reads (e.g., index or
+        footer lookups) cost a few round trips. All reads are done without
+        holding the GIL; if ``threads`` is greater than 1, (merged) ranges
+        are read in parallel by up to that many native threads. Ranges
+        that go past EOF are truncated, as in :meth:`pread`\ .
+
+        :type ranges: list
+        :param ranges: ``(position, length)`` pairs
+        :type buffers: list
+        :param buffers: if not :obj:`None`, a writable buffer for each
+          range, at least as large as the range's length
+        :type max_gap: int
+        :param max_gap: maximum distance between ranges that are merged
+        :type threads: int
+        :param threads: maximum number of reading threads
+        :rtype: list
+        :return: the data read for each range or, if ``buffers`` is given,
+          the number of bytes read into each buffer
+        """
+        _complain_ifclosed(self.closed)
+        return self.f.raw.preadv(
+            [tuple(_) for _ in ranges], buffers, max_gap, threads
+        )
+
     def read_chunk(self, chunk):
         r"""
         Works like :meth:`read`\ , but data is stored in the writable
@@ -295,6 +645,7 @@ class hdfs_file(FileIO):
         :return: the number of bytes read
         """
         _complain_ifclosed(self.closed)
+        self._sync()
         return self.f.readinto(chunk)
 
 
@@ -305,9 +656,16 @@ class local_file(io.FileIO):
     Object of this type have the same interface as :class:`FileIO` (and should
     also be obtained via higher level methods rather than instantiated
     directly), but act as handles to local files.
+
+    If ``mmap`` is :obj:`True` (read mode only), the file is memory-mapped
+    when opened: :meth:`pread` returns zero-copy slices of the mapping
+    (:class:`memoryview` objects, on Python 3) and :meth:`pread_chunk`
+    copies straight from it, without any seek or system call.
     """
-    def __init__(self, fs, name, mode):
+    def __init__(self, fs, name, mode, mmap=False):
         if not mode.startswith("r"):
+            if mmap:
+                raise ValueError("mmap is only supported in read mode")
             local_file.__make_parents(fs, name)
         super(local_file, self).__init__(name, mode)
         name = os.path.abspath(name)
@@ -315,6 +673,10 @@ class local_file(io.FileIO):
         self.__size = os.fstat(super(local_file, self).fileno()).st_size
         self.f = self
         self.buff_size = io.DEFAULT_BUFFER_SIZE
+        self.__map = self.__view = None
+        self.__mmap = mmap
+        if mmap:
+            self.as_buffer()
 
     @staticmethod
     def __make_parents(fs, name):
@@ -337,12 +699,43 @@ class local_file(io.FileIO):
         _complain_ifclosed(self.closed)
         return self.size
 
+    def as_buffer(self):
+        """\
+        Return the file's content as a read-only buffer backed by a memory
+        map (a :class:`memoryview` on Python 3). The file is mapped on the
+        first call; slices of the buffer stay valid after the file is
+        closed.
+        """
+        _complain_ifclosed(self.closed)
+        if self.__view is None:
+            if self.writable():
+                raise IOError("file is not open for reading")
+            if self.__size == 0:  # empty files can't be mapped
+                self.__view = memoryview(b"")
+            else:
+                self.__map = _mmap.mmap(
+                    self.fileno(), 0, access=_mmap.ACCESS_READ
+                )
+                self.__view = memoryview(self.__map) if _is_py3 else \
+                    self.__map
+        return self.__view
+
     def close(self):
-        if self.writable():
+        writable = self.writable()
+        if writable:
             self.flush()
             os.fsync(self.fileno())
             self.__size = os.fstat(self.fileno()).st_size
+        if self.__map is not None:
+            self.__view = None
+            try:
+                self.__map.close()
+            except BufferError:
+                pass  # slices still in use: released when they are
+            self.__map = None
         super(local_file, self).close()
+        if writable:
+            self.__fs._invalidate(self.name)
 
     def seek(self, position, whence=os.SEEK_SET):
         if position > self.__size:
@@ -363,11 +756,47 @@ class local_file(io.FileIO):
         self.seek(old_pos)
         return ret
 
+    def __check_position(self, position):
+        _complain_ifclosed(self.closed)
+        if position > self.__size:
+            raise IOError("position cannot be past EOF")
+        if position < 0:
+            raise IOError("position cannot be negative")
+
     def pread(self, position, length):
-        return self.__seek_and_read(position, length=length)
+        if not self.__mmap:
+            return self.__seek_and_read(position, length=length)
+        self.__check_position(position)
+        if length < 0:
+            length = self.__size - position
+        return self.__view[position: position + length]
 
     def pread_chunk(self, position, chunk):
-        return self.__seek_and_read(position, buf=chunk)
+        if self.__view is None:
+            return self.__seek_and_read(position, buf=chunk)
+        self.__check_position(position)
+        chunk = memoryview(chunk)
+        if _is_py3 and chunk.format != "B":
+            chunk = chunk.cast("B")
+        n = min(len(chunk), self.__size - position)
+        chunk[:n] = self.__view[position: position + n]
+        return n
+
+    def preadv(self, ranges, buffers=None, max_gap=PREADV_MAX_GAP,
+               threads=1):
+        # local reads are cheap: no merging and no threads
+        _complain_ifclosed(self.closed)
+        if buffers is None:
+            return [self.pread(min(p, self.size), l) for p, l in ranges]
+        if len(buffers) != len(ranges):
+            raise ValueError("buffers and ranges must have the same length")
+        rval = []
+        for (p, l), buf in zip(ranges, buffers):
+            buf = memoryview(buf)
+            if len(buf) < l:
+                raise ValueError("buffer is smaller than the requested range")
+            rval.append(self.pread_chunk(min(p, self.size), buf[:l]))
+        return rval
 
     def read_chunk(self, chunk):
         _complain_ifclosed(self.closed)
@@ -378,7 +807,7 @@ class TextIOWrapper(io.TextIOWrapper):
 
     def __getattr__(self, name):
         # there is no readinto method in text mode (strings are immutable)
-        if name.endswith("_chunk"):
+        if name.endswith("_chunk") or name in ("preadv", "as_buffer"):
             raise AttributeError("%r object has no attribute %r" % (
                 self.__class__.__name__, name
             ))
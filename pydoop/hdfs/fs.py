@@ -22,11 +22,18 @@ pydoop.hdfs.fs -- File System Handles
 """
 
 import os
+import errno
 import socket
 import getpass
 import re
 import operator as ops
 import io
+import copy
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import pydoop
 from . import common
@@ -60,6 +67,207 @@ def _complain_ifclosed(closed):
         raise ValueError("I/O operation on closed HDFS instance")
 
 
+class _Session(threading.local):
+
+    def __init__(self):
+        self.depth = 0
+        self.held = set()  # _FSStatus objects kept alive by the session
+
+
+_SESSION = _Session()  # sessions are per thread
+
+
+# guards the connection cache, aliases and reference counts
+_CACHE_LOCK = threading.RLock()
+
+
+def _release(status):
+    with _CACHE_LOCK:
+        status.refcount -= 1
+        if status.refcount == 0:
+            status.fs.close()
+            for k, s in list(hdfs._CACHE.items()):  # yes, we want a copy
+                if s.refcount == 0:
+                    del hdfs._CACHE[k]
+
+
+@contextmanager
+def session():
+    """\
+    Keep alive all connections opened within the ``with`` block.
+
+    Module-level helpers such as :func:`~pydoop.hdfs.path.exists` or
+    :func:`~pydoop.hdfs.mkdir` create an :class:`hdfs` instance and close it
+    on every call. Since instances connected to the same file system share
+    the underlying connection, which is only closed when the last one is,
+    this means connecting and disconnecting each time. In a session, the
+    first connection to each file system is held until the session ends,
+    so subsequent calls reuse it::
+
+      with hdfs.session():
+          missing = [p for p in paths if not hdfs.path.exists(p)]
+
+    Sessions can be nested: connections are released when the outermost
+    one ends. Sessions are per thread: only connections opened by the
+    thread that started the session are held.
+    """
+    _SESSION.depth += 1
+    try:
+        yield
+    finally:
+        _SESSION.depth -= 1
+        if not _SESSION.depth:
+            held, _SESSION.held = _SESSION.held, set()
+            for status in held:
+                _release(status)
+
+
+DEFAULT_METADATA_CACHE_TTL = 10  # seconds
+DEFAULT_METADATA_CACHE_SIZE = 10000
+_MISSING = object()
+
+
+def _project_info(info, fields):
+    try:
+        return tuple(info[_] for _ in fields)
+    except KeyError as e:
+        raise ValueError("Unknown path info field: %s" % e.args[0])
+
+
+def _is_not_found(e):
+    return isinstance(e, EnvironmentError) and e.errno == errno.ENOENT
+
+
+class _MetadataCache(object):
+    """\
+    LRU cache of path metadata, with expiration.
+
+    Keys are ``(fs_key, path, what)`` tuples, where ``path`` is absolute.
+    Keys are also indexed by ``(fs_key, path)``, and each indexed path is
+    linked to its parent, so that invalidation only visits the affected
+    entries.
+    """
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.__entries = OrderedDict()  # key: (expiration time, value)
+        self.__keys = {}  # (fs_key, path): set of keys
+        self.__children = {}  # (fs_key, path): set of indexed child paths
+        self.__lock = threading.Lock()
+
+    def __index(self, key):
+        fs_key, p = key[:2]
+        self.__keys.setdefault((fs_key, p), set()).add(key)
+        while True:
+            parent = posixpath.dirname(p)
+            if parent == p:
+                break
+            children = self.__children.setdefault((fs_key, parent), set())
+            if p in children:
+                break
+            children.add(p)
+            p = parent
+
+    def __drop(self, key):
+        del self.__entries[key]
+        fs_key, p = key[:2]
+        keys = self.__keys[(fs_key, p)]
+        keys.discard(key)
+        if keys:
+            return
+        del self.__keys[(fs_key, p)]
+        # unlink paths that no longer lead to any entry
+        while ((fs_key, p) not in self.__keys and
+               (fs_key, p) not in self.__children):
+            parent = posixpath.dirname(p)
+            if parent == p:
+                break
+            children = self.__children[(fs_key, parent)]
+            children.discard(p)
+            if not children:
+                del self.__children[(fs_key, parent)]
+            p = parent
+
+    def get(self, key):
+        with self.__lock:
+            try:
+                expires, value = self.__entries[key]
+            except KeyError:
+                return _MISSING
+            if expires < time.time():
+                self.__drop(key)
+                return _MISSING
+            self.__entries[key] = self.__entries.pop(key)  # most recently used
+            return value
+
+    def put(self, key, value):
+        with self.__lock:
+            if key in self.__entries:
+                self.__drop(key)
+            self.__entries[key] = (time.time() + self.ttl, value)
+            self.__index(key)
+            while len(self.__entries) > self.maxsize:
+                self.__drop(next(iter(self.__entries)))
+
+    def invalidate(self, fs_key, path):
+        """\
+        Drop entries for ``path``, its descendants and its ancestors.
+        """
+        with self.__lock:
+            paths = []
+            p = path
+            while True:
+                paths.append(p)
+                parent = posixpath.dirname(p)
+                if parent == p:
+                    break
+                p = parent
+            stack = list(self.__children.get((fs_key, path), ()))
+            while stack:
+                p = stack.pop()
+                paths.append(p)
+                stack.extend(self.__children.get((fs_key, p), ()))
+            for p in paths:
+                for key in list(self.__keys.get((fs_key, p), ())):
+                    self.__drop(key)
+
+
+_METADATA_CACHE = None
+
+
+def enable_metadata_cache(ttl=DEFAULT_METADATA_CACHE_TTL,
+                          maxsize=DEFAULT_METADATA_CACHE_SIZE):
+    """\
+    Cache path metadata queries for all :class:`hdfs` instances.
+
+    When the cache is enabled, results of :meth:`~hdfs.get_path_info`,
+    :meth:`~hdfs.get_path_infos`, :meth:`~hdfs.list_directory` and
+    :meth:`~hdfs.exists` (and thus of module-level helpers such as
+    :func:`~pydoop.hdfs.path.isdir` or :func:`~pydoop.hdfs.path.getsize`)
+    are kept for ``ttl`` seconds, up to ``maxsize`` entries (least recently
+    used ones are dropped first). Entries are invalidated when the
+    corresponding paths are modified through this module (e.g., by
+    :meth:`~hdfs.delete`, :meth:`~hdfs.rename` or closing a file open for
+    writing), but changes made by other clients are only seen after the
+    entries expire.
+
+    Enabling the cache again discards all cached entries.
+    """
+    global _METADATA_CACHE
+    if ttl <= 0 or maxsize <= 0:
+        raise ValueError("ttl and maxsize must be positive")
+    _METADATA_CACHE = _MetadataCache(ttl, maxsize)
+
+
+def disable_metadata_cache():
+    """\
+    Disable (and clear) the metadata cache.
+    """
+    global _METADATA_CACHE
+    _METADATA_CACHE = None
+
+
 def _get_ip(host, default=None):
     try:
         ip = socket.gethostbyname(host)
@@ -159,6 +367,10 @@ class hdfs(object):
         if not host:
             port = 0
             user = user or getpass.getuser()
+        with _CACHE_LOCK:
+            self.__connect(host, port, user, raw_host)
+
+    def __connect(self, host, port, user, raw_host):
         try:
             self.__status = self.__lookup((host, port, user))
         except KeyError:
@@ -183,6 +395,9 @@ class hdfs(object):
                 self.__status = _FSStatus(fs, h, p, u, refcount=0)
                 self._CACHE[(ip, p, u)] = self.__status
         self.__status.refcount += 1
+        if _SESSION.depth and self.__status not in _SESSION.held:
+            _SESSION.held.add(self.__status)
+            self.__status.refcount += 1
 
     def __enter__(self):
         return self
@@ -223,24 +438,54 @@ class hdfs(object):
         """
         Close the HDFS handle (disconnect).
         """
-        self.__status.refcount -= 1
-        if self.refcount == 0:
-            self.fs.close()
-            for k, status in list(self._CACHE.items()):  # yes, we want a copy
-                if status.refcount == 0:
-                    del self._CACHE[k]
+        _release(self.__status)
 
     @property
     def closed(self):
         return self.__status.refcount == 0
 
+    def __cache_key(self, path, what=None):
+        try:
+            res = urlparse(path)
+            path = res.path if res.scheme else path
+            if not path.startswith("/"):
+                wd = urlparse(self.fs.get_working_directory()).path
+                path = posixpath.join(wd, path)
+        except (TypeError, ValueError):
+            return None
+        fs_key = (self.host, self.port, self.user)
+        return fs_key, posixpath.normpath(path), what
+
+    def _invalidate(self, *paths):
+        """\
+        Drop metadata cache entries affected by changes to ``paths``.
+        """
+        cache = _METADATA_CACHE
+        if cache is None:
+            return
+        for p in paths:
+            key = self.__cache_key(p)
+            if key is None:  # can't tell: drop everything on this fs
+                cache.invalidate((self.host, self.port, self.user), "/")
+            else:
+                cache.invalidate(key[0], key[1])
+
+    @staticmethod
+    def __from_cache(value):
+        if isinstance(value, Exception):
+            return copy.copy(value)
+        return dict(value)
+
     def open_file(self, path,
                   mode="r",
                   buff_size=0,
                   replication=0,
                   blocksize=0,
                   encoding=None,
-                  errors=None):
+                  errors=None,
+                  prefetch=0,
+                  mmap=False,
+                  max_inflight_bytes=0):
         """
         Open an HDFS file.
 
@@ -262,6 +507,23 @@ class hdfs(object):
         :param replication: HDFS block replication
         :type blocksize: int
         :param blocksize: HDFS block size
+        :type prefetch: int
+        :param prefetch: if greater than 0, files open for reading are read
+          ahead by a background thread that keeps up to this many chunks of
+          :data:`~.file.PREFETCH_CHUNK_SIZE` bytes in flight. This speeds up
+          sequential scans by overlapping network I/O with processing. It
+          is ignored for local files
+        :type mmap: bool
+        :param mmap: if :obj:`True`, local files are memory-mapped (see
+          :class:`~.file.local_file`). Only allowed in binary read mode;
+          ignored for HDFS files
+        :type max_inflight_bytes: int
+        :param max_inflight_bytes: if greater than 0, files open for writing
+          are written by a background thread, while ``write`` only queues
+          the data and returns, blocking when more than this many bytes are
+          waiting to be written. Errors are raised by the next ``write``,
+          ``flush`` or ``close``, which also wait for queued data to be
+          written. It is ignored for local files
         :rtpye: :class:`~.file.hdfs_file`
         :return: handle to the open file
 
@@ -270,15 +532,22 @@ class hdfs(object):
         if not path:
             raise ValueError("Empty path")
         m, is_text = common.parse_mode(mode)
+        if mmap and (m != "r" or is_text):
+            raise ValueError("mmap requires binary read mode")
         if not self.host:
-            fret = local_file(self, path, m)
+            fret = local_file(self, path, m, mmap=mmap)
+            if m != "r":
+                self._invalidate(path)
             if is_text:
                 cls = io.BufferedReader if m == "r" else io.BufferedWriter
                 fret = TextIOWrapper(cls(fret), encoding, errors)
             return fret
         f = self.fs.open_file(path, m, buff_size, replication, blocksize)
+        if m != "r":
+            self._invalidate(path)
         cls = FileIO if is_text else hdfs_file
-        fret = cls(f, self, mode)
+        fret = cls(f, self, mode, prefetch=prefetch,
+                   max_inflight_bytes=max_inflight_bytes)
         return fret
 
     def capacity(self):
@@ -307,7 +576,10 @@ class hdfs(object):
         """
         _complain_ifclosed(self.closed)
         if isinstance(to_hdfs, self.__class__):
-            to_hdfs = to_hdfs.fs
+            try:
+                return self.fs.copy(from_path, to_hdfs.fs, to_path)
+            finally:
+                to_hdfs._invalidate(to_path)
         return self.fs.copy(from_path, to_hdfs, to_path)
 
     def create_directory(self, path):
@@ -320,7 +592,10 @@ class hdfs(object):
         :raises: :exc:`~exceptions.IOError`
         """
         _complain_ifclosed(self.closed)
-        return self.fs.create_directory(path)
+        try:
+            return self.fs.create_directory(path)
+        finally:
+            self._invalidate(path)
 
     def default_block_size(self):
         """
@@ -345,7 +620,10 @@ class hdfs(object):
           :obj:`False` and directory is non-empty
         """
         _complain_ifclosed(self.closed)
-        return self.fs.delete(path, recursive)
+        try:
+            return self.fs.delete(path, recursive)
+        finally:
+            self._invalidate(path)
 
     def exists(self, path):
         """
@@ -357,7 +635,19 @@ class hdfs(object):
         :return: :obj:`True` if ``path`` exists
         """
         _complain_ifclosed(self.closed)
-        return self.fs.exists(path)
+        cache = _METADATA_CACHE
+        key = cache and self.__cache_key(path)
+        if not key:
+            return self.fs.exists(path)
+        info = cache.get(key)
+        if info is not _MISSING:
+            return not isinstance(info, Exception)
+        key = key[:2] + ("exists",)
+        rval = cache.get(key)
+        if rval is _MISSING:
+            rval = self.fs.exists(path)
+            cache.put(key, rval)
+        return rval
 
     def get_hosts(self, path, start, length):
         """
@@ -402,20 +692,97 @@ class hdfs(object):
         :raises: :exc:`~exceptions.IOError`
         """
         _complain_ifclosed(self.closed)
-        return self.fs.get_path_info(path)
+        cache = _METADATA_CACHE
+        key = cache and self.__cache_key(path)
+        if not key:
+            return self.fs.get_path_info(path)
+        info = cache.get(key)
+        if info is _MISSING:
+            try:
+                info = self.fs.get_path_info(path)
+            except IOError as e:
+                if _is_not_found(e):  # don't cache transient errors
+                    cache.put(key, e)
+                raise
+            cache.put(key, info)
+        elif isinstance(info, Exception):
+            raise self.__from_cache(info)
+        return self.__from_cache(info)
+
+    def get_path_infos(self, paths):
+        """
+        Get information about several paths with a single native call.
+
+        Paths are stat'ed in a loop that does not hold the GIL, which is
+        much cheaper than calling :meth:`get_path_info` once for each path.
+        Errors do not stop the loop: the corresponding list item is set to
+        the :exc:`~exceptions.IOError` that :meth:`get_path_info` would
+        have raised.
 
-    def list_directory(self, path):
+        :type paths: list
+        :param paths: paths in the filesystem
+        :rtype: list
+        :return: a path information dict (see :meth:`get_path_info`) or an
+          :exc:`~exceptions.IOError` for each path in ``paths``
+        """
+        _complain_ifclosed(self.closed)
+        cache = _METADATA_CACHE
+        if cache is None:
+            return self.fs.get_path_infos(paths)
+        keys = [self.__cache_key(_) for _ in paths]
+        rval = [cache.get(k) if k else _MISSING for k in keys]
+        todo = [i for i, info in enumerate(rval) if info is _MISSING]
+        if todo:
+            infos = self.fs.get_path_infos([paths[i] for i in todo])
+            for i, info in zip(todo, infos):
+                rval[i] = info
+                if keys[i] and (
+                        not isinstance(info, Exception) or _is_not_found(info)
+                ):
+                    cache.put(keys[i], info)
+        return [self.__from_cache(_) for _ in rval]
+
+    def list_directory(self, path, fields=None):
         r"""
         Get list of files and directories for ``path``\ .
 
+        By default, each list item is a path information dict (see
+        :meth:`get_path_info`). If ``fields`` is not :obj:`None`, each
+        item is instead a tuple holding only the values of the requested
+        fields, in the given order: this is considerably faster and takes
+        far less memory on large directories. For instance::
+
+          for name, size in fs.list_directory(d, fields=("name", "size")):
+              ...
+
         :type path: str
         :param path: the path of the directory
+        :type fields: list
+        :param fields: names of the path information fields to retrieve
         :rtype: list
         :return: list of files and directories in ``path``
-        :raises: :exc:`~exceptions.IOError`
+        :raises: :exc:`~exceptions.IOError`; :exc:`~exceptions.ValueError`
+          if ``fields`` contains an unknown field name
         """
         _complain_ifclosed(self.closed)
-        return self.fs.list_directory(path)
+        cache = _METADATA_CACHE
+        key = cache and self.__cache_key(
+            path, ("ls", None if fields is None else tuple(fields))
+        )
+        if not key:
+            if fields is None:
+                return self.fs.list_directory(path)
+            return self.fs.list_directory(path, fields)
+        listing = cache.get(key)
+        if listing is _MISSING:
+            if fields is None:
+                listing = self.fs.list_directory(path)
+            else:
+                listing = self.fs.list_directory(path, fields)
+            cache.put(key, listing)
+        if fields is None:
+            return [dict(_) for _ in listing]
+        return list(listing)
 
     def move(self, from_path, to_hdfs, to_path):
         """
@@ -430,9 +797,15 @@ class hdfs(object):
         :raises: :exc:`~exceptions.IOError`
         """
         _complain_ifclosed(self.closed)
-        if isinstance(to_hdfs, self.__class__):
-            to_hdfs = to_hdfs.fs
-        return self.fs.move(from_path, to_hdfs, to_path)
+        try:
+            if isinstance(to_hdfs, self.__class__):
+                try:
+                    return self.fs.move(from_path, to_hdfs.fs, to_path)
+                finally:
+                    to_hdfs._invalidate(to_path)
+            return self.fs.move(from_path, to_hdfs, to_path)
+        finally:
+            self._invalidate(from_path)
 
     def rename(self, from_path, to_path):
         """
@@ -445,7 +818,10 @@ class hdfs(object):
         :raises: :exc:`~exceptions.IOError`
         """
         _complain_ifclosed(self.closed)
-        return self.fs.rename(from_path, to_path)
+        try:
+            return self.fs.rename(from_path, to_path)
+        finally:
+            self._invalidate(from_path, to_path)
 
     def set_replication(self, path, replication):
         r"""
@@ -458,7 +834,10 @@ class hdfs(object):
         :raises: :exc:`~exceptions.IOError`
         """
         _complain_ifclosed(self.closed)
-        return self.fs.set_replication(path, replication)
+        try:
+            return self.fs.set_replication(path, replication)
+        finally:
+            self._invalidate(path)
 
     def set_working_directory(self, path):
         r"""
@@ -506,7 +885,10 @@ class hdfs(object):
         :raises: :exc:`~exceptions.IOError`
         """
         _complain_ifclosed(self.closed)
-        return self.fs.chown(path, user, group)
+        try:
+            return self.fs.chown(path, user, group)
+        finally:
+            self._invalidate(path)
 
     @staticmethod
     def __get_umask():
@@ -593,6 +975,8 @@ class hdfs(object):
         except TypeError:
             mode = self.__compute_mode_from_string(path, mode)
             return self.fs.chmod(path, mode)
+        finally:
+            self._invalidate(path)
 
     def utime(self, path, mtime, atime):
         """
@@ -607,17 +991,48 @@ class hdfs(object):
         :raises: :exc:`~exceptions.IOError`
         """
         _complain_ifclosed(self.closed)
-        return self.fs.utime(path, int(mtime), int(atime))
+        try:
+            return self.fs.utime(path, int(mtime), int(atime))
+        finally:
+            self._invalidate(path)
 
-    def walk(self, top):
+    def walk(self, top, topdown=True, maxdepth=None, predicate=None,
+             workers=None, fields=None):
         """
         Generate infos for all paths in the tree rooted at ``top`` (included).
 
         The ``top`` parameter can be either an HDFS path string or a
         dictionary of properties as returned by :meth:`get_path_info`.
 
+        The tree is traversed depth-first without recursion, so there is
+        no limit on its depth, and infos are generated as directories are
+        listed. If ``workers`` is greater than 1, a pool of that many
+        threads lists the next directories to be visited ahead of the
+        traversal, so that sibling directories are listed concurrently; the
+        output order is the same as in the serial case. To bound memory
+        usage, at most ``2 * workers`` listings are in flight or waiting to
+        be consumed; other directories are listed when they are reached.
+
         :type top: str, dict
         :param top: an HDFS path or path info dict
+        :type topdown: bool
+        :param topdown: if :obj:`True`, a directory is generated before its
+          contents, otherwise after them
+        :type maxdepth: int
+        :param maxdepth: if not :obj:`None`, do not descend into directories
+          that are more than this many levels below ``top`` (``0`` means
+          only ``top`` itself)
+        :type predicate: callable
+        :param predicate: if not :obj:`None`, only generate infos for which
+          ``predicate(info)`` is true; directories that do not satisfy it
+          are not descended into
+        :type workers: int
+        :param workers: number of threads used for listing directories
+        :type fields: list
+        :param fields: if not :obj:`None`, generate tuples with only the
+          requested fields instead of dictionaries (see
+          :meth:`list_directory`); ``predicate`` is then called on these
+          tuples
         :rtype: iterator
         :return: path infos of files and directories in the tree rooted at
           ``top``
@@ -628,8 +1043,76 @@ class hdfs(object):
             raise ValueError("Empty path")
         if not isinstance(top, dict):
             top = self.get_path_info(top)
-        yield top
-        if top['kind'] == 'directory':
-            for info in self.list_directory(top['name']):
-                for item in self.walk(info):
-                    yield item
+        if fields is None:
+            name_of, kind_of = ops.itemgetter("name"), ops.itemgetter("kind")
+        else:
+            # also fetch what the traversal needs, and strip it on output
+            ls_fields = tuple(fields) + ("name", "kind")
+            name_of, kind_of = ops.itemgetter(-2), ops.itemgetter(-1)
+            top = _project_info(top, ls_fields)
+
+        def item(info):
+            return info if fields is None else info[:-2]
+
+        def list_directory(name):
+            if fields is None:
+                return self.list_directory(name)
+            return self.list_directory(name, fields=ls_fields)
+
+        pool = None
+        if workers and workers > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(workers)
+        pending = {}  # dir name: async listing
+        # dirs still to be listed, in reverse traversal order
+        candidates = []
+
+        def expand(info, depth):
+            return (kind_of(info) == 'directory' and
+                    (maxdepth is None or depth < maxdepth))
+
+        def prefetch(infos, depth):
+            candidates.extend(
+                _ for _ in reversed(infos)
+                if expand(_, depth) and (not predicate or predicate(item(_)))
+            )
+            while candidates and len(pending) < 2 * workers:
+                name = name_of(candidates.pop())
+                pending[name] = pool.apply_async(list_directory, (name,))
+
+        def listing(info):
+            if pool is None:
+                return list_directory(name_of(info))
+            try:
+                return pending.pop(name_of(info)).get()
+            except KeyError:
+                # not prefetched yet: it's the next candidate
+                candidates.pop()
+                return list_directory(name_of(info))
+
+        # stack items: (info, depth, already expanded)
+        stack = [(top, 0, False)]
+        try:
+            if pool is not None:
+                prefetch([top], 0)
+            while stack:
+                info, depth, expanded = stack.pop()
+                if not expanded:
+                    if predicate and not predicate(item(info)):
+                        continue
+                    if topdown:
+                        yield item(info)
+                if expanded or not expand(info, depth):
+                    if not topdown:
+                        yield item(info)
+                    continue
+                children = listing(info)
+                if pool is not None:
+                    prefetch(children, depth + 1)
+                if not topdown:
+                    stack.append((info, depth, True))
+                stack.extend((_, depth + 1, False) for _ in reversed(children))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
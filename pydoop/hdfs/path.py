@@ -400,6 +400,37 @@ def stat(path, user=None):
     return retval
 
 
+def stat_many(paths, user=None):
+    """
+    Like :func:`stat`, but for several paths at once.
+
+    Paths are grouped by filesystem, and each group is stat'ed with a
+    single :meth:`~.fs.hdfs.get_path_infos` call. Returns a list with a
+    :class:`StatResult` object for each path that could be stat'ed, and
+    the corresponding :exc:`~exceptions.IOError` for each one that could
+    not, in the same order as ``paths``.
+    """
+    groups = {}
+    for i, p in enumerate(paths):
+        host, port, path_ = split(p, user)
+        groups.setdefault((host, port), []).append((i, path_))
+    retval = [None] * len(paths)
+    for (host, port), items in groups.items():
+        fs = hdfs_fs.hdfs(host, port, user)
+        try:
+            infos = fs.get_path_infos([path_ for _, path_ in items])
+        finally:
+            fs.close()
+        for (i, path_), info in zip(items, infos):
+            if isinstance(info, Exception):
+                retval[i] = info
+                continue
+            retval[i] = StatResult(info)
+            if not host:
+                _update_stat(retval[i], path_)
+    return retval
+
+
 def getatime(path, user=None):
     """
     Get time of last access of ``path``.
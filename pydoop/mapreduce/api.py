@@ -185,10 +185,26 @@ class Context(ABC):
     def get_input_value(self):
         pass
 
+    @property
+    def keys(self):
+        """
+        List of input keys for the current batch (see
+        :meth:`Mapper.map_batch`).
+        """
+        return self.get_input_keys()
+
+    def get_input_keys(self):
+        # not abstract, so that existing subclasses can still be instantiated
+        return [self.get_input_key()]
+
     @property
     def values(self):
         """
         Iterator over all values for the current key (reduce tasks only).
+
+        When the mapper processes input in batches (see
+        :meth:`Mapper.map_batch`), this is the list of input values for the
+        current batch.
         """
         return self.get_input_values()
 
@@ -196,6 +212,14 @@ class Context(ABC):
     def get_input_values(self):
         pass
 
+    def values_array(self):
+        """
+        Get all values for the current key as a list (reduce tasks only).
+
+        Note that this consumes :attr:`values`.
+        """
+        return list(self.values)
+
     @abstractmethod
     def emit(self, key, value):
         """
@@ -203,6 +227,16 @@ class Context(ABC):
         """
         pass
 
+    def emit_many(self, pairs):
+        """
+        Emit all key, value pairs from the ``pairs`` iterable.
+
+        Same as calling :meth:`emit` for each pair, but implementations can
+        (and the default one does) send the whole batch upstream at once.
+        """
+        for key, value in pairs:
+            self.emit(key, value)
+
     @abstractmethod
     def progress(self):
         pass
@@ -275,6 +309,22 @@ class Mapper(Component, Closable):
         """
         pass
 
+    def map_batch(self, context):
+        """
+        Called once for each batch of consecutive input key/value pairs,
+        available as ``context.keys`` and ``context.values`` (two lists of
+        the same length). Overriding this method is **not** required: if it
+        is overridden, the framework calls it *instead of* :meth:`map`,
+        decoding whole batches of records natively and saving a few Python
+        calls per record. The maximum batch size is controlled by the
+        ``map_batch_size`` argument to :func:`~.pipes.run_task`.
+
+        :type context: :class:`Context`
+        :param context: the context object passed by the framework, used to
+          get the input keys and values and emit output key/value pairs.
+        """
+        pass
+
 
 class Reducer(Component, Closable):
     """
@@ -308,10 +358,45 @@ class Combiner(Reducer):
     write a combiner: all that's required is that it has the same interface as
     a :class:`reducer`. Indeed, in many cases it's useful to set the combiner
     class to be the same as the reducer class.
+
+    If the combiner simply folds values with an associative function (e.g.,
+    it sums them), it can also define a ``fold(acc, value)`` method that
+    returns the combination of the running value ``acc`` with ``value``. In
+    this case, the map task caches a single value per key, rather than a
+    list of all values, and ``reduce`` gets an iterator over that single
+    value (see also :class:`Aggregator`). If the combiner does not depend on
+    the order in which keys are processed, setting
+    ``"pydoop.mapreduce.combiner.sort"`` to ``"false"`` skips sorting the
+    cache at each spill.
     """
     pass
 
 
+class Aggregator(ABC):
+    """\
+    Folds map output values for each key with an associative function.
+
+    An aggregator is a lightweight alternative to a :class:`Combiner`: when
+    passed to :class:`~.pipes.Factory` via its ``aggregate`` argument, the
+    map task keeps a single running value for each key, updating it in place
+    at each emit, and outputs one key/value pair per key when it spills its
+    cache. Built-in aggregators can also be selected by name (see
+    :class:`~.pipes.Factory`).
+    """
+
+    #: Optional function (or method) that returns the initial running value
+    #: for a key, given its first value. If :obj:`None`, the first value is
+    #: used as is.
+    start = None
+
+    @abstractmethod
+    def fold(self, acc, value):
+        """
+        Return the combination of the running value ``acc`` with ``value``.
+        """
+        pass
+
+
 class Partitioner(Component):
     r"""
     Controls the partitioning of intermediate keys output by the
@@ -23,15 +23,10 @@ Ref: ``org.apache.hadoop.mapred.pipes.BinaryProtocol``.
 """
 
 import os
-try:
-    from cPickle import loads
-except ImportError:
-    from pickle import loads
-from itertools import groupby
-from operator import itemgetter
+from itertools import islice
 
 import pydoop.config as config
-from .api import AVRO_IO_MODES, JobConf
+from .api import AVRO_IO_MODES, JobConf, Mapper
 
 
 PROTOCOL_VERSION = 0
@@ -81,6 +76,9 @@ CMD_REPR = {
 
 IS_JAVA_RW = "mapreduce.pipes.isjavarecordwriter"
 
+DEFAULT_MAP_BATCH_SIZE = 1024
+DEFAULT_REDUCE_CHUNK_SIZE = 1024
+
 
 def get_password():
     try:
@@ -119,8 +117,44 @@ def _get_avro_value(downlink):
     return downlink.avro_value_deserializer.deserialize(raw)
 
 
-def _get_pickled(downlink):
-    return loads(downlink.stream.read_bytes())
+def _make_private_getter(loads):
+    def _get_private(downlink):
+        return loads(downlink.stream.read_bytes())
+    return _get_private
+
+
+# zero-copy: keys and values use separate slots, so that they can coexist
+def _get_k_view(downlink):
+    return downlink.stream.read_bytes_view(0)
+
+
+def _get_v_view(downlink):
+    return downlink.stream.read_bytes_view(1)
+
+
+# formats for FileInStream.read_map_items, used when the mapper processes
+# input records in batches (see Mapper.map_batch)
+NATIVE_FORMATS = {
+    "org.apache.hadoop.io.LongWritable": "L",
+    "org.apache.hadoop.io.Text": "s",
+}
+
+
+def _get_avro_map_items(downlink):
+    keys, values = downlink.stream.read_map_items(downlink.map_batch_size)
+    if downlink.avro_key_deserializer:
+        keys = [downlink.avro_key_deserializer.deserialize(_) for _ in keys]
+    if downlink.avro_value_deserializer:
+        values = [
+            downlink.avro_value_deserializer.deserialize(_) for _ in values
+        ]
+    return keys, values
+
+
+def _overrides(obj, name, base):
+    # works with both py2 unbound methods and py3 functions
+    code = getattr(getattr(type(obj), name), "__code__", None)
+    return code is not getattr(base, name).__code__
 
 
 class Downlink(object):
@@ -176,6 +210,15 @@ class Downlink(object):
       * the Downlink object is not part of the client API (it's not passed to
         user code at all)
 
+    If the mapper overrides ``map_batch``, consecutive ``MAP_ITEM`` commands
+    are decoded in batches by the native ``read_map_items`` stream method,
+    and user code is called once per batch rather than once per record.
+
+    On the reduce side, ``RUN_REDUCE`` takes over the command stream: the
+    values for each key are read in chunks by the native
+    ``read_reduce_values`` stream method, and any values left unconsumed by
+    the reducer are skipped before moving on to the next key.
+
     Job conf deserialization also needs to be somewhat efficient, since it
     involves reading thousands of strings.
     """
@@ -185,6 +228,19 @@ class Downlink(object):
         self.context = context
         self.raw_k = kwargs.get("raw_keys", False)
         self.raw_v = kwargs.get("raw_values", False)
+        self.map_batch_size = kwargs.get(
+            "map_batch_size", DEFAULT_MAP_BATCH_SIZE
+        )
+        self.reduce_chunk_size = kwargs.get(
+            "reduce_chunk_size", DEFAULT_REDUCE_CHUNK_SIZE
+        )
+        self.map_items_fmt = "bb"
+        self.batch_map = False
+        self.value_loads = None
+        if kwargs.get("zero_copy", False):
+            # overridden by setup_deser, if needed
+            self.__class__.get_k = _get_k_view
+            self.__class__.get_v = _get_v_view
         self.password = get_password()
         self.auth_done = False
         self.avro_key_deserializer = None
@@ -219,6 +275,11 @@ class Downlink(object):
     def get_v(self):
         return self.stream.read_bytes()
 
+    def get_map_items(self):
+        return self.stream.read_map_items(
+            self.map_batch_size, self.map_items_fmt
+        )
+
     def setup_avro_deser(self):
         try:
             from pydoop.avrolib import AvroDeserializer
@@ -236,16 +297,71 @@ class Downlink(object):
             schema = jc.get(config.AVRO_VALUE_INPUT_SCHEMA)
             self.avro_value_deserializer = AvroDeserializer(schema)
             self.__class__.get_v = _get_avro_value
+        self.__class__.get_map_items = _get_avro_map_items
 
     def setup_deser(self, key_type, value_type):
+        kfmt = vfmt = "b"
         if not self.raw_k:
             d = DESERIALIZERS.get(key_type)
             if d is not None:
                 self.__class__.get_k = d
+                kfmt = NATIVE_FORMATS[key_type]
         if not self.raw_v:
             d = DESERIALIZERS.get(value_type)
             if d is not None:
                 self.__class__.get_v = d
+                vfmt = NATIVE_FORMATS[value_type]
+        self.map_items_fmt = kfmt + vfmt
+
+    def run_batched_reader(self, reader):
+        while True:
+            items = list(islice(reader, self.map_batch_size))
+            if not items:
+                break
+            self.context._keys = [k for k, _ in items]
+            self.context._values = [v for _, v in items]
+            self.context.mapper.map_batch(self.context)
+            self.context.progress_value = reader.get_progress()
+            self.context.progress()
+
+    def get_reduce_values(self):
+        chunk = self.stream.read_reduce_values(self.reduce_chunk_size)
+        if self.value_loads:
+            return [self.value_loads(_) for _ in chunk]
+        return chunk
+
+    def iter_reduce_values(self):
+        chunk = self.get_reduce_values()
+        while chunk:
+            for v in chunk:
+                yield v
+            chunk = self.get_reduce_values()
+
+    def instrument(self):
+        # must be called *after* patching the class
+        timer = self.context._phase_timer
+        if timer:
+            timer.wrap_methods(
+                self, "deserialize", "get_k", "get_v", "get_map_items",
+                "get_reduce_values"
+            )
+
+    def run_reduce(self):
+        read_values = self.stream.read_reduce_values
+        cmd = self.stream.read_vint()
+        while cmd == REDUCE_KEY:
+            self.context._key = self.get_k()
+            self.context._values = self.iter_reduce_values()
+            self.context.reducer.reduce(self.context)
+            # skip any values not consumed by the reducer
+            while read_values(self.reduce_chunk_size):
+                pass
+            cmd = self.stream.read_vint()
+        if cmd == ABORT:
+            raise RuntimeError("received ABORT command")
+        if cmd != CLOSE:
+            raise RuntimeError("unexpected command in reduce: %d" % cmd)
+        self.context.close()
 
     def __next__(self):
         cmd = self.stream.read_vint()
@@ -260,6 +376,8 @@ class Downlink(object):
                 raise RuntimeError("Unknown protocol id: %d" % v)
         elif cmd == SET_JOB_CONF:
             self.context._job_conf = self.read_job_conf()
+            if self.context._private_encoding:
+                self.context._setup_private_encoding()
             if config.AVRO_OUTPUT in self.context.job_conf:
                 self.context._setup_avro_ser()
         elif cmd == RUN_MAP:
@@ -279,13 +397,18 @@ class Downlink(object):
                 piped_output = self.context.job_conf.get_bool(IS_JAVA_RW)
                 self.setup_record_writer(piped_output)
             self.context.nred = nred
-            self.context.create_mapper()
+            mapper = self.context.create_mapper()
+            self.batch_map = _overrides(mapper, "map_batch", Mapper)
             self.context.create_partitioner()
+            self.context._instrument()
             if reader:
-                for self.context._key, self.context._value in reader:
-                    self.context.mapper.map(self.context)
-                    self.context.progress_value = reader.get_progress()
-                    self.context.progress()
+                if self.batch_map:
+                    self.run_batched_reader(reader)
+                else:
+                    for self.context._key, self.context._value in reader:
+                        self.context.mapper.map(self.context)
+                        self.context.progress_value = reader.get_progress()
+                        self.context.progress()
                 # no more commands from upstream, not even CLOSE
                 try:
                     self.context.close()
@@ -297,10 +420,16 @@ class Downlink(object):
                 self.setup_avro_deser()
             else:
                 self.setup_deser(key_type, value_type)
+            self.instrument()
         elif cmd == MAP_ITEM:
-            self.context._key = self.get_k()
-            self.context._value = self.get_v()
-            self.context.mapper.map(self.context)
+            if self.batch_map:
+                self.context._keys, self.context._values = \
+                    self.get_map_items()
+                self.context.mapper.map_batch(self.context)
+            else:
+                self.context._key = self.get_k()
+                self.context._value = self.get_v()
+                self.context.mapper.map(self.context)
         elif cmd == RUN_REDUCE:
             self.context.task_type = "r"
             part, piped_output = self.stream.read_tuple('ii')
@@ -308,35 +437,21 @@ class Downlink(object):
             self.context.create_reducer()
             self.setup_record_writer(piped_output)
             if self.context._private_encoding:
-                self.__class__.get_k = _get_pickled
-                self.__class__.get_v = _get_pickled
-            for cmd, subs in groupby(self, itemgetter(0)):
-                if cmd == REDUCE_KEY:
-                    _, self.context._key = next(subs)
-                if cmd == REDUCE_VALUE:
-                    self.context._values = (v for _, v in subs)
-                    self.context.reducer.reduce(self.context)
-                if cmd == CLOSE:
-                    try:
-                        self.context.close()
-                    finally:
-                        raise StopIteration
-        elif cmd == REDUCE_KEY:
-            k = self.get_k()
-            return cmd, k  # pass on to RUN_REDUCE iterator
-        elif cmd == REDUCE_VALUE:
-            v = self.get_v()
-            return cmd, v  # pass on to RUN_REDUCE iterator
+                self.__class__.get_k = _make_private_getter(
+                    self.context._key_codec.loads
+                )
+                self.value_loads = self.context._value_codec.loads
+            self.context._instrument()
+            self.instrument()
+            self.run_reduce()
+            raise StopIteration
         elif cmd == ABORT:
             raise RuntimeError("received ABORT command")
         elif cmd == CLOSE:
-            if self.context.mapper:
-                try:
-                    self.context.close()
-                finally:
-                    raise StopIteration
-            else:
-                return cmd, None  # pass on to RUN_REDUCE iterator
+            try:
+                self.context.close()
+            finally:
+                raise StopIteration
         else:
             raise RuntimeError("unknown command: %d" % cmd)
 
@@ -373,6 +488,12 @@ class Uplink(object):
     def partitioned_output(self, part, k, v):
         self.stream.write_output(k, v, part)
 
+    def outputs(self, keys, values):
+        self.stream.write_outputs(keys, values)
+
+    def partitioned_outputs(self, parts, keys, values):
+        self.stream.write_outputs(keys, values, parts)
+
     def status(self, msg):
         self.stream.write_tuple("is", (STATUS, msg))
 
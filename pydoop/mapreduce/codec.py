@@ -0,0 +1,116 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright 2009-2024 CRS4.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Codecs for the private encoding of intermediate keys and values.
+
+When private encoding is enabled (see :func:`~.pipes.run_task`), map tasks
+serialize output keys and values with a codec, and reduce tasks deserialize
+them with the same codec. The codec is selected by name, either via the
+``private_encoding`` argument to :func:`~.pipes.run_task` or via the
+``pydoop.mapreduce.private.encoding`` job configuration property. Available
+codecs:
+
+* ``"pickle"`` (default): supports any picklable object.
+* ``"marshal"``: supports only core types (int, float, str, bytes, tuple,
+  list, dict, etc.), but it's faster than pickle and produces smaller
+  records, since it has no header and no memo. Marshal's format is only
+  guaranteed to be compatible across tasks running the same Python version.
+* ``"ordered"``: supports None, 64-bit ints, floats, bytes, str and tuples
+  of these. Encoded objects of the same type sort, as raw bytes, in the
+  same order as the original objects. Since Hadoop sorts intermediate keys
+  as raw bytes, this can be used as the key codec to have reducers get,
+  e.g., numeric keys in numeric order (objects of different types are
+  sorted by type: None, int, float, bytes, str, tuple).
+
+Additional codecs can be added with :func:`register_codec`.
+"""
+
+import marshal
+from abc import abstractmethod
+from functools import partial
+
+import pydoop.sercore as sercore
+from pydoop.utils.py3compat import ABC, pickle
+
+
+class Codec(ABC):
+    """\
+    Serializes and deserializes intermediate keys and values.
+
+    Codecs are called once for each key and value, so they should avoid
+    adding Python-level overhead: ``dumps`` and ``loads`` can be plain class
+    attributes set to native functions, as in the built-in codecs.
+    """
+
+    @abstractmethod
+    def dumps(self, obj):
+        """\
+        Serialize ``obj`` to a byte string.
+        """
+        pass
+
+    @abstractmethod
+    def loads(self, data):
+        """\
+        Deserialize an object from the byte string ``data``.
+        """
+        pass
+
+
+class PickleCodec(Codec):
+    dumps = partial(pickle.dumps, protocol=pickle.HIGHEST_PROTOCOL)
+    loads = pickle.loads
+
+
+class MarshalCodec(Codec):
+    dumps = marshal.dumps
+    loads = marshal.loads
+
+
+class OrderedCodec(Codec):
+    dumps = sercore.encode_ordered
+    loads = sercore.decode_ordered
+
+
+DEFAULT_CODEC = "pickle"
+
+CODECS = {
+    "pickle": PickleCodec(),
+    "marshal": MarshalCodec(),
+    "ordered": OrderedCodec(),
+}
+
+
+def register_codec(name, codec):
+    """\
+    Make ``codec`` (a :class:`Codec` object) available as ``name``.
+
+    Since both map and reduce tasks need the codec, this should be called
+    at module level in the application script.
+    """
+    if not isinstance(codec, Codec):
+        raise TypeError("not a Codec object: %r" % (codec,))
+    CODECS[name] = codec
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError("unknown codec: %r" % (name,))
@@ -28,6 +28,7 @@ import base64
 import hashlib
 import hmac
 import io
+import operator
 import os
 import struct
 
@@ -41,7 +42,8 @@ from sys import getsizeof as sizeof
 import pydoop.config as config
 import pydoop.sercore as sercore
 
-from . import api, connections
+from . import api, codec, connections
+from .profiling import PhaseTimer, StackSampler
 
 # py2 compat
 try:
@@ -52,11 +54,17 @@ except NameError:
 PSTATS_DIR = "PYDOOP_PSTATS_DIR"
 PSTATS_FMT = "PYDOOP_PSTATS_FMT"
 DEFAULT_PSTATS_FMT = "%s_%05d_%s"  # task_type, task_id, random suffix
+PROFILE_PHASES = "PYDOOP_PROFILE_PHASES"
+SAMPLE_INTERVAL = "PYDOOP_SAMPLE_INTERVAL"
 
 INT_WRITABLE_FMT = ">i"
 INT_WRITABLE_SIZE = struct.calcsize(INT_WRITABLE_FMT)
 
 
+def _env_flag(name):
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
 def create_digest(key, msg):
     h = hmac.new(key, msg, hashlib.sha1)
     return base64.b64encode(h.digest())
@@ -109,6 +117,174 @@ class OpaqueSplit(api.OpaqueSplit):
         write_bytes_writable(dumps(self.payload, HIGHEST_PROTOCOL), f)
 
 
+# used to estimate the memory footprint of CombinerCache items
+_PTR_SIZE = struct.calcsize("P")
+_DICT_ITEM_SIZE = 3 * _PTR_SIZE  # hash, key ref, value ref
+_LIST_SIZE = sizeof([])
+_MISSING = object()
+
+
+def _count_start(value):
+    return 1
+
+
+def _count_fold(acc, value):
+    return acc + 1
+
+
+class CombinerCache(object):
+    """\
+    In-map cache for map output key/value pairs, used when a combiner is set.
+
+    By default, values are grouped by key in a dict of lists. If ``fold`` is
+    provided, the cache keeps a single running value for each key instead,
+    replacing it with ``fold(acc, value)`` every time a new value comes in.
+    This is only correct for combiners that are equivalent to folding their
+    input values with an associative function (e.g., sum, min, max). The
+    running value for a new key is ``start(value)`` or, if ``start`` is not
+    provided, the value itself. Sums (``fold`` is :func:`operator.add`) and
+    counts (``fold`` and ``start`` come from :class:`CountAggregator`) are
+    computed inline, without calling ``fold``.
+
+    The memory footprint is estimated by charging each key once, when it's
+    first inserted, plus the size of each cached value (or, when folding,
+    the size change of the running value) and container overhead.
+    :meth:`add` returns :obj:`True` when the estimate reaches ``max_size``.
+
+    If ``sort`` is :obj:`False`, :meth:`items` yields keys in insertion
+    order, skipping the sort. Since the framework sorts map output anyway,
+    this is safe unless the combiner relies on the order in which keys are
+    processed.
+    """
+
+    def __init__(self, max_size, fold=None, sort=True, start=None):
+        self.max_size = max_size
+        self.fold = fold
+        self.start = start
+        self.sort = sort
+        self.data = {}
+        self.size = 0
+        if not fold:
+            self.add = self.__add_append
+        elif fold is operator.add and not start:
+            self.add = self.__add_sum
+        elif fold is _count_fold and start is _count_start:
+            self.add = self.__add_count
+        else:
+            self.add = self.__add_fold
+
+    def __len__(self):
+        return len(self.data)
+
+    def __add_append(self, key, value):
+        values = self.data.get(key)
+        if values is None:
+            self.data[key] = [value]
+            self.size += (
+                sizeof(key) + sizeof(value) + _DICT_ITEM_SIZE + _LIST_SIZE +
+                _PTR_SIZE
+            )
+        else:
+            values.append(value)
+            self.size += sizeof(value) + _PTR_SIZE
+        return self.size >= self.max_size
+
+    def __add_sum(self, key, value):
+        acc = self.data.get(key, _MISSING)
+        if acc is _MISSING:
+            self.data[key] = value
+            self.size += sizeof(key) + sizeof(value) + _DICT_ITEM_SIZE
+        else:
+            self.data[key] = new_acc = acc + value
+            self.size += sizeof(new_acc) - sizeof(acc)
+        return self.size >= self.max_size
+
+    def __add_count(self, key, value):
+        acc = self.data.get(key, _MISSING)
+        if acc is _MISSING:
+            self.data[key] = 1
+            self.size += sizeof(key) + sizeof(1) + _DICT_ITEM_SIZE
+        else:
+            self.data[key] = new_acc = acc + 1
+            self.size += sizeof(new_acc) - sizeof(acc)
+        return self.size >= self.max_size
+
+    def __add_fold(self, key, value):
+        acc = self.data.get(key, _MISSING)
+        if acc is _MISSING:
+            if self.start:
+                value = self.start(value)
+            self.data[key] = value
+            self.size += sizeof(key) + sizeof(value) + _DICT_ITEM_SIZE
+        else:
+            self.data[key] = new_acc = self.fold(acc, value)
+            self.size += sizeof(new_acc) - sizeof(acc)
+        return self.size >= self.max_size
+
+    def items(self):
+        """\
+        Iterate over ``(key, values)`` pairs, where ``values`` is a list.
+        """
+        keys = sorted(self.data) if self.sort else self.data
+        if self.fold:
+            for k in keys:
+                yield k, [self.data[k]]
+        else:
+            for k in keys:
+                yield k, self.data[k]
+
+    def clear(self):
+        self.data.clear()
+        self.size = 0
+
+
+class SumAggregator(api.Aggregator):
+    fold = staticmethod(operator.add)
+
+
+class MinAggregator(api.Aggregator):
+    fold = staticmethod(min)
+
+
+class MaxAggregator(api.Aggregator):
+    fold = staticmethod(max)
+
+
+class CountAggregator(api.Aggregator):
+    """\
+    Counts values for each key (the reducer must then sum the counts).
+    """
+
+    start = staticmethod(_count_start)
+    fold = staticmethod(_count_fold)
+
+
+AGGREGATORS = {
+    "sum": SumAggregator,
+    "min": MinAggregator,
+    "max": MaxAggregator,
+    "count": CountAggregator,
+}
+
+
+class AggregatingCombiner(api.Combiner):
+    """\
+    A combiner that folds values with an :class:`~.api.Aggregator`.
+
+    Since it has a ``fold`` method, the map task keeps a single running value
+    for each key, and this combiner only needs to emit it at spill time.
+    """
+
+    def __init__(self, context, aggregator):
+        super(AggregatingCombiner, self).__init__(context)
+        self.fold = aggregator.fold
+        self.start = aggregator.start
+
+    def reduce(self, context):
+        for value in context.values:
+            context.emit(context.key, value)
+
+
 def write_opaque_splits(splits, f):
     write_int_writable(len(splits), f)
     for s in splits:
@@ -125,6 +301,10 @@ class TaskContext(api.Context):
     JOB_OUTPUT_DIR = "mapreduce.output.fileoutputformat.outputdir"
     TASK_OUTPUT_DIR = "mapreduce.task.output.dir"
     TASK_PARTITION = "mapreduce.task.partition"
+    SORT_MB = "mapreduce.task.io.sort.mb"
+    COMBINER_SORT = "pydoop.mapreduce.combiner.sort"
+    PRIVATE_ENCODING = "pydoop.mapreduce.private.encoding"
+    PRIVATE_KEY_ENCODING = "pydoop.mapreduce.private.key.encoding"
 
     def __init__(self, factory, **kwargs):
         self.factory = factory
@@ -143,17 +323,27 @@ class TaskContext(api.Context):
         self.task_type = None
         self.avro_key_serializer = None
         self.avro_value_serializer = None
-        self._private_encoding = kwargs.get("private_encoding", True)
+        private_encoding = kwargs.get("private_encoding", True)
+        self._private_encoding = bool(private_encoding)
+        self.__codec_name = (
+            None if isinstance(private_encoding, bool) else private_encoding
+        )
+        self.__key_codec_name = kwargs.get("private_key_encoding")
+        # delayed until job conf is available
+        self._key_codec = self._value_codec = None
+        self.__key_dumps = self.__value_dumps = None
         self._raw_split = None
         self._input_split = None
         self._job_conf = {}
         self._key = None
         self._value = None
+        self._keys = None
         self._values = None
+        self._phase_timer = None
+        if kwargs.get("profile_phases", _env_flag(PROFILE_PHASES)):
+            self._phase_timer = PhaseTimer()
         self.__auto_serialize = kwargs.get("auto_serialize", True)
-        self.__cache = {}
-        self.__cache_size = 0
-        self.__spill_size = None  # delayed until (if) create_combiner
+        self.__cache = None  # delayed until (if) create_combiner
         self.__spilling = True  # enable actual emit
 
     def get_input_split(self, raw=False):
@@ -175,14 +365,20 @@ class TaskContext(api.Context):
     def get_input_value(self):
         return self._value
 
+    def get_input_keys(self):
+        return self._keys
+
     def get_input_values(self):
         return self._values
 
     def create_combiner(self):
         self.combiner = self.factory.create_combiner(self)
         if self.combiner:
-            self.__spill_size = 1024 * 1024 * self.job_conf.get_int(
-                "mapreduce.task.io.sort.mb", 100
+            self.__cache = CombinerCache(
+                1024 * 1024 * self.job_conf.get_int(self.SORT_MB, 100),
+                fold=getattr(self.combiner, "fold", None),
+                sort=self.job_conf.get_bool(self.COMBINER_SORT, True),
+                start=getattr(self.combiner, "start", None),
             )
             self.__spilling = False
         return self.combiner
@@ -254,6 +450,35 @@ class TaskContext(api.Context):
         self.uplink.authenticate(response_digest)
         self.uplink.flush()
 
+    def _setup_private_encoding(self):
+        name = self.__codec_name or self._job_conf.get(
+            self.PRIVATE_ENCODING, codec.DEFAULT_CODEC
+        )
+        key_name = self.__key_codec_name or self._job_conf.get(
+            self.PRIVATE_KEY_ENCODING, name
+        )
+        self._value_codec = codec.get_codec(name)
+        self._key_codec = codec.get_codec(key_name)
+        self.__value_dumps = self._value_codec.dumps
+        self.__key_dumps = self._key_codec.dumps
+
+    def _instrument(self):
+        timer = self._phase_timer
+        if not timer:
+            return
+        timer.wrap_methods(self.mapper, "map", "map", "map_batch")
+        timer.wrap_methods(self.reducer, "reduce", "reduce")
+        timer.wrap_methods(self.combiner, "combine", "reduce")
+        timer.wrap_methods(self.partitioner, "partition", "partition")
+        timer.wrap_methods(self.record_writer, "write", "emit")
+        timer.wrap_methods(
+            self.uplink, "write", "output", "partitioned_output", "outputs",
+            "partitioned_outputs", "flush"
+        )
+        self.__maybe_serialize = timer.wrap(
+            "serialize", self.__maybe_serialize
+        )
+
     def _setup_avro_ser(self):
         try:
             from pydoop.avrolib import AvroSerializer
@@ -272,7 +497,7 @@ class TaskContext(api.Context):
 
     def __maybe_serialize(self, key, value):
         if self.task_type == "m" and self._private_encoding:
-            return dumps(key, HIGHEST_PROTOCOL), dumps(value, HIGHEST_PROTOCOL)
+            return self.__key_dumps(key), self.__value_dumps(value)
         if self.avro_key_serializer:
             key = self.avro_key_serializer.serialize(key)
         elif self.__auto_serialize:
@@ -300,12 +525,35 @@ class TaskContext(api.Context):
             self.__actual_emit(key, value)
         else:
             # key must be hashable
-            self.__cache.setdefault(key, []).append(value)
-            self.__cache_size += sizeof(key) + sizeof(value)
-            if self.__cache_size >= self.__spill_size:
+            if self.__cache.add(key, value):
                 self.__spill_all()
         self.progress()
 
+    def emit_many(self, pairs):
+        """\
+        Handle a batch of output key/value pairs.
+
+        Keys and values are serialized (and partitioned) in Python, but all
+        of them are written to the uplink stream with a single native call.
+        When a combiner is caching or a Python record writer is in use, this
+        falls back to calling :meth:`emit` for each pair.
+        """
+        if self.record_writer or not self.__spilling:
+            for key, value in pairs:
+                self.emit(key, value)
+            return
+        keys, values = [], []
+        for key, value in pairs:
+            key, value = self.__maybe_serialize(key, value)
+            keys.append(key)
+            values.append(value)
+        if self.partitioner:
+            parts = [self.partitioner.partition(k, self.nred) for k in keys]
+            self.uplink.partitioned_outputs(parts, keys, values)
+        else:
+            self.uplink.outputs(keys, values)
+        self.progress()
+
     def __actual_emit(self, key, value):
         if self.record_writer:
             self.record_writer.emit(key, value)
@@ -319,12 +567,10 @@ class TaskContext(api.Context):
 
     def __spill_all(self):
         self.__spilling = True
-        for k in sorted(self.__cache):
-            self._key = k
-            self._values = iter(self.__cache[k])
+        for self._key, values in self.__cache.items():
+            self._values = iter(values)
             self.combiner.reduce(self)
         self.__cache.clear()
-        self.__cache_size = 0
         self.__spilling = False
 
     def close(self):
@@ -344,6 +590,8 @@ class TaskContext(api.Context):
                 self.record_writer.close()
             if self.reducer:
                 self.reducer.close()
+            if self._phase_timer:
+                self._phase_timer.report(self)
             self.__spill_counters()
         finally:
             self.uplink.done()
@@ -372,19 +620,38 @@ class TaskContext(api.Context):
 
 
 class Factory(api.Factory):
+    """\
+    Create components from the given classes.
+
+    Instead of a combiner class, an ``aggregate`` argument can be passed to
+    have the map task fold output values for each key. This can be either
+    the name of a built-in aggregator (``"sum"``, ``"min"``, ``"max"`` or
+    ``"count"``) or an :class:`~.api.Aggregator` object.
+    """
 
     def __init__(self, mapper_class,
                  reducer_class=None,
                  combiner_class=None,
                  partitioner_class=None,
                  record_writer_class=None,
-                 record_reader_class=None):
+                 record_reader_class=None,
+                 aggregate=None):
         self.mclass = mapper_class
         self.rclass = reducer_class
         self.cclass = combiner_class
         self.pclass = partitioner_class
         self.rwclass = record_writer_class
         self.rrclass = record_reader_class
+        self.aggregator = None
+        if aggregate is not None:
+            if combiner_class:
+                raise ValueError("can't set both a combiner and an aggregator")
+            try:
+                self.aggregator = AGGREGATORS[aggregate]()
+            except (KeyError, TypeError):
+                if not isinstance(aggregate, api.Aggregator):
+                    raise ValueError("invalid aggregator: %r" % (aggregate,))
+                self.aggregator = aggregate
 
     def create_mapper(self, context):
         return self.mclass(context)
@@ -393,6 +660,8 @@ class Factory(api.Factory):
         return None if not self.rclass else self.rclass(context)
 
     def create_combiner(self, context):
+        if self.aggregator:
+            return AggregatingCombiner(context, self.aggregator)
         return None if not self.cclass else self.cclass(context)
 
     def create_partitioner(self, context):
@@ -411,6 +680,26 @@ def _run(context, **kwargs):
             pass
 
 
+def _put_stats(context, local_fn, stats_dir, **kwargs):
+    import pydoop.hdfs as hdfs
+    hdfs.mkdir(stats_dir)
+    fmt = kwargs.get("pstats_fmt", os.getenv(PSTATS_FMT, DEFAULT_PSTATS_FMT))
+    name = fmt % (
+        context.task_type,
+        context.get_task_partition(),
+        os.path.basename(local_fn)
+    )
+    hdfs.put(local_fn, hdfs.path.join(stats_dir, name))
+
+
+def _write_stats(context, stats_dir, suffix, write, **kwargs):
+    import tempfile
+    fd, fn = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, "w") as f:
+        write(f)
+    _put_stats(context, fn, stats_dir, **kwargs)
+
+
 def run_task(factory, **kwargs):
     """\
     Run a MapReduce task.
@@ -422,41 +711,77 @@ def run_task(factory, **kwargs):
     * ``raw_values`` (default: :obj:`False`): pass map input values to context
       as byte strings (ignore any type information)
     * ``private_encoding`` (default: :obj:`True`): automatically serialize map
-      output k/v and deserialize reduce input k/v (pickle)
+      output k/v and deserialize reduce input k/v. If this is the name of a
+      codec (e.g., ``"marshal"``), use that codec; otherwise, use the one set
+      via the ``pydoop.mapreduce.private.encoding`` job configuration
+      property or, if that's not set, pickle (see :mod:`~.codec`)
+    * ``private_key_encoding``: if private encoding is enabled, use this
+      codec for keys (e.g., ``"ordered"``, to have Hadoop sort keys by
+      value). Defaults to the ``pydoop.mapreduce.private.key.encoding`` job
+      configuration property or, if that's not set, to the value codec
     * ``auto_serialize`` (default: :obj:`True`): automatically serialize reduce
       output (map output in map-only jobs) k/v (call str/unicode then encode as
       utf-8)
+    * ``zero_copy`` (default: :obj:`False`): pass input keys and values that
+      are not deserialized (e.g., when ``raw_keys`` or ``raw_values`` are
+      set) as memoryviews over reusable buffers rather than as new byte
+      strings. Each view is only valid until the next record is read, so it
+      must be copied (e.g., with ``bytes``) if it needs to be kept around.
+      Not applied to batches passed to :meth:`~.api.Mapper.map_batch`, nor
+      to reduce values
+    * ``map_batch_size`` (default: 1024): maximum number of input records
+      passed to :meth:`~.api.Mapper.map_batch` at once (ignored if the mapper
+      does not override it)
+    * ``reduce_chunk_size`` (default: 1024): maximum number of reduce values
+      read from upstream at once
 
     Advanced keyword arguments:
 
     * ``pstats_dir``: run the task with cProfile and store stats in this dir
     * ``pstats_fmt``: use this pattern for pstats filenames (experts only)
-
-    The pstats dir and filename pattern can also be provided via ``pydoop
-    submit`` arguments, with lower precedence in case of clashes.
+    * ``profile_phases``: measure wall clock and CPU time spent in each task
+      phase (``deserialize``, ``map``, ``serialize``, ``partition``,
+      ``write``, ``combine``, ``reduce`` and ``other``) and report it via
+      counters in the ``"Pydoop Phases"`` group. This is much cheaper than
+      cProfile, which is not used when this option is set: if ``pstats_dir``
+      is also set, a JSON summary of phase times is stored there instead
+    * ``sample_interval``: if ``pstats_dir`` is set, profile the task with a
+      statistical sampler rather than cProfile, taking a sample of the call
+      stack every ``sample_interval`` seconds of CPU time. Samples are stored
+      in ``pstats_dir`` in the collapsed stacks format used by flame graph
+      tools (they can be merged with ``pydoop stacks``)
+
+    The pstats dir and filename pattern, as well as phase profiling and
+    sampling, can also be enabled via ``pydoop submit`` arguments, with lower
+    precedence in case of clashes.
     """
     context = TaskContext(factory, **kwargs)
     pstats_dir = kwargs.get("pstats_dir", os.getenv(PSTATS_DIR))
-    if pstats_dir:
+    sample_interval = kwargs.get(
+        "sample_interval", os.getenv(SAMPLE_INTERVAL)
+    )
+    sampler = None
+    if pstats_dir and sample_interval:
+        sampler = StackSampler(float(sample_interval))
+    if pstats_dir and not (context._phase_timer or sampler):
         import cProfile
         import tempfile
-        import pydoop.hdfs as hdfs
-        hdfs.mkdir(pstats_dir)
         fd, pstats_fn = tempfile.mkstemp(suffix=".pstats")
         os.close(fd)
         cProfile.runctx(
             "_run(context, **kwargs)", globals(), locals(),
             filename=pstats_fn
         )
-        pstats_fmt = kwargs.get(
-            "pstats_fmt",
-            os.getenv(PSTATS_FMT, DEFAULT_PSTATS_FMT)
-        )
-        name = pstats_fmt % (
-            context.task_type,
-            context.get_task_partition(),
-            os.path.basename(pstats_fn)
-        )
-        hdfs.put(pstats_fn, hdfs.path.join(pstats_dir, name))
+        _put_stats(context, pstats_fn, pstats_dir, **kwargs)
+    elif sampler:
+        with sampler:
+            _run(context, **kwargs)
+        _write_stats(context, pstats_dir, ".stacks", sampler.dump, **kwargs)
     else:
         _run(context, **kwargs)
+    if pstats_dir and context._phase_timer:
+        import json
+
+        def write(f):
+            json.dump(context._phase_timer.summary(), f, sort_keys=True)
+        _write_stats(context, pstats_dir, ".json", write, **kwargs)
@@ -0,0 +1,209 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright 2009-2024 CRS4.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Low-overhead task profiling.
+
+Rather than tracing every function call like ``cProfile``, the phase timer
+only measures a few entry points (user methods, serialization, uplink
+writes, etc.), which are wrapped when the task starts. Time spent in nested
+phases (e.g., serialization triggered by an ``emit`` from ``map``) is only
+accounted to the innermost one, so phase times add up to the time spent in
+instrumented code, and the remainder is the cost of the framework itself.
+
+The stack sampler, on the other hand, periodically records the Python call
+stack from a ``SIGPROF`` handler, and dumps it in the "collapsed stacks"
+format (one ``frame;frame;... count`` line per distinct stack) used by
+flame graph tools. Sampling interval is in CPU seconds.
+"""
+
+import os
+import signal
+import time
+
+try:
+    _wall, _cpu = time.perf_counter, time.process_time
+except AttributeError:  # py2
+    _wall, _cpu = time.time, time.clock
+
+PHASE_COUNTER_GROUP = "Pydoop Phases"
+OTHER = "other"
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+
+class PhaseTimer(object):
+    """\
+    Accumulate wall clock and CPU time spent in each task phase.
+    """
+
+    def __init__(self):
+        self.stats = {}  # phase: [wall (s), cpu (s), calls]
+        self.__child = [0.0, 0.0]  # time spent in nested phases
+        self.__start = (_wall(), _cpu())
+
+    def wrap(self, phase, func):
+        stats = self.stats.setdefault(phase, [0.0, 0.0, 0])
+
+        def timed(*args, **kwargs):
+            outer = self.__child
+            self.__child = inner = [0.0, 0.0]
+            wall, cpu = _wall(), _cpu()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall, cpu = _wall() - wall, _cpu() - cpu
+                stats[0] += wall - inner[0]
+                stats[1] += cpu - inner[1]
+                stats[2] += 1
+                outer[0] += wall
+                outer[1] += cpu
+                self.__child = outer
+
+        return timed
+
+    def wrap_methods(self, obj, phase, *names):
+        """\
+        Replace methods of ``obj`` with timed ones (at the instance level).
+
+        Missing objects and methods are skipped.
+        """
+        if obj is None:
+            return
+        for n in names:
+            try:
+                setattr(obj, n, self.wrap(phase, getattr(obj, n)))
+            except AttributeError:
+                pass
+
+    def summary(self):
+        """\
+        Get a ``{phase: {"wall": s, "cpu": s, "calls": n}}`` dict.
+
+        The ``"other"`` entry holds the time spent outside all phases since
+        the timer was created.
+        """
+        wall = _wall() - self.__start[0]
+        cpu = _cpu() - self.__start[1]
+        rval = {}
+        for phase, (w, c, n) in self.stats.items():
+            if n:
+                rval[phase] = {"wall": w, "cpu": c, "calls": n}
+                wall -= w
+                cpu -= c
+        rval[OTHER] = {"wall": max(wall, 0.0), "cpu": max(cpu, 0.0)}
+        return rval
+
+    def report(self, context):
+        """\
+        Add phase times (in ms) to the task's counters.
+        """
+        for phase, d in sorted(self.summary().items()):
+            for kind in "wall", "cpu":
+                c = context.get_counter(PHASE_COUNTER_GROUP, "%s_%s (ms)" % (
+                    phase.upper(), kind.upper()
+                ))
+                context.increment_counter(c, int(1000 * d[kind]))
+
+
+def _frame_label(code):
+    return "%s (%s:%d)" % (
+        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+    )
+
+
+class StackSampler(object):
+    """\
+    Statistical profiler based on ``SIGPROF``.
+
+    Only the main thread is sampled, and only one sampler can be active at
+    any given time.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        if interval <= 0:
+            raise ValueError("sampling interval must be positive")
+        self.interval = interval
+        self.counts = {}  # stack (tuple of code objects): n. of samples
+        self.__old_handler = None
+
+    def __sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack = tuple(stack)
+        self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def start(self):
+        self.__old_handler = signal.signal(signal.SIGPROF, self.__sample)
+        # restart system calls (e.g., reads from the pipes socket) instead
+        # of failing them with EINTR
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.__old_handler or signal.SIG_DFL)
+        self.__old_handler = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def collapsed(self):
+        """\
+        Get a ``{"frame;frame;...": count}`` dict, outermost frame first.
+        """
+        rval = {}
+        labels = {}
+        for stack, n in self.counts.items():
+            for code in stack:
+                if code not in labels:
+                    labels[code] = _frame_label(code)
+            k = ";".join(labels[_] for _ in reversed(stack))
+            rval[k] = rval.get(k, 0) + n
+        return rval
+
+    def dump(self, f):
+        dump_stacks(self.collapsed(), f)
+
+
+def load_stacks(lines, counts=None):
+    """\
+    Read collapsed stacks from ``lines`` (e.g., a file open in text mode).
+
+    If ``counts`` is provided, add to it (this can be used to merge the
+    profiles of several tasks) and return it.
+    """
+    if counts is None:
+        counts = {}
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line:
+            continue
+        stack, n = line.rsplit(" ", 1)
+        counts[stack] = counts.get(stack, 0) + int(n)
+    return counts
+
+
+def dump_stacks(counts, f):
+    for stack in sorted(counts):
+        f.write("%s %d\n" % (stack, counts[stack]))
@@ -63,6 +63,7 @@ os.environ['OPT'] = ' '.join(
 
 from setuptools import setup, find_packages, Extension
 from setuptools.command.build_ext import build_ext
+from setuptools.command.build_py import build_py
 from distutils.command.build import build
 from distutils.errors import DistutilsSetupError, CompileError
 from distutils import log
@@ -82,6 +83,9 @@ if sys.version_info[0] == 3:
 else:
     CONSOLE_SCRIPTS.append('pydoop2 = pydoop.app.main:main')
 
+# modules whose syntax is not valid in Python 2
+PY3_ONLY_MODULES = [("pydoop.hdfs", "aio")]
+
 
 # ---------
 # UTILITIES
@@ -162,6 +166,7 @@ EXTENSION_MODULES = [
         'pydoop.sercore',
         sources=[
             "src/sercore/hu_extras.cpp",
+            "src/sercore/ordered.cpp",
             "src/sercore/sercore.cpp",
             "src/sercore/streams.cpp",
             "src/sercore/HadoopUtils/SerialUtils.cc",
@@ -295,6 +300,15 @@ class BuildPydoopExt(build_ext):
         build_ext.build_extension(self, ext)
 
 
+class BuildPydoopPy(build_py):
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[0] == 3:
+            return modules
+        return [_ for _ in modules if _[:2] not in PY3_ONLY_MODULES]
+
+
 class BuildPydoop(build):
 
     def build_java(self):
@@ -348,6 +362,7 @@ setup(
     cmdclass={
         "build": BuildPydoop,
         "build_ext": BuildPydoopExt,
+        "build_py": BuildPydoopPy,
     },
     entry_points={'console_scripts': CONSOLE_SCRIPTS},
     platforms=["Linux"],
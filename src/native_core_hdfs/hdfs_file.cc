@@ -19,9 +19,18 @@
 
 #include "hdfs_file.h"
 #include <stdio.h>
+#include <limits.h>
+#include <string.h>
+#include <algorithm>
+#include <atomic>
+#include <thread>
+#include <vector>
 
 #define PYDOOP_TEXT_ENCODING  "utf-8"
 
+/* minimum size of the buffer used by readlines_batch */
+#define LINE_BUFFER_SIZE  (1 << 20)
+
 
 PyObject* FileClass_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 {
@@ -44,13 +53,40 @@ PyObject* FileClass_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
         self->replication = 1;
         self->blocksize = 0;
         self->closed = 0;
+        self->lbuf = NULL;
+        self->lb_size = self->lb_start = self->lb_end = 0;
     }
     return (PyObject *)self;
 }
 
 
+static void _lb_free(FileInfo* self) {
+    free(self->lbuf);
+    self->lbuf = NULL;
+    self->lb_size = self->lb_start = self->lb_end = 0;
+}
+
+
+/* Number of bytes in the line buffer that have not been consumed yet */
+static inline Py_ssize_t _lb_pending(FileInfo* self) {
+    return self->lb_end - self->lb_start;
+}
+
+
+/* Consume up to `nbytes` bytes from the line buffer, copying them to `buf` */
+static Py_ssize_t _lb_take(FileInfo* self, char* buf, Py_ssize_t nbytes) {
+    Py_ssize_t n = std::min(nbytes, _lb_pending(self));
+    if (n <= 0)
+        return 0;
+    memcpy(buf, self->lbuf + self->lb_start, n);
+    self->lb_start += n;
+    return n;
+}
+
+
 void FileClass_dealloc(FileInfo* self)
 {
+    _lb_free(self);
     self->file = NULL;
     Py_TYPE(self)->tp_free((PyObject*)self);
 }
@@ -92,6 +128,7 @@ int FileClass_init_internal(FileInfo *self, hdfsFS fs, hdfsFile file)
 
 
 PyObject* FileClass_close(FileInfo* self){
+    _lb_free(self);
     int result = hdfsCloseFile(self->fs, self->file);
     if (result < 0) {
         return PyErr_SetFromErrno(PyExc_IOError);
@@ -144,7 +181,7 @@ PyObject* FileClass_available(FileInfo *self){
     if (available < 0)
         return PyErr_SetFromErrno(PyExc_IOError);
     else
-        return PyLong_FromLong(available);
+        return PyLong_FromSsize_t(available + _lb_pending(self));
 }
 
 static int _ensure_open_for_reading(FileInfo* self) {
@@ -163,6 +200,11 @@ static Py_ssize_t _read_into_pybuf(FileInfo *self, char* buf, Py_ssize_t nbytes)
         return -1;
     }
 
+    // data left over by readlines_batch comes first
+    if (_lb_pending(self) > 0)
+        return _lb_take(self, buf, nbytes);
+    self->lb_start = self->lb_end = 0;  // reading moves past the buffer
+
     tSize bytes_read;
     Py_BEGIN_ALLOW_THREADS;
         bytes_read = hdfsRead(self->fs, self->file, buf, nbytes);
@@ -209,7 +251,9 @@ static PyObject* _read_new_pybuf(FileInfo* self, Py_ssize_t nbytes) {
 }
 
 /*
- * Seek to `pos` and read `nbytes` bytes into a the provided buffer.
+ * Read `nbytes` bytes starting from `pos` into the provided buffer, without
+ * moving the current file position. Since it does not seek, this can run
+ * concurrently with other reads on the same file, so the GIL is released.
  *
  * \return: Number of bytes read. In case of error this function sets
  * the appropriate Python exception and returns -1.
@@ -217,29 +261,16 @@ static PyObject* _read_new_pybuf(FileInfo* self, Py_ssize_t nbytes) {
 static Py_ssize_t _pread_into_pybuf(FileInfo *self, char* buffer, Py_ssize_t pos,
                                     Py_ssize_t nbytes) {
 
-    Py_ssize_t orig_position = hdfsTell(self->fs, self->file);
-    if (orig_position < 0) {
-        PyErr_SetFromErrno(PyExc_IOError);
-        return -1;
-    }
-
-    if (hdfsSeek(self->fs, self->file, pos) < 0) {
-        PyErr_SetFromErrno(PyExc_IOError);
-        return -1;
-    }
-
-    tSize bytes_read = _read_into_pybuf(self, buffer, nbytes);
+    tSize bytes_read;
+    Py_BEGIN_ALLOW_THREADS;
+        bytes_read = hdfsPread(self->fs, self->file, pos, buffer, nbytes);
+    Py_END_ALLOW_THREADS;
 
     if (bytes_read < 0) {
         PyErr_SetFromErrno(PyExc_IOError);
         return -1;
     }
 
-    if (hdfsSeek(self->fs, self->file, orig_position) < 0) {
-        PyErr_SetFromErrno(PyExc_IOError);
-        return -1;
-    }
-
     return bytes_read;
 }
 
@@ -296,6 +327,213 @@ PyObject* FileClass_read(FileInfo *self, PyObject *args, PyObject *kwds){
 }
 
 
+/*
+ * Read everything from the current position to EOF into a single buffer
+ * object. Since the file size is known at open time, the buffer is
+ * allocated once and filled in place (hdfsRead may stop at block
+ * boundaries, so we loop). If the file turns out to be longer than
+ * expected, the buffer is grown; at the end it's shrunk to the actual
+ * number of bytes read. This is what io.BufferedReader.read() calls.
+ */
+PyObject* FileClass_readall(FileInfo *self) {
+
+    if (!_ensure_open_for_reading(self))
+        return NULL;
+
+    tOffset pos;
+    Py_BEGIN_ALLOW_THREADS;
+        pos = hdfsTell(self->fs, self->file);
+    Py_END_ALLOW_THREADS;
+    if (pos < 0)
+        return PyErr_SetFromErrno(PyExc_IOError);
+    pos -= _lb_pending(self);
+
+    Py_ssize_t min_size = self->buff_size > 0 ? self->buff_size : 65536;
+    Py_ssize_t alloc = (Py_ssize_t)(self->size - pos);
+    alloc = std::max(alloc, std::max(min_size, _lb_pending(self)));
+    PyObject* retval = _PyBuf_FromStringAndSize(NULL, alloc);
+    if (!retval) return PyErr_NoMemory();
+
+    Py_ssize_t filled = _lb_take(self, _PyBuf_AS_STRING(retval), alloc);
+    self->lb_start = self->lb_end = 0;
+    while (1) {
+        if (filled == alloc) {
+            alloc += alloc / 2;
+            if (_PyBuf_Resize(&retval, alloc) < 0)
+                return NULL;
+        }
+        tSize chunk = (tSize)std::min<Py_ssize_t>(alloc - filled, INT_MAX);
+        char* buf = _PyBuf_AS_STRING(retval) + filled;
+        tSize bytes_read;
+        Py_BEGIN_ALLOW_THREADS;
+            bytes_read = hdfsRead(self->fs, self->file, buf, chunk);
+        Py_END_ALLOW_THREADS;
+        if (bytes_read < 0) {
+            Py_DECREF(retval);
+            return PyErr_SetFromErrno(PyExc_IOError);
+        }
+        if (bytes_read == 0)
+            break;
+        filled += bytes_read;
+    }
+
+    if (filled < alloc && _PyBuf_Resize(&retval, filled) < 0)
+        return NULL;
+    return retval;
+}
+
+
+typedef std::vector<std::pair<Py_ssize_t, Py_ssize_t> > _LineSpans;
+
+/*
+ * Find up to `n` lines in the line buffer, refilling it from the file as
+ * needed, and store their [start, end) offsets in `lines`. The buffer is
+ * only compacted or refilled while no line has been found yet, so the
+ * offsets stay valid. Does not touch Python objects, so that it can run
+ * without the GIL.
+ *
+ * \return: 0 on success, an errno value otherwise.
+ */
+static int _scan_lines(FileInfo* self, Py_ssize_t n, _LineSpans& lines) {
+    Py_ssize_t start = self->lb_start, scan = self->lb_start;
+    while ((Py_ssize_t)lines.size() < n) {
+        char* nl = NULL;
+        if (scan < self->lb_end)
+            nl = (char*)memchr(self->lbuf + scan, '\n', self->lb_end - scan);
+        if (nl) {
+            Py_ssize_t end = nl - self->lbuf + 1;
+            lines.push_back(std::make_pair(start, end));
+            start = scan = end;
+            continue;
+        }
+        if (!lines.empty())
+            break;
+        if (start > 0) {  // move the incomplete line to the front
+            memmove(self->lbuf, self->lbuf + start, self->lb_end - start);
+            self->lb_end -= start;
+            scan = self->lb_end;
+            self->lb_start = start = 0;
+        }
+        if (self->lb_end == self->lb_size) {
+            Py_ssize_t new_size = std::max<Py_ssize_t>(
+                2 * self->lb_size,
+                std::max(self->buff_size, LINE_BUFFER_SIZE));
+            char* new_buf = (char*)realloc(self->lbuf, new_size);
+            if (!new_buf)
+                return ENOMEM;
+            self->lbuf = new_buf;
+            self->lb_size = new_size;
+        }
+        tSize chunk = (tSize)std::min<Py_ssize_t>(
+            self->lb_size - self->lb_end, INT_MAX);
+        errno = 0;
+        tSize bytes_read = hdfsRead(self->fs, self->file,
+                                    self->lbuf + self->lb_end, chunk);
+        if (bytes_read < 0)
+            return errno ? errno : EIO;
+        if (bytes_read == 0) {  // EOF: the last line has no newline
+            if (self->lb_end > start)
+                lines.push_back(std::make_pair(start, self->lb_end));
+            break;
+        }
+        scan = self->lb_end;
+        self->lb_end += bytes_read;
+    }
+    return 0;
+}
+
+
+/*
+ * Read up to `n` lines (fewer at EOF, none past it). Newlines are looked
+ * for in a large buffer, refilled and scanned with the GIL released, and
+ * lines are returned in a list. Data left in the buffer is consumed by
+ * subsequent reads, and tell() and seek() take it into account.
+ */
+PyObject* FileClass_readlines_batch(FileInfo *self, PyObject *args,
+                                    PyObject *kwds) {
+
+    Py_ssize_t n = 0;
+
+    if (!_ensure_open_for_reading(self))
+        return NULL;
+
+    if (!PyArg_ParseTuple(args, "n", &n))
+        return NULL;
+
+    if (n < 0) {
+        PyErr_SetString(PyExc_ValueError, "n must be >= 0");
+        return NULL;
+    }
+
+    _LineSpans lines;
+    int error;
+    Py_BEGIN_ALLOW_THREADS;
+        error = _scan_lines(self, n, lines);
+    Py_END_ALLOW_THREADS;
+    if (error) {
+        errno = error;
+        return PyErr_SetFromErrno(PyExc_IOError);
+    }
+
+    PyObject* retval = PyList_New(lines.size());
+    if (!retval)
+        return NULL;
+    for (size_t i = 0; i < lines.size(); ++i) {
+        PyObject* line = _PyBuf_FromStringAndSize(
+            self->lbuf + lines[i].first, lines[i].second - lines[i].first);
+        if (!line) {
+            Py_DECREF(retval);
+            return NULL;
+        }
+        PyList_SET_ITEM(retval, i, line);
+    }
+    if (!lines.empty())
+        self->lb_start = lines.back().second;
+    return retval;
+}
+
+
+/*
+ * Push back `data`, which must be the bytes that were read right before the
+ * current position, so that subsequent reads return it again.
+ */
+PyObject* FileClass_unread(FileInfo *self, PyObject *args, PyObject *kwds) {
+
+    Py_buffer buffer = {NULL, NULL};
+
+    if (!_ensure_open_for_reading(self))
+        return NULL;
+
+    if (!PyArg_ParseTuple(args, "s*", &buffer))
+        return NULL;
+
+    Py_ssize_t n = buffer.len;
+    if (n <= self->lb_start) {  // the usual case: it's still in the buffer
+        self->lb_start -= n;
+        memmove(self->lbuf + self->lb_start, buffer.buf, n);
+    } else {
+        Py_ssize_t pending = _lb_pending(self);
+        Py_ssize_t new_size = std::max<Py_ssize_t>(
+            n + pending, std::max(self->buff_size, LINE_BUFFER_SIZE));
+        char* new_buf = (char*)malloc(new_size);
+        if (!new_buf) {
+            PyBuffer_Release(&buffer);
+            return PyErr_NoMemory();
+        }
+        memcpy(new_buf, buffer.buf, n);
+        if (pending > 0)
+            memcpy(new_buf + n, self->lbuf + self->lb_start, pending);
+        free(self->lbuf);
+        self->lbuf = new_buf;
+        self->lb_size = new_size;
+        self->lb_start = 0;
+        self->lb_end = n + pending;
+    }
+    PyBuffer_Release(&buffer);
+    Py_RETURN_NONE;
+}
+
+
 PyObject* FileClass_read_chunk(FileInfo *self, PyObject *args, PyObject *kwds){
 
     Py_buffer buffer = {NULL, NULL};
@@ -372,6 +610,232 @@ PyObject* FileClass_pread_chunk(FileInfo *self, PyObject *args, PyObject *kwds){
 }
 
 
+/*
+ * Vectored pread support. Requested ranges are sorted and those that are
+ * closer than max_gap bytes are merged into a single span, which is read
+ * with one or more hdfsPread calls into a temporary buffer and then copied
+ * to the destinations. Spans with a single range are read directly into
+ * the destination. All reads are done without holding the GIL, possibly
+ * by several threads.
+ */
+struct _PreadRange {
+    tOffset offset;
+    Py_ssize_t length;
+    char* dest;
+    Py_ssize_t bytes_read;
+};
+
+struct _PreadSpan {
+    tOffset start;
+    Py_ssize_t length;
+    std::vector<size_t> ranges;
+    Py_ssize_t bytes_read;
+    int error;
+};
+
+// Read until `nbytes` have been read or EOF is hit
+static Py_ssize_t _pread_full(hdfsFS fs, hdfsFile file, tOffset pos,
+                              char* buffer, Py_ssize_t nbytes, int* error) {
+    Py_ssize_t done = 0;
+    while (done < nbytes) {
+        tSize n = (tSize)std::min(nbytes - done, (Py_ssize_t)INT_MAX);
+        errno = 0;
+        tSize r = hdfsPread(fs, file, pos + done, buffer + done, n);
+        if (r < 0) {
+            *error = errno ? errno : EIO;
+            return -1;
+        }
+        if (r == 0) break;
+        done += r;
+    }
+    return done;
+}
+
+static void _read_span(FileInfo* self, _PreadSpan& span,
+                       std::vector<_PreadRange>& ranges) {
+    if (span.ranges.size() == 1) {
+        _PreadRange& r = ranges[span.ranges[0]];
+        span.bytes_read = r.bytes_read = _pread_full(
+            self->fs, self->file, r.offset, r.dest, r.length, &span.error);
+        return;
+    }
+    std::vector<char> buffer(span.length);
+    span.bytes_read = _pread_full(self->fs, self->file, span.start,
+                                  buffer.data(), span.length, &span.error);
+    if (span.bytes_read < 0) return;
+    for (size_t i = 0; i < span.ranges.size(); ++i) {
+        _PreadRange& r = ranges[span.ranges[i]];
+        Py_ssize_t skip = (Py_ssize_t)(r.offset - span.start);
+        r.bytes_read = std::max((Py_ssize_t)0,
+                                std::min(r.length, span.bytes_read - skip));
+        if (r.bytes_read > 0)
+            memcpy(r.dest, buffer.data() + skip, r.bytes_read);
+    }
+}
+
+static bool _range_offset_lt(const _PreadRange* a, const _PreadRange* b) {
+    return a->offset < b->offset;
+}
+
+static void _read_spans(FileInfo* self, std::vector<_PreadSpan>& spans,
+                        std::vector<_PreadRange>& ranges, int n_threads) {
+    std::atomic<size_t> next(0);
+    auto worker = [&]() {
+        for (size_t i = next++; i < spans.size(); i = next++)
+            _read_span(self, spans[i], ranges);
+    };
+    std::vector<std::thread> threads;
+    n_threads = (int)std::min((size_t)std::max(n_threads, 1), spans.size());
+    for (int i = 1; i < n_threads; ++i) {
+        try {
+            threads.push_back(std::thread(worker));
+        } catch (const std::system_error&) {
+            break;  // go on with the threads we have
+        }
+    }
+    worker();
+    for (size_t i = 0; i < threads.size(); ++i)
+        threads[i].join();
+}
+
+
+PyObject* FileClass_preadv(FileInfo *self, PyObject *args, PyObject *kwds) {
+
+    PyObject *py_ranges = NULL, *py_buffers = Py_None;
+    PyObject *ranges_seq = NULL, *buffers_seq = NULL, *retval = NULL;
+    Py_ssize_t max_gap = 0;
+    int n_threads = 1;
+    std::vector<_PreadRange> ranges;
+    std::vector<Py_buffer> views;
+    std::vector<_PreadSpan> spans;
+    std::vector<_PreadRange*> sorted;
+    Py_ssize_t n = 0, i;
+    bool own_buffers;
+
+    if (!_ensure_open_for_reading(self))
+        return NULL;
+
+    if (!PyArg_ParseTuple(args, "O|Oni", &py_ranges, &py_buffers, &max_gap,
+                          &n_threads))
+        return NULL;
+
+    if (!(ranges_seq = PySequence_Fast(py_ranges, "ranges must be a sequence")))
+        return NULL;
+    n = PySequence_Fast_GET_SIZE(ranges_seq);
+    own_buffers = (py_buffers == Py_None);
+    if (!own_buffers) {
+        buffers_seq = PySequence_Fast(py_buffers, "buffers must be a sequence");
+        if (!buffers_seq) goto error;
+        if (PySequence_Fast_GET_SIZE(buffers_seq) != n) {
+            PyErr_SetString(PyExc_ValueError,
+                            "buffers and ranges must have the same length");
+            goto error;
+        }
+    }
+    if (!(retval = PyList_New(n))) goto error;
+
+    ranges.resize(n);
+    views.reserve(n);
+    for (i = 0; i < n; ++i) {
+        _PreadRange& r = ranges[i];
+        PY_LONG_LONG offset;
+        if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(ranges_seq, i), "Ln",
+                              &offset, &r.length))
+            goto error;
+        if (offset < 0 || r.length < 0) {
+            errno = EINVAL;
+            PyErr_SetFromErrno(PyExc_IOError);
+            errno = 0;
+            goto error;
+        }
+        r.offset = (tOffset)offset;
+        r.bytes_read = 0;
+        if (own_buffers) {
+            PyObject* buf = _PyBuf_FromStringAndSize(NULL, r.length);
+            if (!buf) goto error;
+            PyList_SET_ITEM(retval, i, buf);
+            r.dest = _PyBuf_AS_STRING(buf);
+        } else {
+            Py_buffer view;
+            if (PyObject_GetBuffer(PySequence_Fast_GET_ITEM(buffers_seq, i),
+                                   &view, PyBUF_WRITABLE) < 0)
+                goto error;
+            views.push_back(view);
+            if (view.len < r.length) {
+                PyErr_SetString(PyExc_ValueError,
+                                "buffer is smaller than the requested range");
+                goto error;
+            }
+            r.dest = (char*)view.buf;
+        }
+    }
+
+    // merge ranges (by offset) into spans
+    sorted.resize(n);
+    for (i = 0; i < n; ++i) sorted[i] = &ranges[i];
+    std::stable_sort(sorted.begin(), sorted.end(), _range_offset_lt);
+    for (i = 0; i < n; ++i) {
+        _PreadRange* r = sorted[i];
+        if (r->length == 0) continue;
+        if (spans.empty() ||
+            r->offset > spans.back().start + spans.back().length + max_gap) {
+            _PreadSpan span;
+            span.start = r->offset;
+            span.length = 0;
+            span.bytes_read = 0;
+            span.error = 0;
+            spans.push_back(span);
+        }
+        _PreadSpan& span = spans.back();
+        span.length = std::max(span.length,
+                               (Py_ssize_t)(r->offset + r->length - span.start));
+        span.ranges.push_back(r - &ranges[0]);
+    }
+
+    if (!spans.empty()) {
+        Py_BEGIN_ALLOW_THREADS;
+            _read_spans(self, spans, ranges, n_threads);
+        Py_END_ALLOW_THREADS;
+    }
+
+    for (i = 0; i < (Py_ssize_t)spans.size(); ++i) {
+        if (spans[i].error) {
+            errno = spans[i].error;
+            PyErr_SetFromErrno(PyExc_IOError);
+            errno = 0;
+            goto error;
+        }
+    }
+
+    for (i = 0; i < n; ++i) {
+        if (own_buffers) {
+            if (ranges[i].bytes_read < ranges[i].length) {
+                PyObject* buf = PyList_GET_ITEM(retval, i);
+                if (_PyBuf_Resize(&buf, ranges[i].bytes_read) < 0) {
+                    PyList_SET_ITEM(retval, i, NULL);
+                    goto error;
+                }
+                PyList_SET_ITEM(retval, i, buf);
+            }
+        } else {
+            PyObject* nread = PyLong_FromSsize_t(ranges[i].bytes_read);
+            if (!nread) goto error;
+            PyList_SET_ITEM(retval, i, nread);
+        }
+    }
+    goto done;
+
+error:
+    Py_CLEAR(retval);
+done:
+    for (i = 0; i < (Py_ssize_t)views.size(); ++i)
+        PyBuffer_Release(&views[i]);
+    Py_XDECREF(ranges_seq);
+    Py_XDECREF(buffers_seq);
+    return retval;
+}
+
+
 PyObject* FileClass_seek(FileInfo *self, PyObject *args, PyObject *kwds) {
 
     tOffset position = 0, curpos = 0;
@@ -380,15 +844,18 @@ PyObject* FileClass_seek(FileInfo *self, PyObject *args, PyObject *kwds) {
     if (!PyArg_ParseTuple(args, "n|i", &position, &whence))
         return NULL;
 
-    switch (whence) {
-    case SEEK_SET:
-        break;
-    case SEEK_CUR:
+    if (whence == SEEK_CUR || self->lb_end > 0) {
         curpos = hdfsTell(self->fs, self->file);
         if (curpos < 0) {
             return PyErr_SetFromErrno(PyExc_IOError);
         }
-        position += curpos;
+    }
+
+    switch (whence) {
+    case SEEK_SET:
+        break;
+    case SEEK_CUR:
+        position += curpos - _lb_pending(self);
         break;
     case SEEK_END:
         position += self->size;
@@ -406,6 +873,14 @@ PyObject* FileClass_seek(FileInfo *self, PyObject *args, PyObject *kwds) {
         return NULL;
     }
 
+    /* if the target is within the line buffer, just move in there */
+    if (self->lb_end > 0 && position >= curpos - self->lb_end
+        && position <= curpos) {
+        self->lb_start = (Py_ssize_t)(position - (curpos - self->lb_end));
+        return PyLong_FromLong(position);
+    }
+    self->lb_start = self->lb_end = 0;
+
     if (hdfsSeek(self->fs, self->file, position) < 0) {
 	return PyErr_SetFromErrno(PyExc_IOError);
     }
@@ -417,7 +892,7 @@ PyObject* FileClass_tell(FileInfo *self, PyObject *args, PyObject *kwds){
 
     tOffset offset = hdfsTell(self->fs, self->file);
     if (offset >= 0)
-        return Py_BuildValue("n", offset);
+        return Py_BuildValue("n", offset - _lb_pending(self));
     else {
         PyErr_SetFromErrno(PyExc_IOError);
         return NULL;
@@ -46,6 +46,13 @@ typedef struct {
     short replication;
     int blocksize;
     int closed;
+    /* line reading buffer: lbuf[0:lb_end] holds the file's bytes right
+       before the current hdfs position, lbuf[lb_start:lb_end] those that
+       have not been consumed yet */
+    char *lbuf;
+    Py_ssize_t lb_size;
+    Py_ssize_t lb_start;
+    Py_ssize_t lb_end;
 } FileInfo;
 
 
@@ -85,10 +92,18 @@ PyObject* FileClass_read(FileInfo *self, PyObject *args, PyObject *kwds);
 
 PyObject* FileClass_read_chunk(FileInfo *self, PyObject *args, PyObject *kwds);
 
+PyObject* FileClass_readall(FileInfo *self);
+
+PyObject* FileClass_readlines_batch(FileInfo *self, PyObject *args, PyObject *kwds);
+
+PyObject* FileClass_unread(FileInfo *self, PyObject *args, PyObject *kwds);
+
 PyObject* FileClass_pread(FileInfo *self, PyObject *args, PyObject *kwds);
 
 PyObject* FileClass_pread_chunk(FileInfo *self, PyObject *args, PyObject *kwds);
 
+PyObject* FileClass_preadv(FileInfo *self, PyObject *args, PyObject *kwds);
+
 PyObject* FileClass_seek(FileInfo *self, PyObject *args, PyObject *kwds);
 
 PyObject* FileClass_tell(FileInfo *self, PyObject *args, PyObject *kwds);
@@ -21,6 +21,8 @@
 #include "hdfs_file.h"
 
 #include <sstream>
+#include <string>
+#include <vector>
 #include <hdfs/hdfs.h>
 #include <unicodeobject.h>
 #include <errno.h>
@@ -486,6 +488,51 @@ PyObject *FsClass_create_directory(FsInfo *self, PyObject *args, PyObject *kwds)
     Py_RETURN_NONE;
 }
 
+// The order of these keys MUST match the one in getPathInfoField
+static const char*const pathInfoKeys[] = {
+    "name",
+    "kind",
+    "group",
+    "last_mod",
+    "last_access",
+    "replication",
+    "owner",
+    "permissions",
+    "block_size",
+    "path",
+    "size"
+};
+
+static const int nPathInfoFields = sizeof(pathInfoKeys) / sizeof(pathInfoKeys[0]);
+
+static PyObject* getPathInfoField(hdfsFileInfo* fileInfo, int field) {
+    switch (field) {
+    case 0:
+    case 9:
+        return PyUnicode_FromString(fileInfo->mName);
+    case 1:
+        return PyUnicode_FromString(fileInfo->mKind == kObjectKindDirectory ? "directory" : "file");
+    case 2:
+        return PyUnicode_FromString(fileInfo->mGroup);
+    case 3:
+        return PyLong_FromLong(fileInfo->mLastMod);
+    case 4:
+        return PyLong_FromLong(fileInfo->mLastAccess);
+    case 5:
+        return PyLong_FromSize_t(fileInfo->mReplication);
+    case 6:
+        return PyUnicode_FromString(fileInfo->mOwner);
+    case 7:
+        return PyLong_FromSize_t(fileInfo->mPermissions);
+    case 8:
+        return PyLong_FromLong(fileInfo->mBlockSize);
+    case 10:
+        return PyLong_FromLongLong(fileInfo->mSize);
+    }
+    PyErr_SetString(PyExc_ValueError, "Invalid path info field");
+    return NULL;
+}
+
 /*
  * Works on borrowed reference `dict`.
  *
@@ -496,54 +543,63 @@ PyObject *FsClass_create_directory(FsInfo *self, PyObject *args, PyObject *kwds)
 static int setPathInfo(PyObject* dict, hdfsFileInfo* fileInfo) {
 
     if (dict == NULL || fileInfo == NULL) return -1;
-    int error_code = 0;
-
-    const char*const keys[] = {
-        "name",
-        "kind",
-        "group",
-        "last_mod",
-        "last_access",
-        "replication",
-        "owner",
-        "permissions",
-        "block_size",
-        "path",
-        "size"
-    };
-
-    const int n_fields = sizeof(keys) / sizeof(keys[0]);
-
-    PyObject* values[n_fields];
-    int i = 0;
-    // Prepare the values.  We'll check for all errors in the "set" loop below
-    // The order of these values MUST match the order of the keys above
-    values[i++] = PyUnicode_FromString(fileInfo->mName);
-    values[i++] = PyUnicode_FromString(fileInfo->mKind == kObjectKindDirectory ? "directory" : "file");
-    values[i++] = PyUnicode_FromString(fileInfo->mGroup);
-    values[i++] = PyLong_FromLong(fileInfo->mLastMod);
-    values[i++] = PyLong_FromLong(fileInfo->mLastAccess);
-    values[i++] = PyLong_FromSize_t(fileInfo->mReplication);
-    values[i++] = PyUnicode_FromString(fileInfo->mOwner);
-    values[i++] = PyLong_FromSize_t(fileInfo->mPermissions);
-    values[i++] = PyLong_FromLong(fileInfo->mBlockSize);
-    values[i++] = PyUnicode_FromString(fileInfo->mName);
-    values[i++] = PyLong_FromLongLong(fileInfo->mSize);
-
-    for (i = 0; i < n_fields; ++i) {
-        if (values[i] == NULL || PyDict_SetItemString(dict, keys[i], values[i]) < 0) {
-            error_code = -1;
-            break;
-            // Don't DECREF here.  The error handling code goes through the entire array
-            // and thus we'd end up DECREFing some objects twice.
+
+    for (int i = 0; i < nPathInfoFields; ++i) {
+        PyObject* value = getPathInfoField(fileInfo, i);
+        if (value == NULL || PyDict_SetItemString(dict, pathInfoKeys[i], value) < 0) {
+            Py_XDECREF(value);
+            return -1;
         }
+        Py_DECREF(value);
     }
 
-    for (i = 0; i < n_fields; ++i) {
-        Py_XDECREF(values[i]); // some values may be null (if there was an error
+    return 0;
+}
+
+/*
+ * Get a tuple with only the requested fields (in the given order), which
+ * takes a fraction of the memory needed by a full path info dict.
+ */
+static PyObject* getPathInfoTuple(hdfsFileInfo* fileInfo,
+                                  const std::vector<int>& fields) {
+    PyObject* tuple = PyTuple_New(fields.size());
+    if (tuple == NULL) return NULL;
+    for (size_t i = 0; i < fields.size(); ++i) {
+        PyObject* value = getPathInfoField(fileInfo, fields[i]);
+        if (value == NULL) {
+            Py_DECREF(tuple);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(tuple, i, value);
     }
+    return tuple;
+}
 
-    return error_code;
+/*
+ * Convert a sequence of field names to indices into pathInfoKeys.
+ */
+static int parsePathInfoFields(PyObject* names, std::vector<int>& fields) {
+    PyObject* seq = PySequence_Fast(names, "fields must be a sequence");
+    if (seq == NULL) return -1;
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(seq);
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        char* name = NULL;
+        if (!PyArg_Parse(PySequence_Fast_GET_ITEM(seq, i), "s", &name)) {
+            Py_DECREF(seq);
+            return -1;
+        }
+        int j = 0;
+        while (j < nPathInfoFields && strcmp(name, pathInfoKeys[j]) != 0)
+            j++;
+        if (j == nPathInfoFields) {
+            PyErr_Format(PyExc_ValueError, "Unknown path info field: %s", name);
+            Py_DECREF(seq);
+            return -1;
+        }
+        fields.push_back(j);
+    }
+    Py_DECREF(seq);
+    return 0;
 }
 
 PyObject *FsClass_list_directory(FsInfo *self, PyObject *args, PyObject *kwds) {
@@ -552,8 +608,10 @@ PyObject *FsClass_list_directory(FsInfo *self, PyObject *args, PyObject *kwds) {
     hdfsFileInfo* pathList = NULL;
     int numEntries = 0;
     hdfsFileInfo* pathInfo = NULL;
+    PyObject* fieldNames = NULL;
+    std::vector<int> fields;
 
-    if (!PyArg_ParseTuple(args, "es", "utf-8",  &path))
+    if (!PyArg_ParseTuple(args, "es|O", "utf-8",  &path, &fieldNames))
         return NULL;
 
     if (str_empty(path)) {
@@ -562,6 +620,13 @@ PyObject *FsClass_list_directory(FsInfo *self, PyObject *args, PyObject *kwds) {
         return NULL;
     }
 
+    if (fieldNames != NULL && fieldNames != Py_None &&
+        parsePathInfoFields(fieldNames, fields) < 0) {
+        PyMem_Free(path);
+        return NULL;
+    }
+    bool compact = fieldNames != NULL && fieldNames != Py_None;
+
     Py_BEGIN_ALLOW_THREADS;
         pathInfo = hdfsGetPathInfo(self->_fs, path);
         PyMem_Free(path);
@@ -594,6 +659,12 @@ PyObject *FsClass_list_directory(FsInfo *self, PyObject *args, PyObject *kwds) {
     if (!retval) goto mem_error;
 
     for (Py_ssize_t i = 0; i < numEntries; i++) {
+        if (compact) {
+            PyObject* infoTuple = getPathInfoTuple(&pathList[i], fields);
+            if (!infoTuple) goto error;
+            PyList_SET_ITEM(retval, i, infoTuple);
+            continue;
+        }
         PyObject* infoDict = PyDict_New();
         if (!infoDict) goto mem_error;
         PyList_SET_ITEM(retval, i, infoDict);
@@ -625,6 +696,82 @@ done:
     return retval;
 }
 
+/*
+ * Batched get_path_info: all paths are stat'ed in a single loop with the
+ * GIL released. Returns a list with an info dict for each path that could
+ * be stat'ed, and an IOError instance for each one that could not.
+ */
+PyObject *FsClass_get_path_infos(FsInfo *self, PyObject *args, PyObject *kwds) {
+    PyObject *paths = NULL, *seq = NULL, *retval = NULL;
+    char *path = NULL;
+    Py_ssize_t i, n;
+
+    if (!PyArg_ParseTuple(args, "O", &paths))
+        return NULL;
+    if (!(seq = PySequence_Fast(paths, "paths must be a sequence")))
+        return NULL;
+
+    n = PySequence_Fast_GET_SIZE(seq);
+    std::vector<std::string> cpaths;
+    cpaths.reserve(n);
+    for (i = 0; i < n; i++) {
+        if (!PyArg_Parse(PySequence_Fast_GET_ITEM(seq, i), "es", "utf-8",
+                         &path)) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+        if (str_empty(path)) {
+            PyMem_Free(path);
+            Py_DECREF(seq);
+            PyErr_SetString(PyExc_ValueError, "Empty path");
+            return NULL;
+        }
+        cpaths.push_back(path);
+        PyMem_Free(path);
+    }
+    Py_DECREF(seq);
+
+    std::vector<hdfsFileInfo*> infos(n, (hdfsFileInfo*)NULL);
+    std::vector<int> errors(n, 0);
+    Py_BEGIN_ALLOW_THREADS;
+        for (i = 0; i < n; i++) {
+            errno = 0;
+            infos[i] = hdfsGetPathInfo(self->_fs, cpaths[i].c_str());
+            if (!infos[i])
+                errors[i] = errno ? errno : EIO;
+        }
+    Py_END_ALLOW_THREADS;
+
+    if (!(retval = PyList_New(n)))
+        goto done;
+    for (i = 0; i < n; i++) {
+        PyObject *item = NULL;
+        if (infos[i]) {
+            if ((item = PyDict_New()) && setPathInfo(item, infos[i]) < 0) {
+                Py_CLEAR(item);
+                if (!PyErr_Occurred())
+                    PyErr_SetString(PyExc_IOError, "Error getting file info");
+            }
+        } else {
+            item = PyObject_CallFunction(PyExc_IOError, "iss", errors[i],
+                                         strerror(errors[i]),
+                                         cpaths[i].c_str());
+        }
+        if (!item) {
+            Py_CLEAR(retval);
+            goto done;
+        }
+        PyList_SET_ITEM(retval, i, item);
+    }
+
+done:
+    for (i = 0; i < n; i++) {
+        if (infos[i])
+            hdfsFreeFileInfo(infos[i], 1);
+    }
+    return retval;
+}
+
 PyObject *FsClass_move(FsInfo *self, PyObject *args, PyObject *kwds) {
 
     FsInfo* to_hdfs = NULL;
@@ -63,6 +63,8 @@ PyObject* FsClass_get_default_block_size(FsInfo* self);
 
 PyObject* FsClass_get_path_info(FsInfo* self, PyObject *args, PyObject *kwds);
 
+PyObject* FsClass_get_path_infos(FsInfo* self, PyObject *args, PyObject *kwds);
+
 PyObject* FsClass_get_hosts(FsInfo* self, PyObject *args, PyObject *kwds);
 
 PyObject* FsClass_get_used(FsInfo* self);
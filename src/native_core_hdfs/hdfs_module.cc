@@ -40,6 +40,8 @@ static PyMethodDef FsClass_methods[] = {
    METH_NOARGS, "Get the current working directory"},
   {"get_path_info", (PyCFunction) FsClass_get_path_info, METH_VARARGS,
    "Get information on a file or directory"},
+  {"get_path_infos", (PyCFunction) FsClass_get_path_infos, METH_VARARGS,
+   "Get information on several files or directories"},
   {"get_default_block_size", (PyCFunction) FsClass_get_default_block_size,
    METH_NOARGS, "Get the default block size"},
   {"get_hosts", (PyCFunction) FsClass_get_hosts, METH_VARARGS,
@@ -149,10 +151,18 @@ static PyMethodDef FileClass_methods[] = {
   /* Also export read_chunk as readinto for compatibility with Python io */
   {"readinto", (PyCFunction) FileClass_read_chunk, METH_VARARGS,
    "Like read, but store data to the given buffer"},
+  {"readall", (PyCFunction) FileClass_readall, METH_NOARGS,
+   "Read until EOF into a single preallocated buffer"},
+  {"readlines_batch", (PyCFunction) FileClass_readlines_batch, METH_VARARGS,
+   "Read up to n lines, splitting them without holding the GIL"},
+  {"unread", (PyCFunction) FileClass_unread, METH_VARARGS,
+   "Push back data that was just read, so that it is read again"},
   {"pread", (PyCFunction) FileClass_pread, METH_VARARGS,
    "Read starting from the given position"},
   {"pread_chunk", (PyCFunction) FileClass_pread_chunk, METH_VARARGS,
    "Like pread, but store data to the given buffer"},
+  {"preadv", (PyCFunction) FileClass_preadv, METH_VARARGS,
+   "Read several ranges at once, merging nearby ones"},
   {"seek", (PyCFunction) FileClass_seek, METH_VARARGS,
    "Seek to the given position"},
   {"tell", (PyCFunction) FileClass_tell, METH_NOARGS,
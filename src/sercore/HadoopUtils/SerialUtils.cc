@@ -73,6 +73,15 @@ namespace HadoopUtils {
     }
   }
 
+  int FileInStream::peek()
+  {
+    int c = getc(mFile);
+    if (c != EOF) {
+      ungetc(c, mFile);
+    }
+    return c;
+  }
+
   bool FileInStream::skip(size_t nbytes)
   {
     return (0==fseek(mFile, nbytes, SEEK_CUR));
@@ -0,0 +1,283 @@
+// BEGIN_COPYRIGHT
+//
+// Copyright 2009-2024 CRS4.
+//
+// Licensed under the Apache License, Version 2.0 (the "License"); you may not
+// use this file except in compliance with the License. You may obtain a copy
+// of the License at
+//
+//   http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+// WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+// License for the specific language governing permissions and limitations
+// under the License.
+//
+// END_COPYRIGHT
+
+// Order-preserving encoding, e.g., for MapReduce keys, which Hadoop sorts as
+// raw bytes. Each object starts with a type tag, so objects of different
+// types are ordered by tag (None < int < float < bytes < str < tuple):
+//
+//   None:  TAG_NONE
+//   int:   TAG_INT + 8 bytes (big endian two's complement with the sign
+//          bit flipped); only 64-bit signed integers are supported
+//   float: TAG_FLOAT + 8 bytes (big endian IEEE 754 double; all bits
+//          flipped if negative, only the sign bit flipped otherwise)
+//   bytes: TAG_BYTES + data + TERM, where each TERM byte in data is
+//          followed by ESC
+//   str:   TAG_STR + UTF-8 data, escaped and terminated as above
+//   tuple: TAG_TUPLE + items + TERM
+//
+// Since all tags are greater than TERM and smaller than ESC, a sequence
+// always sorts before any of its extensions.
+
+#define PY_SSIZE_T_CLEAN
+
+#include <Python.h>
+
+#include <cstdint>
+#include <cstring>
+#include <string>
+
+#include "ordered.h"
+
+#define TERM 0x00
+#define ESC 0xff
+#define TAG_NONE 0x01
+#define TAG_INT 0x02
+#define TAG_FLOAT 0x03
+#define TAG_BYTES 0x04
+#define TAG_STR 0x05
+#define TAG_TUPLE 0x06
+
+#define MAX_DEPTH 100
+
+
+static void
+_put_u64(std::string& out, uint64_t u) {
+  for (int shift = 56; shift >= 0; shift -= 8) {
+    out.push_back((char)((u >> shift) & 0xff));
+  }
+}
+
+
+static void
+_put_escaped(std::string& out, const char *data, Py_ssize_t len) {
+  for (Py_ssize_t i = 0; i < len; ++i) {
+    out.push_back(data[i]);
+    if ((unsigned char)data[i] == TERM) {
+      out.push_back((char)ESC);
+    }
+  }
+  out.push_back((char)TERM);
+}
+
+
+static int
+_encode(PyObject *obj, std::string& out, int depth) {
+  if (depth > MAX_DEPTH) {
+    PyErr_SetString(PyExc_ValueError, "maximum nesting depth exceeded");
+    return -1;
+  }
+  if (obj == Py_None) {
+    out.push_back((char)TAG_NONE);
+#if PY_MAJOR_VERSION < 3
+  } else if (PyInt_Check(obj) || PyLong_Check(obj)) {
+#else
+  } else if (PyLong_Check(obj)) {
+#endif
+    long long v = PyLong_AsLongLong(obj);
+    if (v == -1 && PyErr_Occurred()) {
+      return -1;
+    }
+    out.push_back((char)TAG_INT);
+    _put_u64(out, (uint64_t)v ^ ((uint64_t)1 << 63));
+  } else if (PyFloat_Check(obj)) {
+    double d = PyFloat_AS_DOUBLE(obj);
+    uint64_t u;
+    std::memcpy(&u, &d, sizeof u);
+    u = (u >> 63) ? ~u : u ^ ((uint64_t)1 << 63);
+    out.push_back((char)TAG_FLOAT);
+    _put_u64(out, u);
+  } else if (PyBytes_Check(obj)) {
+    out.push_back((char)TAG_BYTES);
+    _put_escaped(out, PyBytes_AS_STRING(obj), PyBytes_GET_SIZE(obj));
+  } else if (PyUnicode_Check(obj)) {
+    PyObject *utf8 = PyUnicode_AsUTF8String(obj);
+    if (!utf8) {
+      return -1;
+    }
+    out.push_back((char)TAG_STR);
+    _put_escaped(out, PyBytes_AS_STRING(utf8), PyBytes_GET_SIZE(utf8));
+    Py_DECREF(utf8);
+  } else if (PyTuple_Check(obj)) {
+    out.push_back((char)TAG_TUPLE);
+    for (Py_ssize_t i = 0; i < PyTuple_GET_SIZE(obj); ++i) {
+      if (_encode(PyTuple_GET_ITEM(obj, i), out, depth + 1) < 0) {
+        return -1;
+      }
+    }
+    out.push_back((char)TERM);
+  } else {
+    PyErr_Format(PyExc_TypeError, "unsupported type: %s",
+                 Py_TYPE(obj)->tp_name);
+    return -1;
+  }
+  return 0;
+}
+
+
+PyObject *
+encodeOrdered(PyObject *self, PyObject *args) {
+  PyObject *obj;
+  if (!PyArg_ParseTuple(args, "O", &obj)) {
+    return NULL;
+  }
+  std::string out;
+  if (_encode(obj, out, 0) < 0) {
+    return NULL;
+  }
+  return PyBytes_FromStringAndSize(out.data(), out.size());
+}
+
+
+static PyObject *
+_truncated() {
+  PyErr_SetString(PyExc_ValueError, "truncated data");
+  return NULL;
+}
+
+
+static uint64_t
+_get_u64(const unsigned char *p) {
+  uint64_t u = 0;
+  for (int i = 0; i < 8; ++i) {
+    u = (u << 8) | p[i];
+  }
+  return u;
+}
+
+
+// Unescape data up to the next unescaped TERM, advance *pos past it
+static int
+_get_escaped(const unsigned char *data, Py_ssize_t len, Py_ssize_t *pos,
+             std::string& out) {
+  Py_ssize_t i = *pos;
+  while (i < len) {
+    if (data[i] == TERM) {
+      if (i + 1 < len && data[i + 1] == ESC) {
+        out.push_back((char)TERM);
+        i += 2;
+        continue;
+      }
+      *pos = i + 1;
+      return 0;
+    }
+    out.push_back((char)data[i++]);
+  }
+  _truncated();
+  return -1;
+}
+
+
+static PyObject *
+_decode(const unsigned char *data, Py_ssize_t len, Py_ssize_t *pos,
+        int depth) {
+  if (depth > MAX_DEPTH) {
+    PyErr_SetString(PyExc_ValueError, "maximum nesting depth exceeded");
+    return NULL;
+  }
+  if (*pos >= len) {
+    return _truncated();
+  }
+  unsigned char tag = data[(*pos)++];
+  switch (tag) {
+  case TAG_NONE:
+    Py_RETURN_NONE;
+  case TAG_INT: {
+    if (len - *pos < 8) {
+      return _truncated();
+    }
+    uint64_t u = _get_u64(data + *pos) ^ ((uint64_t)1 << 63);
+    *pos += 8;
+    return PyLong_FromLongLong((long long)u);
+  }
+  case TAG_FLOAT: {
+    if (len - *pos < 8) {
+      return _truncated();
+    }
+    uint64_t u = _get_u64(data + *pos);
+    *pos += 8;
+    u = (u >> 63) ? u ^ ((uint64_t)1 << 63) : ~u;
+    double d;
+    std::memcpy(&d, &u, sizeof d);
+    return PyFloat_FromDouble(d);
+  }
+  case TAG_BYTES:
+  case TAG_STR: {
+    std::string s;
+    if (_get_escaped(data, len, pos, s) < 0) {
+      return NULL;
+    }
+    if (tag == TAG_BYTES) {
+      return PyBytes_FromStringAndSize(s.data(), s.size());
+    }
+    return PyUnicode_DecodeUTF8(s.data(), s.size(), "strict");
+  }
+  case TAG_TUPLE: {
+    PyObject *items, *item, *rval;
+    if (!(items = PyList_New(0))) {
+      return NULL;
+    }
+    while (true) {
+      if (*pos >= len) {
+        Py_DECREF(items);
+        return _truncated();
+      }
+      if (data[*pos] == TERM) {
+        ++(*pos);
+        break;
+      }
+      if (!(item = _decode(data, len, pos, depth + 1))) {
+        Py_DECREF(items);
+        return NULL;
+      }
+      if (PyList_Append(items, item) < 0) {
+        Py_DECREF(item);
+        Py_DECREF(items);
+        return NULL;
+      }
+      Py_DECREF(item);
+    }
+    rval = PyList_AsTuple(items);
+    Py_DECREF(items);
+    return rval;
+  }
+  default:
+    return PyErr_Format(PyExc_ValueError, "unknown tag: 0x%02x", tag);
+  }
+}
+
+
+PyObject *
+decodeOrdered(PyObject *self, PyObject *args) {
+  PyObject *data, *rval;
+  Py_buffer buffer = {NULL, NULL};
+  Py_ssize_t pos = 0;
+  if (!PyArg_ParseTuple(args, "O", &data)) {
+    return NULL;
+  }
+  if (PyObject_GetBuffer(data, &buffer, PyBUF_SIMPLE) < 0) {
+    return NULL;
+  }
+  rval = _decode((const unsigned char*)buffer.buf, buffer.len, &pos, 0);
+  if (rval && pos != buffer.len) {
+    Py_DECREF(rval);
+    rval = NULL;
+    PyErr_SetString(PyExc_ValueError, "trailing data");
+  }
+  PyBuffer_Release(&buffer);
+  return rval;
+}
@@ -0,0 +1,29 @@
+// BEGIN_COPYRIGHT
+//
+// Copyright 2009-2024 CRS4.
+//
+// Licensed under the Apache License, Version 2.0 (the "License"); you may not
+// use this file except in compliance with the License. You may obtain a copy
+// of the License at
+//
+//   http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+// WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+// License for the specific language governing permissions and limitations
+// under the License.
+//
+// END_COPYRIGHT
+
+#pragma once
+
+#include <Python.h>
+
+/**
+ * Order-preserving binary encoding of None, int, float, bytes, str and
+ * (nested) tuples: encoded objects of the same type compare, as unsigned
+ * byte strings, like the original objects (see ordered.cpp).
+ */
+PyObject *encodeOrdered(PyObject *self, PyObject *args);
+PyObject *decodeOrdered(PyObject *self, PyObject *args);
@@ -19,6 +19,7 @@
 #include <Python.h>
 
 #include "hu_extras.h"
+#include "ordered.h"
 #include "streams.h"
 
 const char* m_name = "sercore";
@@ -89,6 +90,10 @@ deserializeFileSplit(PyObject *self, PyObject *args) {
 static PyMethodDef SercoreMethods[] = {
   {"deserialize_file_split", deserializeFileSplit, METH_VARARGS,
    "deserialize_file_split(data): deserialize a Hadoop FileSplit"},
+  {"encode_ordered", encodeOrdered, METH_VARARGS,
+   "encode_ordered(obj): serialize obj, preserving sort order"},
+  {"decode_ordered", decodeOrdered, METH_VARARGS,
+   "decode_ordered(data): deserialize an encode_ordered output"},
   {NULL}
 };
 
@@ -31,10 +31,13 @@
 #include <cstdlib>
 #include <cstdint>
 #include <cstdio>
+#include <vector>
 
 #include "hu_extras.h"
 #include "streams.h"
 
+#define MAP_ITEM 4
+#define REDUCE_VALUE 7
 #define OUTPUT 50
 #define PARTITIONED_OUTPUT 51
 
@@ -105,6 +108,16 @@ FileInStream_init(FileInStreamObj *self, PyObject *args, PyObject *kwds) {
 }
 
 
+static void
+FileInStream_dealloc(FileInStreamObj *self) {
+  for (std::size_t i = 0; i < N_VIEW_SLOTS; ++i) {
+    Py_CLEAR(self->view_bufs[i]);
+  }
+  self->stream.reset();
+  Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+
 static PyObject *
 FileInStream_close(FileInStreamObj *self) {
   PyThreadState *state;
@@ -355,6 +368,200 @@ FileInStream_readLongWritable(FileInStreamObj *self) {
 }
 
 
+// Same as read_bytes, but the data is read into a reusable buffer (one for
+// each slot) and a memoryview over it is returned. The view's contents are
+// only valid until the next read into the same slot. If the buffer has to
+// grow, a new one is allocated, so views that are still around never point
+// to freed memory.
+static PyObject *
+FileInStream_readBytesView(FileInStreamObj *self, PyObject *args) {
+  int slot = 0;
+  int32_t len;
+  PyObject *buf, *mview, *rval;
+  PyThreadState *state;
+  _ASSERT_STREAM_OPEN;
+  if (!PyArg_ParseTuple(args, "|i", &slot)) {
+    return NULL;
+  }
+  if (slot < 0 || slot >= N_VIEW_SLOTS) {
+    return PyErr_Format(PyExc_ValueError, "slot must be in [0, %d)",
+                        N_VIEW_SLOTS);
+  }
+  state = PyEval_SaveThread();
+  try {
+    len = HadoopUtils::deserializeInt(*self->stream);
+  } catch (HadoopUtils::Error e) {
+    PyEval_RestoreThread(state);
+    PyErr_SetString(PyExc_IOError, e.getMessage().c_str());
+    return NULL;
+  }
+  PyEval_RestoreThread(state);
+  if (len < 0) {
+    len = 0;
+  }
+  buf = self->view_bufs[slot];
+  if (!buf || PyByteArray_GET_SIZE(buf) < len) {
+    Py_ssize_t size = buf ? 2 * PyByteArray_GET_SIZE(buf) : 0;
+    if (size < len) {
+      size = len;
+    }
+    if (!(buf = PyByteArray_FromStringAndSize(NULL, size))) {
+      return NULL;
+    }
+    Py_XDECREF(self->view_bufs[slot]);
+    self->view_bufs[slot] = buf;
+  }
+  if (len > 0) {
+    char *data = PyByteArray_AS_STRING(buf);
+    state = PyEval_SaveThread();
+    try {
+      self->stream->read(data, len);
+    } catch (HadoopUtils::Error e) {
+      PyEval_RestoreThread(state);
+      PyErr_SetString(PyExc_IOError, e.getMessage().c_str());
+      return NULL;
+    }
+    PyEval_RestoreThread(state);
+  }
+  if (!(mview = PyMemoryView_FromObject(buf))) {
+    return NULL;
+  }
+  rval = PySequence_GetSlice(mview, 0, len);
+  Py_DECREF(mview);
+  return rval;
+}
+
+
+// Convert a raw key or value according to fmt: 'b' (bytes), 's' (string)
+// or 'L' (hadoop.io.LongWritable).
+static PyObject *
+_field_to_py(const std::string& s, char fmt) {
+  switch(fmt) {
+  case 'b':
+    return PyBytes_FromStringAndSize(s.c_str(), s.size());
+  case 's':
+    return PyUnicode_FromStringAndSize(s.c_str(), s.size());
+  case 'L': {
+    if (s.size() != sizeof(int64_t)) {
+      return PyErr_Format(PyExc_IOError, "bad LongWritable size: %zd",
+                          (Py_ssize_t)s.size());
+    }
+    HadoopUtils::StringInStream stream(s);
+    return Py_BuildValue("L", deserializeLongWritable(stream));
+  }
+  default:
+    return PyErr_Format(PyExc_ValueError, "Unknown format '%c'", fmt);
+  }
+}
+
+
+static PyObject *
+_fields_to_pylist(const std::vector<std::string>& fields, char fmt) {
+  PyObject *rval, *item;
+  if (!(rval = PyList_New(fields.size()))) {
+    return NULL;
+  }
+  for (std::size_t i = 0; i < fields.size(); ++i) {
+    if (!(item = _field_to_py(fields[i], fmt))) {
+      Py_DECREF(rval);
+      return NULL;
+    }
+    PyList_SET_ITEM(rval, i, item);
+  }
+  return rval;
+}
+
+
+// Must be called right after reading a MAP_ITEM command. Reads the current
+// key/value pair, then keeps going as long as the next command is also a
+// MAP_ITEM, up to n pairs in total. The GIL is released only once for the
+// whole batch. Returns a (keys, values) tuple of lists.
+static PyObject *
+FileInStream_readMapItems(FileInStreamObj *self, PyObject *args) {
+  Py_ssize_t n;
+  const char *fmt = "bb";
+  PyObject *keys, *values;
+  PyThreadState *state;
+  _ASSERT_STREAM_OPEN;
+  if (!PyArg_ParseTuple(args, "n|s", &n, &fmt)) {
+    return NULL;
+  }
+  if (n < 1) {
+    return PyErr_Format(PyExc_ValueError, "n must be positive");
+  }
+  if (strlen(fmt) != 2) {
+    return PyErr_Format(PyExc_ValueError, "fmt must have exactly two items");
+  }
+  for (std::size_t i = 0; i < 2; ++i) {
+    if (fmt[i] != 'b' && fmt[i] != 's' && fmt[i] != 'L') {
+      return PyErr_Format(PyExc_ValueError, "Unknown format '%c'", fmt[i]);
+    }
+  }
+  std::vector<std::string> kfields, vfields;
+  state = PyEval_SaveThread();
+  try {
+    while (true) {
+      kfields.emplace_back();
+      vfields.emplace_back();
+      HadoopUtils::deserializeString(kfields.back(), *self->stream);
+      HadoopUtils::deserializeString(vfields.back(), *self->stream);
+      if ((Py_ssize_t)kfields.size() >= n ||
+          self->stream->peek() != MAP_ITEM) {
+        break;
+      }
+      HadoopUtils::deserializeInt(*self->stream);
+    }
+  } catch (HadoopUtils::Error e) {
+    PyEval_RestoreThread(state);
+    PyErr_SetString(PyExc_IOError, e.getMessage().c_str());
+    return NULL;
+  }
+  PyEval_RestoreThread(state);
+  if (!(keys = _fields_to_pylist(kfields, fmt[0]))) {
+    return NULL;
+  }
+  if (!(values = _fields_to_pylist(vfields, fmt[1]))) {
+    Py_DECREF(keys);
+    return NULL;
+  }
+  return Py_BuildValue("NN", keys, values);
+}
+
+
+// Read up to n consecutive REDUCE_VALUE records (commands included), stopping
+// at the first command of a different type, which is left in the stream.
+// Returns a list of bytes objects, empty if the next command is not a
+// REDUCE_VALUE.
+static PyObject *
+FileInStream_readReduceValues(FileInStreamObj *self, PyObject *args) {
+  Py_ssize_t n;
+  PyThreadState *state;
+  _ASSERT_STREAM_OPEN;
+  if (!PyArg_ParseTuple(args, "n", &n)) {
+    return NULL;
+  }
+  if (n < 1) {
+    return PyErr_Format(PyExc_ValueError, "n must be positive");
+  }
+  std::vector<std::string> fields;
+  state = PyEval_SaveThread();
+  try {
+    while ((Py_ssize_t)fields.size() < n &&
+           self->stream->peek() == REDUCE_VALUE) {
+      HadoopUtils::deserializeInt(*self->stream);
+      fields.emplace_back();
+      HadoopUtils::deserializeString(fields.back(), *self->stream);
+    }
+  } catch (HadoopUtils::Error e) {
+    PyEval_RestoreThread(state);
+    PyErr_SetString(PyExc_IOError, e.getMessage().c_str());
+    return NULL;
+  }
+  PyEval_RestoreThread(state);
+  return _fields_to_pylist(fields, 'b');
+}
+
+
 static PyMethodDef FileInStream_methods[] = {
   {"close", (PyCFunction)FileInStream_close, METH_NOARGS,
    "close(): close the currently open file"},
@@ -370,8 +577,15 @@ static PyMethodDef FileInStream_methods[] = {
    "read_string(): read a string from the stream"},
   {"read_bytes", (PyCFunction)FileInStream_readBytes, METH_NOARGS,
    "read_bytes(): read a bytes object from the stream"},
+  {"read_bytes_view", (PyCFunction)FileInStream_readBytesView, METH_VARARGS,
+   "read_bytes_view([slot]): read bytes into a reusable buffer, get a view"},
   {"read_tuple", (PyCFunction)FileInStream_readTuple, METH_VARARGS,
    "read_tuple(fmt): read len(fmt) values, where fmt specifies types"},
+  {"read_map_items", (PyCFunction)FileInStream_readMapItems, METH_VARARGS,
+   "read_map_items(n[, fmt]): read up to n consecutive MAP_ITEM k/v pairs"},
+  {"read_reduce_values", (PyCFunction)FileInStream_readReduceValues,
+   METH_VARARGS,
+   "read_reduce_values(n): read up to n consecutive REDUCE_VALUE values"},
   {"skip", (PyCFunction)FileInStream_skip, METH_VARARGS,
    "skip(len): skip len bytes"},
   {"__enter__", (PyCFunction)FileInStream_enter, METH_NOARGS},
@@ -387,7 +601,7 @@ PyTypeObject FileInStreamType = {
     "sercore.FileInStream",                           /* tp_name */
     sizeof(FileInStreamObj),                          /* tp_basicsize */
     0,                                                /* tp_itemsize */
-    0,                                                /* tp_dealloc */
+    (destructor)FileInStream_dealloc,                 /* tp_dealloc */
     0,                                                /* tp_print */
     0,                                                /* tp_getattr */
     0,                                                /* tp_setattr */
@@ -704,6 +918,18 @@ error:
 }
 
 
+// Write a length-prefixed string directly from a buffer, avoiding the
+// std::string copy required by HadoopUtils::serializeString.
+static void
+_write_raw_string(HadoopUtils::OutStream& stream, const void *buf,
+                  Py_ssize_t len) {
+  HadoopUtils::serializeInt(len, stream);
+  if (len > 0) {
+    stream.write(buf, len);
+  }
+}
+
+
 // Same as write_tuple("ibb", (OUTPUT, k, v)) or, when part is specified,
 // write_tuple("iibb", (PARTITIONED_OUTPUT, part, k, v)), but more efficient.
 // Optimizing other commands in this way is probably worthless.
@@ -727,16 +953,15 @@ FileOutStream_writeOutput(FileOutStreamObj *self, PyObject *args) {
     PyBuffer_Release(&kbuf);
     return NULL;
   }
-  std::string ks((const char*)kbuf.buf, kbuf.len);
-  std::string vs((const char*)vbuf.buf, vbuf.len);
+  const char *key = (const char*)kbuf.buf;
+  const char *val = (const char*)vbuf.buf;
+  Py_ssize_t klen = kbuf.len, vlen = vbuf.len;
 #else
   const char *key, *val;
   Py_ssize_t klen, vlen;
   if (!PyArg_ParseTuple(args, "y#y#|i", &key, &klen, &val, &vlen, &part)) {
     return NULL;
   }
-  std::string ks(key, klen);
-  std::string vs(val, vlen);
 #endif
   state = PyEval_SaveThread();
   try {
@@ -746,8 +971,8 @@ FileOutStream_writeOutput(FileOutStreamObj *self, PyObject *args) {
     } else {
       HadoopUtils::serializeInt(OUTPUT, *self->stream);
     }
-    HadoopUtils::serializeString(ks, *self->stream);
-    HadoopUtils::serializeString(vs, *self->stream);
+    _write_raw_string(*self->stream, key, klen);
+    _write_raw_string(*self->stream, val, vlen);
   } catch (HadoopUtils::Error e) {
     PyEval_RestoreThread(state);
     PyErr_SetString(PyExc_IOError, e.getMessage().c_str());
@@ -766,6 +991,99 @@ FileOutStream_writeOutput(FileOutStreamObj *self, PyObject *args) {
 }
 
 
+// Batch version of write_output: keys, values and (optional) parts are
+// sequences of the same length. All buffers are acquired up front, so that
+// the whole batch can be written with the GIL released only once.
+static PyObject *
+FileOutStream_writeOutputs(FileOutStreamObj *self, PyObject *args) {
+  PyObject *pykeys, *pyvals, *pyparts = NULL;
+  PyObject *keys = NULL, *vals = NULL, *parts = NULL;
+  PyObject *rval = NULL;
+  PyThreadState *state;
+  Py_ssize_t n;
+  std::vector<Py_buffer> kbufs, vbufs;
+  std::vector<int> partv;
+  _ASSERT_STREAM_OPEN;
+  if (!PyArg_ParseTuple(args, "OO|O", &pykeys, &pyvals, &pyparts)) {
+    return NULL;
+  }
+  if (!(keys = PySequence_Fast(pykeys, "keys must be a sequence"))) {
+    goto done;
+  }
+  if (!(vals = PySequence_Fast(pyvals, "values must be a sequence"))) {
+    goto done;
+  }
+  n = PySequence_Fast_GET_SIZE(keys);
+  if (PySequence_Fast_GET_SIZE(vals) != n) {
+    PyErr_SetString(PyExc_ValueError, "keys and values differ in length");
+    goto done;
+  }
+  if (pyparts && pyparts != Py_None) {
+    if (!(parts = PySequence_Fast(pyparts, "parts must be a sequence"))) {
+      goto done;
+    }
+    if (PySequence_Fast_GET_SIZE(parts) != n) {
+      PyErr_SetString(PyExc_ValueError, "keys and parts differ in length");
+      goto done;
+    }
+    partv.reserve(n);
+    for (Py_ssize_t i = 0; i < n; ++i) {
+      long p = PyLong_AsLong(PySequence_Fast_GET_ITEM(parts, i));
+      if (p == -1 && PyErr_Occurred()) {
+        goto done;
+      }
+      partv.push_back((int)p);
+    }
+  }
+  kbufs.reserve(n);
+  vbufs.reserve(n);
+  for (Py_ssize_t i = 0; i < n; ++i) {
+    Py_buffer kbuf, vbuf;
+    if (PyObject_GetBuffer(PySequence_Fast_GET_ITEM(keys, i),
+                           &kbuf, PyBUF_SIMPLE) < 0) {
+      goto done;
+    }
+    if (PyObject_GetBuffer(PySequence_Fast_GET_ITEM(vals, i),
+                           &vbuf, PyBUF_SIMPLE) < 0) {
+      PyBuffer_Release(&kbuf);
+      goto done;
+    }
+    kbufs.push_back(kbuf);
+    vbufs.push_back(vbuf);
+  }
+  state = PyEval_SaveThread();
+  try {
+    for (Py_ssize_t i = 0; i < n; ++i) {
+      if (parts) {
+        HadoopUtils::serializeInt(PARTITIONED_OUTPUT, *self->stream);
+        HadoopUtils::serializeInt(partv[i], *self->stream);
+      } else {
+        HadoopUtils::serializeInt(OUTPUT, *self->stream);
+      }
+      _write_raw_string(*self->stream, kbufs[i].buf, kbufs[i].len);
+      _write_raw_string(*self->stream, vbufs[i].buf, vbufs[i].len);
+    }
+  } catch (HadoopUtils::Error e) {
+    PyEval_RestoreThread(state);
+    PyErr_SetString(PyExc_IOError, e.getMessage().c_str());
+    goto done;
+  }
+  PyEval_RestoreThread(state);
+  Py_INCREF(Py_None);
+  rval = Py_None;
+
+done:
+  for (std::size_t i = 0; i < kbufs.size(); ++i) {
+    PyBuffer_Release(&kbufs[i]);
+    PyBuffer_Release(&vbufs[i]);
+  }
+  Py_XDECREF(keys);
+  Py_XDECREF(vals);
+  Py_XDECREF(parts);
+  return rval;
+}
+
+
 static PyObject *
 FileOutStream_advance(FileOutStreamObj *self, PyObject *args) {
   size_t len;
@@ -815,6 +1133,8 @@ static PyMethodDef FileOutStream_methods[] = {
    "write_tuple(fmt, t): write values from iterable t according to fmt"},
   {"write_output", (PyCFunction)FileOutStream_writeOutput, METH_VARARGS,
    "write_output(key, value[, part]): write pipes [partitioned] output"},
+  {"write_outputs", (PyCFunction)FileOutStream_writeOutputs, METH_VARARGS,
+   "write_outputs(keys, values[, parts]): write a batch of pipes outputs"},
   {"advance", (PyCFunction)FileOutStream_advance, METH_VARARGS,
    "advance(len): advance len bytes"},
   {"flush", (PyCFunction)FileOutStream_flush, METH_NOARGS,
@@ -24,11 +24,15 @@
 #include <string>
 #include "HadoopUtils/SerialUtils.hh"
 
+// number of reusable buffers for FileInStream.read_bytes_view
+#define N_VIEW_SLOTS 2
+
 typedef struct {
     PyObject_HEAD
     FILE *fp;
     bool closed;
     std::shared_ptr<HadoopUtils::FileInStream> stream;
+    PyObject *view_bufs[N_VIEW_SLOTS];  // bytearray objects
 } FileInStreamObj;
 
 typedef struct {
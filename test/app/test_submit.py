@@ -67,7 +67,7 @@ class TestAppSubmit(unittest.TestCase):
     def test_help(self):
         parser = app.make_parser()
         # silence!
-        for k in ['submit', 'script']:
+        for k in ['submit', 'script', 'stacks']:
             parser._actions[2].choices[k].format_help = nop
             parser._actions[2].choices[k].format_usage = nop
             parser._actions[2].choices[k].error = nop
@@ -86,6 +86,10 @@ class TestAppSubmit(unittest.TestCase):
             args, unk = parser.parse_known_args(['submit'])
         except SystemExit as e:
             self.assertEqual(e.args[0], 2)
+        try:
+            args, unk = parser.parse_known_args(['stacks', '-h'])
+        except SystemExit as e:
+            self.assertEqual(e.args[0], 0)
 
     def _check_args(self, args, args_kv):
         for k, v in args_kv:
@@ -16,6 +16,7 @@
 #
 # END_COPYRIGHT
 
+import sys
 import unittest
 from pydoop.test_utils import get_module
 
@@ -27,6 +28,8 @@ TEST_MODULE_NAMES = [
     'test_path',
     'test_hdfs',
 ]
+if sys.version_info >= (3, 6):
+    TEST_MODULE_NAMES.append('test_aio')
 
 
 def suite(path=None):
@@ -250,6 +250,17 @@ class TestCommon(unittest.TestCase):
                 self.assertRaises(ValueError, f.write, content)
             else:
                 self.assertRaises(IOError, f.write, content)
+        # read to EOF from the middle of the file, beyond the buffer size
+        bufsize = hdfs.common.BUFSIZE
+        content = utils.make_random_data(3 * bufsize + 5)
+        path = self._make_random_file(content=content)
+        with self.fs.open_file(path) as f:
+            self.assertEqual(f.read(bufsize + 1), content[:bufsize + 1])
+            self.assertEqual(f.read(), content[bufsize + 1:])
+            self.assertEqual(f.tell(), len(content))
+            self.assertEqual(f.read(), b"")
+            f.seek(7)
+            self.assertEqual(f.read(), content[7:])
 
     def __read_chunk(self, chunk_factory):
         content = utils.make_random_data()
@@ -338,6 +349,26 @@ class TestCommon(unittest.TestCase):
             self.assertEqual(chunk.value, content[offset: offset + length])
             self.assertEqual(f.tell(), 0)
 
+    def preadv(self):
+        content = utils.make_random_data(printable=True)
+        path = self._make_random_file(content=content)
+        ranges = [(100, 10), (0, 3), (20, 5), (5000, 0), (len(content) - 2, 8)]
+        expected = [content[p: p + l] for p, l in ranges]
+        with self.fs.open_file(path) as f:
+            for max_gap, threads in (0, 1), (100, 1), (0, 3), (1 << 20, 2):
+                self.assertEqual(
+                    f.preadv(ranges, max_gap=max_gap, threads=threads),
+                    expected
+                )
+            buffers = [bytearray(l) for _, l in ranges]
+            self.assertEqual(f.preadv(ranges, buffers),
+                             [len(_) for _ in expected])
+            self.assertEqual([bytes(_[:len(e)]) for _, e in
+                              zip(buffers, expected)], expected)
+            self.assertRaises(ValueError, f.preadv, [(0, 10)],
+                              [bytearray(3)])
+            self.assertEqual(f.tell(), 0)
+
     def copy_on_self(self):
         content = utils.make_random_data()
         path = self._make_random_file(content=content)
@@ -379,6 +410,16 @@ class TestCommon(unittest.TestCase):
             IOError, self.fs.list_directory, self._make_random_path()
         )
         self.assertRaises(ValueError, self.fs.list_directory, "")
+        fields = ("size", "name", "kind")
+        compact = sorted(self.fs.list_directory(new_d, fields=fields),
+                         key=lambda t: os.path.basename(t[1]))
+        self.assertEqual(
+            compact, [tuple(info[f] for f in fields) for info in infos]
+        )
+        self.assertEqual(self.fs.list_directory(new_d, fields=()), [()] * 3)
+        self.assertRaises(
+            ValueError, self.fs.list_directory, new_d, fields=["foo"]
+        )
 
     def __check_readline(self, get_lines):
         samples = [
@@ -445,6 +486,39 @@ class TestCommon(unittest.TestCase):
         for fun in get_lines_explicit, get_lines_implicit:
             self.__check_readline(fun)
 
+    def iter_lines_mixed(self):
+        lines = [b"line %d%s\n" % (i, b"x" * (i % 100)) for i in range(5000)]
+        content = b"".join(lines)
+        offsets = [0]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line))
+        path = self._make_random_file(content=content)
+        with self.fs.open_file(path) as f:
+            self.assertEqual(f.read(3), content[:3])
+            self.assertEqual(next(f), lines[0][3:])
+            for i, l in enumerate(f, 1):
+                self.assertEqual(l, lines[i])
+                if i == 10:
+                    break
+            self.assertEqual(f.tell(), offsets[11])
+            self.assertEqual(f.read(5), content[offsets[11]: offsets[11] + 5])
+            self.assertEqual(f.readline(), lines[11][5:])
+            f.seek(offsets[3])
+            self.assertEqual(next(f), lines[3])
+            f.seek(offsets[4000])
+            self.assertEqual(list(f), lines[4000:])
+            self.assertEqual(f.tell(), len(content))
+            f.seek(-len(lines[-1]), os.SEEK_END)
+            self.assertEqual(f.readline(), lines[-1])
+            self.assertEqual(f.readline(), b"")
+            f.seek(0)
+            self.assertEqual(list(f), lines)
+        with self.fs.open_file(path, "rt") as f:
+            self.assertEqual(f.readline(), lines[0].decode())
+            self.assertEqual(f.read(4), lines[1][:4].decode())
+            self.assertEqual([_ for _ in f], [_.decode() for _ in
+                                              [lines[1][4:]] + lines[2:]])
+
     def seek(self):
         lines = [b"1\n", b"2\n", b"3\n"]
         data = b"".join(lines)
@@ -535,6 +609,47 @@ class TestCommon(unittest.TestCase):
         for top in '', None:
             self.assertRaises(ValueError, lambda: next(self.fs.walk(top)))
 
+    def walk_options(self):
+        top = self._make_random_dir()
+        parent = self._make_random_dir(where=top)
+        child = self._make_random_dir(where=parent)
+        files = [self._make_random_file(where=_) for _ in (top, parent, child)]
+
+        def names(**kwargs):
+            return [_['name'] for _ in self.fs.walk(top, **kwargs)]
+
+        serial = names()
+        self.assertEqual(len(serial), 6)
+        for n in 2, 4:
+            self.assertEqual(names(workers=n), serial)
+        for workers in None, 3:
+            bottomup = names(topdown=False, workers=workers)
+            self.assertEqual(sorted(bottomup), sorted(serial))
+            self.assertEqual(bottomup[-1], serial[0])
+            for d in parent, child:
+                i = [_ for _ in range(6) if bottomup[_].endswith(d)][0]
+                self.assertTrue(all(bottomup.index(_) < i for _ in serial
+                                    if _.startswith(bottomup[i] + "/")))
+        self.assertEqual(len(names(maxdepth=0)), 1)
+        self.assertEqual(len(names(maxdepth=1)), 3)
+        self.assertEqual(len(names(maxdepth=2)), 5)
+        pruned = names(predicate=lambda i: not i['name'].endswith(child))
+        self.assertEqual(len(pruned), 4)
+        self.assertFalse(any(_.endswith(files[2]) for _ in pruned))
+        for workers in None, 3:
+            compact = list(self.fs.walk(
+                top, workers=workers, fields=("size", "name")
+            ))
+            self.assertEqual([_[1] for _ in compact], serial)
+            self.assertTrue(all(len(_) == 2 for _ in compact))
+        pruned = [_[0] for _ in self.fs.walk(
+            top, fields=("name",), predicate=lambda i: not i[0].endswith(child)
+        )]
+        self.assertEqual(len(pruned), 4)
+        self.assertRaises(
+            ValueError, lambda: next(self.fs.walk(top, fields=["foo"]))
+        )
+
     def exists(self):
         self.assertFalse(self.fs.exists('some_file'))
         self.assertFalse(self.fs.exists('some_file/other_file'))
@@ -592,6 +707,7 @@ def common_tests():
         'tell',
         'pread',
         'pread_chunk',
+        'preadv',
         'rename',
         'change_dir',
         'copy_on_self',
@@ -602,9 +718,11 @@ def common_tests():
         'readline_big',
         'readline_and_read',
         'iter_lines',
+        'iter_lines_mixed',
         'seek',
         'block_boundary',
         'walk',
+        'walk_options',
         'exists',
         'text_io',
     ]
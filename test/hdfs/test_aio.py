@@ -0,0 +1,124 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright 2009-2024 CRS4.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import asyncio
+import unittest
+import uuid
+
+import pydoop.hdfs as hdfs
+from pydoop.hdfs import aio
+import pydoop.test_utils as utils
+
+
+class TestAio(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = hdfs.hdfs("default", 0)
+        self.wd = utils.make_wd(self.fs)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.fs.delete(self.wd)
+        self.fs.close()
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _make_random_path(self):
+        return "%s/%s" % (self.wd, uuid.uuid4().hex)
+
+    def connect(self):
+        async def check():
+            async with await aio.connect("default", 0) as fs:
+                self.assertTrue(fs.blocking.fs is self.fs.fs)
+                self.assertEqual(fs.user, self.fs.user)
+                self.assertTrue(await fs.exists(self.wd))
+                info = await fs.get_path_info(self.wd)
+                self.assertEqual(info, self.fs.get_path_info(self.wd))
+            self.assertFalse(self.fs.closed)
+        self._run(check())
+
+    def read_write(self):
+        content = utils.make_random_data()
+        path = self._make_random_path()
+
+        async def check():
+            async with await aio.connect("default", 0) as fs:
+                async with await fs.open_file(path, "w") as f:
+                    self.assertEqual(await f.write(content), len(content))
+                async with await fs.open_file(path) as f:
+                    self.assertEqual(f.size, len(content))
+                    self.assertEqual(await f.read(3), content[:3])
+                    self.assertEqual(await f.tell(), 3)
+                    await f.seek(0)
+                    self.assertEqual(await f.read(), content)
+                    self.assertEqual(await f.pread(5, 4), content[5:9])
+                self.assertTrue(f.closed)
+            f = await aio.open(path)
+            try:
+                self.assertEqual(await f.read(), content)
+            finally:
+                await f.close()
+        self._run(check())
+
+    def iteration(self):
+        lines = [b"line %d\n" % i for i in range(1000)]
+        path = self._make_random_path()
+        hdfs.dump(b"".join(lines), path)
+
+        async def check():
+            async with await aio.open(path) as f:
+                self.assertEqual([_ async for _ in f], lines)
+                await f.seek(0)
+                chunks = [_ async for _ in f.chunks(100)]
+                self.assertEqual(b"".join(chunks), b"".join(lines))
+                self.assertEqual(len(chunks[0]), 100)
+            async with await aio.open(path, "rt") as f:
+                text = [_ async for _ in f.lines(7)]
+                self.assertEqual(text, [_.decode() for _ in lines])
+        self._run(check())
+
+    def concurrent_reads(self):
+        content = utils.make_random_data()
+        paths = [self._make_random_path() for _ in range(20)]
+        for p in paths:
+            hdfs.dump(content, p)
+
+        async def read(p):
+            async with await aio.open(p) as f:
+                return await f.read()
+
+        async def check():
+            data = await asyncio.gather(*[read(p) for p in paths])
+            self.assertEqual(data, [content] * len(paths))
+        self._run(check())
+
+
+def suite():
+    suite_ = unittest.TestSuite()
+    suite_.addTest(TestAio('connect'))
+    suite_.addTest(TestAio('read_write'))
+    suite_.addTest(TestAio('iteration'))
+    suite_.addTest(TestAio('concurrent_reads'))
+    return suite_
+
+
+if __name__ == '__main__':
+    _RUNNER = unittest.TextTestRunner(verbosity=2)
+    _RUNNER.run((suite()))
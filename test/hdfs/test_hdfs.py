@@ -97,10 +97,64 @@ class TestHDFS(unittest.TestCase):
 
     def lsl(self):
         self.__ls(hdfs.lsl, lambda x: x["name"])
+        fields = ("name", "size")
+        for wd in self.local_wd, self.hdfs_wd:
+            for recursive in False, True:
+                expected = [tuple(_[f] for f in fields)
+                            for _ in hdfs.lsl(wd, recursive=recursive)]
+                compact = hdfs.lsl(wd, recursive=recursive, fields=fields)
+                self.assertEqual(sorted(compact), sorted(expected))
 
     def ls(self):
         self.__ls(hdfs.ls, lambda x: x)
 
+    def glob(self):
+        for wd in self.local_wd, self.hdfs_wd:
+            expected = set()
+            for d in "2026-10-01", "2026-10-02", "2026-09-30":
+                for bn in "part-0", "part-1", "_SUCCESS":
+                    p = "%s/data/%s/%s" % (wd, d, bn)
+                    hdfs.dump(b"", p)
+                    if d.startswith("2026-10") and bn.startswith("part"):
+                        expected.add(p)
+            hdfs.dump(b"", "%s/data/2026-10-03" % wd)
+            pattern = "%s/data/2026-10-*/part-*" % wd
+            for workers in None, 2:
+                res = hdfs.glob(pattern, workers=workers)
+                self.assertEqual(len(res), len(expected))
+                self.assertEqual(
+                    set(hdfs.path.split(_)[2] for _ in res),
+                    set(hdfs.path.split(_)[2] for _ in expected)
+                )
+            literal = "%s/data/2026-10-03" % wd
+            self.assertEqual(len(hdfs.glob(literal)), 1)
+            self.assertEqual(hdfs.glob("%s/data/2026-10-03/*" % wd), [])
+            self.assertEqual(hdfs.glob("%s/nodata/*/part-*" % wd), [])
+            self.assertEqual(len(hdfs.glob("%s/data/*/_SUCCESS" % wd)), 3)
+
+    def metadata_cache(self):
+        hdfs.enable_metadata_cache(ttl=600)
+        try:
+            for wd in self.local_wd, self.hdfs_wd:
+                p = "%s/cached/%s" % (wd, UNI_CHR)
+                d = hdfs.path.dirname(p)
+                self.assertFalse(hdfs.path.exists(p))
+                self.assertEqual(hdfs.path.kind(d), None)
+                hdfs.dump(b"x", p)
+                self.assertTrue(hdfs.path.isdir(d))
+                self.assertEqual(hdfs.path.getsize(p), 1)
+                self.assertEqual(len(hdfs.ls(d)), 1)
+                hdfs.dump(b"xyz", p)
+                self.assertEqual(hdfs.path.getsize(p), 3)
+                hdfs.rename(p, p + "_2")
+                self.assertFalse(hdfs.path.exists(p))
+                self.assertEqual(hdfs.ls(d), hdfs.ls(p + "_2"))
+                hdfs.rm(d)
+                self.assertFalse(hdfs.path.exists(p + "_2"))
+                self.assertRaises(IOError, hdfs.ls, d)
+        finally:
+            hdfs.disable_metadata_cache()
+
     def mkdir(self):
         for wd in self.local_wd, self.hdfs_wd:
             d1 = "%s/d1" % wd
@@ -116,6 +170,27 @@ class TestHDFS(unittest.TestCase):
             rdata = hdfs.load(test_path)
             self.assertEqual(rdata, self.data)
 
+    def parallel_read(self):
+        # (dfs.namenode.fs-limits.min-block-size): 4096 < 1048576
+        bs = 1048576
+        data = make_random_data(3 * bs + 12345, printable=False)
+        for test_path in self.hdfs_paths[0], self.local_paths[0]:
+            hdfs.dump(data, test_path, mode="wb", blocksize=bs)
+            for workers in 1, 4:
+                chunks = list(hdfs.parallel_read(test_path, workers=workers))
+                self.assertEqual(b"".join(chunks), data)
+                if test_path.startswith("hdfs:"):
+                    self.assertEqual(len(chunks), 4)
+                buf = bytearray(len(data))
+                n = hdfs.parallel_read(test_path, workers=workers, buffer=buf)
+                self.assertEqual(n, len(data))
+                self.assertEqual(bytes(buf), data)
+            it = hdfs.parallel_read(test_path, workers=2)
+            self.assertEqual(next(it), chunks[0])
+            it.close()
+            self.assertRaises(ValueError, hdfs.parallel_read, test_path,
+                              buffer=bytearray(10))
+
     def __make_tree(self, wd, root="d1", create=True):
         """
         d1
@@ -190,6 +265,30 @@ class TestHDFS(unittest.TestCase):
             self.__cp_dir(wd)
             self.__cp_recursive(wd)
 
+    def parallel_cp(self):
+        for wd in self.local_wd, self.hdfs_wd:
+            src_t = self.__make_tree(wd)
+            copy_on_wd = "%s_copy" % src_t.name
+            stats = hdfs.cp(src_t.name, copy_on_wd, workers=3)
+            self.assertEqual(stats["files"], 2)
+            self.assertEqual(stats["bytes"], 2 * len(self.data))
+            exp_t = self.__make_tree(
+                wd, root=hdfs.path.basename(copy_on_wd), create=False
+            )
+            for t, exp_t in czip(src_t.walk(), exp_t.walk()):
+                self.assertTrue(hdfs.path.exists(exp_t.name))
+                if t.kind == 0:
+                    self.assertEqual(hdfs.load(exp_t.name), self.data)
+            self.assertRaises(IOError, hdfs.cp, src_t.name, wd, workers=3)
+        # get, with large files split into byte ranges
+        src = self.hdfs_paths[0]
+        dest = hdfs.path.split(self.local_paths[0])[-1]
+        hdfs.dump(self.data, src, mode="wb")
+        stats = hdfs.get(src, dest, workers=4, chunk_size=BUFSIZE)
+        self.assertEqual(stats["bytes"], len(self.data))
+        with open(dest, 'rb') as fi:
+            self.assertEqual(fi.read(), self.data)
+
     def put(self):
         src = hdfs.path.split(self.local_paths[0])[-1]
         dest = self.hdfs_paths[0]
@@ -374,9 +473,13 @@ def suite():
     suite_.addTest(TestHDFS("dump"))
     suite_.addTest(TestHDFS("lsl"))
     suite_.addTest(TestHDFS("ls"))
+    suite_.addTest(TestHDFS("glob"))
+    suite_.addTest(TestHDFS("metadata_cache"))
     suite_.addTest(TestHDFS("mkdir"))
     suite_.addTest(TestHDFS("load"))
+    suite_.addTest(TestHDFS("parallel_read"))
     suite_.addTest(TestHDFS("cp"))
+    suite_.addTest(TestHDFS("parallel_cp"))
     suite_.addTest(TestHDFS("put"))
     suite_.addTest(TestHDFS("get"))
     suite_.addTest(TestHDFS("rm"))
@@ -20,6 +20,7 @@ import unittest
 import getpass
 import os
 import socket
+import threading
 from itertools import product
 
 import pydoop.hdfs as hdfs
@@ -74,6 +75,29 @@ class TestConnection(unittest.TestCase):
             for fs in fs1, fs2:
                 self.assertTrue(fs.closed)
 
+    def session(self):
+        for host, port in self.hp_cases:
+            with hdfs.session():
+                with hdfs.session():
+                    with hdfs.hdfs(host, port) as fs1:
+                        pass
+                    self.assertFalse(fs1.closed)
+                    with hdfs.hdfs(host, port) as fs2:
+                        self.assertTrue(fs2.fs is fs1.fs)
+                    self.assertTrue(hdfs.path.exists(fs1.working_directory()))
+                self.assertFalse(fs1.closed)
+            self.assertTrue(fs1.closed)
+            # connections opened by other threads are not held
+            with hdfs.session():
+                other = []
+                t = threading.Thread(
+                    target=lambda: other.append(hdfs.hdfs(host, port))
+                )
+                t.start()
+                t.join()
+                other[0].close()
+                self.assertTrue(other[0].closed)
+
 
 class TestHDFS(TestCommon):
 
@@ -183,6 +207,48 @@ class TestHDFS(TestCommon):
         for i, L in enumerate(lines):
             self.assertEqual(L, line, "line %d: %r != %r" % (i, L, line))
 
+    def prefetch(self):
+        # small blocks, so that chunks cross block boundaries
+        bs = 1048576
+        content = u.make_random_data(3 * bs + 12345)
+        path = self._make_random_file(content=content, blocksize=bs)
+        for depth in 1, 4:
+            with self.fs.open_file(path, prefetch=depth) as f:
+                self.assertEqual(f.read(), content)
+                f.seek(bs - 5)
+                self.assertEqual(f.read(10), content[bs - 5: bs + 5])
+                self.assertEqual(f.tell(), bs + 5)
+                self.assertEqual(f.pread(7, 3), content[7: 10])
+                f.seek(0)
+                self.assertEqual(f.read(100), content[:100])
+            with self.fs.open_file(path, "rt", prefetch=depth) as f:
+                self.assertEqual(f.read(), content.decode())
+        with self.fs.open_file(path, prefetch=2) as f:
+            f.read(1)  # close with chunks still in flight
+
+    def background_write(self):
+        chunks = [u.make_random_data(n) for n in (1, 1000, 70000, 300000)]
+        content = b"".join(chunks * 10)
+        path = self._make_random_path()
+        # the largest chunk exceeds the limit and must go through alone
+        with self.fs.open_file(path, "w", max_inflight_bytes=100000) as f:
+            for c in chunks * 10:
+                self.assertEqual(f.write(c), len(c))
+            self.assertEqual(f.tell(), len(content))
+            f.flush()
+        self.assertEqual(f.size, len(content))
+        with self.fs.open_file(path) as f:
+            self.assertEqual(f.read(), content)
+        with self.fs.open_file(path, "a", max_inflight_bytes=4096) as f:
+            f.write(content)
+        with self.fs.open_file(path) as f:
+            self.assertEqual(f.read(), content + content)
+        text = u"a string\n" * 10000
+        with self.fs.open_file(path, "wt", max_inflight_bytes=4096) as f:
+            f.write(text)
+        with self.fs.open_file(path, "rt") as f:
+            self.assertEqual(f.read(), text)
+
     def get_hosts(self):
         # (dfs.namenode.fs-limits.min-block-size): 4096 < 1048576
         blocksize = 1048576
@@ -200,6 +266,7 @@ def suite():
     suite_ = unittest.TestSuite()
     suite_.addTest(TestConnection('connect'))
     suite_.addTest(TestConnection('cache'))
+    suite_.addTest(TestConnection('session'))
     tests = common_tests()
     if DEFAULT_FS.scheme == "hdfs":
         tests.extend([
@@ -212,6 +279,8 @@ def suite():
             'replication',
             'set_replication',
             'readline_block_boundary',
+            'prefetch',
+            'background_write',
             'get_hosts',
         ])
     for t in tests:
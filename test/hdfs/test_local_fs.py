@@ -22,6 +22,7 @@ import tempfile
 import os
 
 import pydoop.hdfs as hdfs
+import pydoop.test_utils as utils
 from common_hdfs_tests import TestCommon, common_tests
 
 
@@ -44,11 +45,34 @@ class TestLocalFS(TestCommon):
     def __init__(self, target):
         TestCommon.__init__(self, target, '', 0)
 
+    def mmap(self):
+        content = utils.make_random_data()
+        path = self._make_random_file(content=content)
+        with self.fs.open_file(path, mmap=True) as f:
+            self.assertEqual(f.pread(3, 10), content[3:13])
+            self.assertEqual(f.pread(3, -1), content[3:])
+            chunk = bytearray(10)
+            self.assertEqual(f.pread_chunk(len(content) - 4, chunk), 4)
+            self.assertEqual(bytes(chunk[:4]), content[-4:])
+            self.assertEqual(f.read(5), content[:5])
+            self.assertEqual(f.tell(), 5)
+            buf = f.as_buffer()
+            self.assertEqual(len(buf), len(content))
+            head = buf[:10]
+        self.assertEqual(bytes(head), content[:10])
+        with self.fs.open_file(path) as f:
+            self.assertEqual(bytes(f.as_buffer()), content)
+        for mode in "rt", "w":
+            self.assertRaises(
+                ValueError, self.fs.open_file, path, mode, mmap=True
+            )
+
 
 def suite():
     suite_ = unittest.TestSuite()
     suite_.addTest(TestConnection('runTest'))
     tests = common_tests()
+    tests.append('mmap')
     for t in tests:
         suite_.addTest(TestLocalFS(t))
     return suite_
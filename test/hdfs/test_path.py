@@ -399,6 +399,26 @@ class TestStat(unittest.TestCase):
                 self.assertEqual(attr, 0)
         hdfs.rm(wd)
 
+    def stat_many(self):
+        if hdfs.default_is_local():
+            wd = tempfile.mkdtemp(prefix='pydoop_', suffix=UNI_CHR)
+        else:
+            wd = make_random_str() + UNI_CHR
+            hdfs.mkdir(wd)
+        paths = [hdfs.path.join(wd, make_random_str()) for _ in range(3)]
+        for i, p in enumerate(paths):
+            hdfs.dump(b"x" * i, p)
+        missing = hdfs.path.join(wd, make_random_str())
+        res = hdfs.path.stat_many(paths + [missing, wd])
+        self.assertEqual(len(res), len(paths) + 2)
+        for p, s in zip(paths, res):
+            self.assertEqual(s.st_size, hdfs.path.stat(p).st_size)
+            self.assertEqual(s.kind, 'file')
+        self.assertTrue(isinstance(res[-2], IOError))
+        self.assertEqual(res[-1].kind, 'directory')
+        self.assertEqual(hdfs.path.stat_many([]), [])
+        hdfs.rm(wd)
+
     def __check_extra_args(self, stat_res, path_info):
         for n in 'kind', 'name', 'replication':
             attr = getattr(stat_res, '%s' % n, None)
@@ -573,6 +593,7 @@ def suite():
     suite_.addTest(TestStat('stat'))
     suite_.addTest(TestStat('stat_on_local'))
     suite_.addTest(TestStat('stat_on_dir'))
+    suite_.addTest(TestStat('stat_many'))
     suite_.addTest(TestIsSomething('full_and_abs'))
     suite_.addTest(TestIsSomething('islink'))
     suite_.addTest(TestIsSomething('ismount'))
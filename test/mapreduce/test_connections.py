@@ -36,12 +36,55 @@ class Mapper(api.Mapper):
         context.emit(context.key, context.value)
 
 
+class BatchMapper(api.Mapper):
+
+    def map(self, context):
+        raise RuntimeError("map called in batch mode")
+
+    def map_batch(self, context):
+        assert len(context.keys) == len(context.values)
+        context.emit_many(zip(context.keys, context.values))
+
+
+class ViewMapper(api.Mapper):
+
+    def map(self, context):
+        assert isinstance(context.key, memoryview)
+        assert isinstance(context.value, memoryview)
+        context.emit(len(context.key), context.value.tobytes())
+
+
+class WordCountMapper(api.Mapper):
+
+    def map(self, context):
+        for w in context.value.split():
+            context.emit(w, 1)
+
+
 class Reducer(api.Reducer):
 
     def reduce(self, context):
         context.emit(context.key, sum(context.values))
 
 
+class FirstValueReducer(api.Reducer):
+
+    def reduce(self, context):
+        context.emit(context.key, next(context.values))
+
+
+class ArrayReducer(api.Reducer):
+
+    def reduce(self, context):
+        context.emit(context.key, len(context.values_array()))
+
+
+class FoldCombiner(Reducer):
+
+    def fold(self, acc, value):
+        return acc + value
+
+
 # move to test_utils?
 class UplinkDumpReader(object):
 
@@ -86,10 +129,63 @@ class TestFileConnection(WDTestCase):
         factory = pipes.Factory(Mapper)
         self.__run_test(M_NAME, factory, private_encoding=False)
 
+    def test_map_batch(self):
+        factory = pipes.Factory(BatchMapper)
+        self.__run_test(M_NAME, factory, private_encoding=False)
+
+    def test_map_zero_copy(self):
+        factory = pipes.Factory(ViewMapper)
+        self.__run_test(
+            M_NAME, factory, private_encoding=False, raw_keys=True,
+            raw_values=True, zero_copy=True
+        )
+
+    def test_map_combiner(self):
+        for cclass in Reducer, FoldCombiner:
+            factory = pipes.Factory(
+                WordCountMapper, reducer_class=Reducer, combiner_class=cclass
+            )
+            self.__run_test(M_NAME, factory)
+
+    def test_map_aggregate(self):
+        factory = pipes.Factory(
+            WordCountMapper, reducer_class=Reducer, aggregate="sum"
+        )
+        self.__run_test(M_NAME, factory)
+
     def test_reduce(self):
         factory = pipes.Factory(Mapper, reducer_class=Reducer)
         self.__run_test(R_NAME, factory)
 
+    def test_reduce_chunks(self):
+        for rclass in Reducer, FirstValueReducer, ArrayReducer:
+            factory = pipes.Factory(Mapper, reducer_class=rclass)
+            self.__run_test(R_NAME, factory, reduce_chunk_size=3)
+
+    def test_profile_phases(self):
+        factory = pipes.Factory(
+            WordCountMapper, reducer_class=Reducer, aggregate="sum"
+        )
+        counters = self.__run_test(M_NAME, factory, profile_phases=True)
+        for phase in "DESERIALIZE", "MAP", "SERIALIZE", "WRITE", "COMBINE":
+            self.assertIn("%s_WALL (ms)" % phase, counters)
+        factory = pipes.Factory(Mapper, reducer_class=Reducer)
+        counters = self.__run_test(R_NAME, factory, profile_phases=True)
+        for phase in "DESERIALIZE", "REDUCE", "WRITE", "OTHER":
+            self.assertIn("%s_CPU (ms)" % phase, counters)
+
+    def test_map_codec(self):
+        factory = pipes.Factory(
+            WordCountMapper, reducer_class=Reducer, aggregate="sum"
+        )
+        self.__run_test(M_NAME, factory, private_encoding="marshal")
+        self.__run_test(M_NAME, factory, private_key_encoding="ordered")
+        with self.assertRaises(ValueError):
+            self.__run_test(M_NAME, factory, private_encoding="foo")
+        # codecs are not looked up when private encoding is off
+        self.__run_test(M_NAME, pipes.Factory(Mapper), private_encoding=False,
+                        private_key_encoding="foo")
+
     def __run_test(self, name, factory, **kwargs):
         orig_path = os.path.join(THIS_DIR, name)
         cmd_path = os.path.join(self.wd, name)
@@ -100,14 +196,28 @@ class TestFileConnection(WDTestCase):
         out_cmd_path = "%s.out" % cmd_path
         self.assertTrue(os.path.exists(out_cmd_path))
         with sercore.FileInStream(out_cmd_path) as stream:
-            out_cmds = set(cmd for cmd, _ in UplinkDumpReader(stream))
-        self.assertEqual(out_cmds, {bp.OUTPUT, bp.PROGRESS})
+            out = list(UplinkDumpReader(stream))
+        out_cmds = set(cmd for cmd, _ in out)
+        expected = {bp.OUTPUT, bp.PROGRESS}
+        if kwargs.get("profile_phases"):
+            expected |= {bp.REGISTER_COUNTER, bp.INCREMENT_COUNTER}
+        self.assertEqual(out_cmds, expected)
+        return set(
+            args[2] for cmd, args in out if cmd == bp.REGISTER_COUNTER
+        )
 
 
 def suite():
     suite_ = unittest.TestSuite()
     suite_.addTest(TestFileConnection('test_map'))
+    suite_.addTest(TestFileConnection('test_map_batch'))
+    suite_.addTest(TestFileConnection('test_map_zero_copy'))
+    suite_.addTest(TestFileConnection('test_map_combiner'))
+    suite_.addTest(TestFileConnection('test_map_aggregate'))
     suite_.addTest(TestFileConnection('test_reduce'))
+    suite_.addTest(TestFileConnection('test_reduce_chunks'))
+    suite_.addTest(TestFileConnection('test_map_codec'))
+    suite_.addTest(TestFileConnection('test_profile_phases'))
     return suite_
 
 
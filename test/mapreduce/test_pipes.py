@@ -0,0 +1,342 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright 2009-2024 CRS4.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import operator
+import os
+import tempfile
+import time
+import unittest
+
+import pydoop.mapreduce.api as api
+import pydoop.mapreduce.codec as codec
+import pydoop.mapreduce.pipes as pipes
+from pydoop.mapreduce.pipes import CombinerCache
+from pydoop.mapreduce.profiling import (
+    PhaseTimer, StackSampler, PHASE_COUNTER_GROUP, dump_stacks, load_stacks
+)
+
+UNI_CHR = u'\N{CYRILLIC CAPITAL LETTER O WITH DIAERESIS}'
+
+
+class TestCombinerCache(unittest.TestCase):
+
+    PAIRS = [("b", 1), ("a", 2), ("b", 3), ("c", 4), ("a", 5)]
+
+    def test_append(self):
+        cache = CombinerCache(1 << 20)
+        for k, v in self.PAIRS:
+            self.assertFalse(cache.add(k, v))
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(
+            list(cache.items()), [("a", [2, 5]), ("b", [1, 3]), ("c", [4])]
+        )
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_fold(self):
+        cache = CombinerCache(1 << 20, fold=operator.add)
+        for k, v in self.PAIRS:
+            cache.add(k, v)
+        self.assertEqual(
+            list(cache.items()), [("a", [7]), ("b", [4]), ("c", [4])]
+        )
+
+    def test_no_sort(self):
+        cache = CombinerCache(1 << 20, sort=False)
+        for k, v in self.PAIRS:
+            cache.add(k, v)
+        self.assertEqual([k for k, _ in cache.items()], ["b", "a", "c"])
+
+    def test_size(self):
+        cache = CombinerCache(1 << 20)
+        cache.add("a", 1)
+        size = cache.size
+        cache.add("a", 1)
+        # the key is only charged once
+        self.assertTrue(cache.size - size < size)
+        fold_cache = CombinerCache(1 << 20, fold=operator.add)
+        fold_cache.add("a", 1)
+        size = fold_cache.size
+        for _ in range(100):
+            fold_cache.add("a", 1)
+        self.assertEqual(fold_cache.size, size)
+        small_cache = CombinerCache(1)
+        self.assertTrue(small_cache.add("a", 1))
+
+
+class TestAggregators(unittest.TestCase):
+
+    PAIRS = [("b", 1), ("a", 2), ("b", 3), ("c", 4), ("a", 5)]
+
+    def __aggregate(self, aggregator):
+        combiner = pipes.AggregatingCombiner(None, aggregator)
+        cache = CombinerCache(1 << 20, fold=combiner.fold,
+                              start=combiner.start)
+        for k, v in self.PAIRS:
+            cache.add(k, v)
+        return [(k, v) for k, (v,) in cache.items()]
+
+    def test_builtin(self):
+        exp_res = {
+            "sum": [("a", 7), ("b", 4), ("c", 4)],
+            "min": [("a", 2), ("b", 1), ("c", 4)],
+            "max": [("a", 5), ("b", 3), ("c", 4)],
+            "count": [("a", 2), ("b", 2), ("c", 1)],
+        }
+        for name, cls in pipes.AGGREGATORS.items():
+            self.assertEqual(self.__aggregate(cls()), exp_res[name])
+
+    def test_custom(self):
+
+        class Concat(api.Aggregator):
+
+            def start(self, value):
+                return str(value)
+
+            def fold(self, acc, value):
+                return "%s,%s" % (acc, value)
+
+        self.assertEqual(
+            self.__aggregate(Concat()),
+            [("a", "2,5"), ("b", "1,3"), ("c", "4")]
+        )
+
+    def test_inline(self):
+        exp_res = {
+            "sum": [("a", 7), ("b", 4), ("c", 4)],
+            "count": [("a", 2), ("b", 2), ("c", 1)],
+        }
+        for name, exp in exp_res.items():
+            combiner = pipes.Factory(
+                None, aggregate=name
+            ).create_combiner(None)
+            cache = CombinerCache(1 << 20, fold=combiner.fold,
+                                  start=combiner.start)
+            self.assertEqual(
+                cache.add, getattr(cache, "_CombinerCache__add_%s" % name)
+            )
+            for k, v in self.PAIRS:
+                cache.add(k, v)
+            self.assertEqual([(k, v) for k, (v,) in cache.items()], exp)
+        combiner = pipes.Factory(None, aggregate="max").create_combiner(None)
+        cache = CombinerCache(1 << 20, fold=combiner.fold,
+                              start=combiner.start)
+        self.assertEqual(cache.add, cache._CombinerCache__add_fold)
+
+    def test_factory(self):
+        factory = pipes.Factory(None, aggregate="sum")
+        combiner = factory.create_combiner(None)
+        self.assertTrue(isinstance(combiner, pipes.AggregatingCombiner))
+        self.assertTrue(combiner.fold is operator.add)
+        aggregator = pipes.MaxAggregator()
+        factory = pipes.Factory(None, aggregate=aggregator)
+        self.assertTrue(factory.aggregator is aggregator)
+        self.assertRaises(ValueError, pipes.Factory, None, aggregate="foo")
+        self.assertRaises(ValueError, pipes.Factory, None, aggregate=max)
+        self.assertRaises(
+            ValueError, pipes.Factory, None,
+            combiner_class=api.Combiner, aggregate="sum"
+        )
+
+
+class TestCodecs(unittest.TestCase):
+
+    OBJECTS = [1, -2**40, 3.14, u"foo", b"bar", (1, u"a"), [1, 2], {"a": 1}]
+
+    def test_builtin(self):
+        for name in "pickle", "marshal", "ordered":
+            c = codec.get_codec(name)
+            objects = self.OBJECTS[:-2] if name == "ordered" else self.OBJECTS
+            for obj in objects:
+                data = c.dumps(obj)
+                self.assertTrue(isinstance(data, bytes))
+                self.assertEqual(c.loads(data), obj)
+
+    def test_ordered(self):
+        c = codec.get_codec("ordered")
+        groups = [
+            [-2**63, -100, -1, 0, 1, 7, 100, 2**63 - 1],
+            [float("-inf"), -1e10, -0.5, 0.0, 1e-300, 2.5, float("inf")],
+            [b"", b"\x00", b"\x00\x00", b"\x00a", b"a", b"a\x00", b"ab"],
+            [u"", u"a", u"a\x00", u"ab", u"b", UNI_CHR],
+            [(), (u"a",), (u"a", -1), (u"a", 1), (u"a\x00",), (u"b",)],
+            [(1, (u"a", b"b")), (1, (u"a", b"c")), (2, (u"", b""))],
+        ]
+        for objects in groups:
+            encoded = [c.dumps(_) for _ in objects]
+            self.assertEqual(sorted(encoded), encoded)
+            self.assertEqual([c.loads(_) for _ in encoded], objects)
+        self.assertRaises(TypeError, c.dumps, [1])
+        self.assertRaises(OverflowError, c.dumps, 2**64)
+        for data in b"", b"\x02\x00", b"\x05ab", b"\x06\x02", b"\xf0":
+            self.assertRaises(ValueError, c.loads, data)
+        self.assertRaises(ValueError, c.loads, c.dumps(1) + b"\x00")
+
+    def test_registry(self):
+
+        class ReprCodec(codec.Codec):
+            dumps = staticmethod(lambda obj: repr(obj).encode("utf-8"))
+            loads = staticmethod(lambda data: eval(data.decode("utf-8")))
+
+        c = ReprCodec()
+        codec.register_codec("repr", c)
+        try:
+            self.assertTrue(codec.get_codec("repr") is c)
+        finally:
+            del codec.CODECS["repr"]
+        self.assertRaises(ValueError, codec.get_codec, "repr")
+        self.assertRaises(TypeError, codec.register_codec, "foo", object())
+
+
+class CounterContext(object):
+
+    def __init__(self):
+        self.counters = {}
+
+    def get_counter(self, group, name):
+        self.counters[(group, name)] = 0
+        return group, name
+
+    def increment_counter(self, counter, amount):
+        self.counters[counter] += amount
+
+
+class TestPhaseTimer(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = PhaseTimer()
+        self.inner = self.timer.wrap("inner", lambda: time.sleep(0.05))
+
+    def __outer(self):
+        time.sleep(0.01)
+        self.inner()
+        self.inner()
+
+    def test_nested(self):
+        outer = self.timer.wrap("outer", self.__outer)
+        outer()
+        summary = self.timer.summary()
+        self.assertEqual(set(summary), {"inner", "outer", "other"})
+        self.assertEqual(summary["inner"]["calls"], 2)
+        self.assertEqual(summary["outer"]["calls"], 1)
+        self.assertGreaterEqual(summary["inner"]["wall"], 0.1)
+        self.assertLess(summary["outer"]["wall"], 0.05)
+
+    def test_error(self):
+        def fail():
+            raise RuntimeError
+        fail = self.timer.wrap("fail", fail)
+        self.assertRaises(RuntimeError, fail)
+        self.assertEqual(self.timer.summary()["fail"]["calls"], 1)
+
+    def test_wrap_methods(self):
+        class Foo(object):
+            def bar(self):
+                return 1
+        foo = Foo()
+        self.timer.wrap_methods(foo, "bar", "bar", "baz")
+        self.timer.wrap_methods(None, "bar", "bar")
+        self.assertEqual(foo.bar(), 1)
+        self.assertEqual(self.timer.summary()["bar"]["calls"], 1)
+        self.assertEqual(Foo().bar(), 1)
+        self.assertEqual(self.timer.summary()["bar"]["calls"], 1)
+
+    def test_report(self):
+        self.inner()
+        ctx = CounterContext()
+        self.timer.report(ctx)
+        self.assertEqual(set(ctx.counters), set(
+            (PHASE_COUNTER_GROUP, "%s_%s (ms)" % (p, k))
+            for p in ("INNER", "OTHER") for k in ("WALL", "CPU")
+        ))
+        self.assertGreaterEqual(
+            ctx.counters[(PHASE_COUNTER_GROUP, "INNER_WALL (ms)")], 50
+        )
+
+    def test_env(self):
+        old = os.environ.pop(pipes.PROFILE_PHASES, None)
+        try:
+            self.assertIsNone(pipes.TaskContext(None)._phase_timer)
+            for v in "1", "true", "True", "yes", "0", "false", "":
+                os.environ[pipes.PROFILE_PHASES] = v
+                ctx = pipes.TaskContext(None)
+                enabled = v.lower() in ("1", "true", "yes")
+                self.assertEqual(ctx._phase_timer is not None, enabled)
+        finally:
+            if old is None:
+                os.environ.pop(pipes.PROFILE_PHASES, None)
+            else:
+                os.environ[pipes.PROFILE_PHASES] = old
+
+
+def busy(t):
+    end = time.time() + t
+    while time.time() < end:
+        pass
+
+
+class TestStackSampler(unittest.TestCase):
+
+    def test_sample(self):
+        with StackSampler(0.005) as sampler:
+            busy(0.2)
+        stacks = sampler.collapsed()
+        self.assertTrue(stacks)
+        self.assertTrue(any(
+            "test_sample (test_pipes.py" in k and "busy (test_pipes.py" in k
+            for k in stacks
+        ))
+        n = sum(stacks.values())
+        busy(0.05)  # sampler is stopped
+        self.assertEqual(sum(sampler.collapsed().values()), n)
+
+    def test_dump_load(self):
+        counts = {"a;b": 2, "a;c d (x.py:1)": 1}
+        with tempfile.TemporaryFile("w+") as f:
+            dump_stacks(counts, f)
+            f.seek(0)
+            self.assertEqual(load_stacks(f), counts)
+            f.seek(0)
+            dumped = f.read()
+        merged = load_stacks(dumped.splitlines(), {"a;b": 1, "e": 3})
+        self.assertEqual(merged, {"a;b": 3, "a;c d (x.py:1)": 1, "e": 3})
+
+    def test_bad_interval(self):
+        self.assertRaises(ValueError, StackSampler, 0)
+
+
+CASES = [
+    TestCombinerCache,
+    TestAggregators,
+    TestCodecs,
+    TestPhaseTimer,
+    TestStackSampler,
+]
+
+
+def suite():
+    ret = unittest.TestSuite()
+    test_loader = unittest.TestLoader()
+    for c in CASES:
+        ret.addTest(test_loader.loadTestsFromTestCase(c))
+    return ret
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run((suite()))
@@ -25,7 +25,9 @@ import unittest
 import uuid
 from random import randint
 
-from pydoop.mapreduce.binary_protocol import OUTPUT, PARTITIONED_OUTPUT
+from pydoop.mapreduce.binary_protocol import (
+    CLOSE, MAP_ITEM, OUTPUT, PARTITIONED_OUTPUT, REDUCE_KEY, REDUCE_VALUE
+)
 import pydoop.sercore as sercore
 
 INT64_MIN = -2**63
@@ -134,6 +136,25 @@ class TestSerDe(unittest.TestCase):
         with sercore.FileInStream(self.fname) as s:
             self.assertAlmostEqual(s.read_float(), self.FLOAT, 3)
 
+    def test_bytes_view(self):
+        data = [self.BYTES, b"", 100 * self.BYTES, self.BYTES]
+        with sercore.FileOutStream(self.fname) as s:
+            for d in data:
+                s.write_bytes(d)
+                s.write_bytes(d[::-1])
+        with sercore.FileInStream(self.fname) as s:
+            old_k = None
+            for d in data:
+                k, v = s.read_bytes_view(), s.read_bytes_view(1)
+                self.assertTrue(isinstance(k, memoryview))
+                self.assertEqual(k.tobytes(), d)
+                self.assertEqual(v.tobytes(), d[::-1])
+                if old_k is not None:
+                    old_k.tobytes()  # still safe to access
+                old_k = k
+            self.assertRaises(ValueError, s.read_bytes_view, 2)
+            self.assertRaises(IOError, s.read_bytes_view)
+
     def test_string_as_string(self):
         with sercore.FileOutStream(self.fname) as s:
             s.write_string(self.STRING)
@@ -175,6 +196,68 @@ class TestSerDe(unittest.TestCase):
             self.assertEqual(s.read_bytes(), k)
             self.assertEqual(s.read_bytes(), v)
 
+    def test_outputs(self):
+        keys, values = [b"k0", b"k1"], [b"v0", b""]
+        parts = [1, 0]
+        with sercore.FileOutStream(self.fname) as s:
+            s.write_outputs(keys, values)
+            s.write_outputs(keys, values, parts)
+        with sercore.FileInStream(self.fname) as s:
+            for k, v in zip(keys, values):
+                self.assertEqual(s.read_tuple("ibb"), (OUTPUT, k, v))
+            for p, k, v in zip(parts, keys, values):
+                self.assertEqual(
+                    s.read_tuple("iibb"), (PARTITIONED_OUTPUT, p, k, v)
+                )
+        with sercore.FileOutStream(self.fname) as s:
+            self.assertRaises(ValueError, s.write_outputs, keys, values[:1])
+            self.assertRaises(ValueError, s.write_outputs, keys, values, [0])
+            self.assertRaises(TypeError, s.write_outputs, keys, [u"x", 1])
+            self.assertRaises(TypeError, s.write_outputs, 1, 2)
+
+    def test_map_items(self):
+        keys = [struct.pack(">q", _) for _ in range(5)]
+        values = [u"v%d%s" % (_, UNI_CHR) for _ in range(5)]
+        with sercore.FileOutStream(self.fname) as s:
+            for k, v in zip(keys, values):
+                s.write_tuple("ibs", (MAP_ITEM, k, v))
+            s.write_vint(CLOSE)
+        with sercore.FileInStream(self.fname) as s:
+            self.assertEqual(s.read_vint(), MAP_ITEM)
+            self.assertEqual(s.read_map_items(2), (keys[:2], [
+                _.encode("utf-8") for _ in values[:2]
+            ]))
+            self.assertEqual(s.read_vint(), MAP_ITEM)
+            self.assertEqual(
+                s.read_map_items(10, "Ls"), (list(range(2, 5)), values[2:])
+            )
+            self.assertEqual(s.read_vint(), CLOSE)
+        with sercore.FileInStream(self.fname) as s:
+            self.assertEqual(s.read_vint(), MAP_ITEM)
+            self.assertRaises(ValueError, s.read_map_items, 0)
+            self.assertRaises(ValueError, s.read_map_items, 1, "b")
+            self.assertRaises(ValueError, s.read_map_items, 1, "bx")
+            self.assertRaises(IOError, s.read_map_items, 1, "sL")
+
+    def test_reduce_values(self):
+        values = [b"v%d" % _ for _ in range(5)]
+        with sercore.FileOutStream(self.fname) as s:
+            s.write_tuple("ib", (REDUCE_KEY, b"k0"))
+            for v in values:
+                s.write_tuple("ib", (REDUCE_VALUE, v))
+            s.write_tuple("ib", (REDUCE_KEY, b"k1"))
+            s.write_vint(CLOSE)
+        with sercore.FileInStream(self.fname) as s:
+            self.assertEqual(s.read_reduce_values(1), [])
+            self.assertEqual(s.read_tuple("ib"), (REDUCE_KEY, b"k0"))
+            self.assertEqual(s.read_reduce_values(3), values[:3])
+            self.assertEqual(s.read_reduce_values(3), values[3:])
+            self.assertEqual(s.read_reduce_values(3), [])
+            self.assertEqual(s.read_tuple("ib"), (REDUCE_KEY, b"k1"))
+            self.assertEqual(s.read_reduce_values(3), [])
+            self.assertEqual(s.read_vint(), CLOSE)
+            self.assertRaises(ValueError, s.read_reduce_values, 0)
+
     def test_multi_no_tuple(self):
         self.__fill_stream_multi()
         self.__check_stream_multi()
@@ -269,6 +352,8 @@ class TestCheckClosed(unittest.TestCase):
             (stream.read_vlong, ()),
             (stream.read_float, ()),
             (stream.read_string, ()),
+            (stream.read_bytes_view, ()),
+            (stream.read_reduce_values, (1,)),
             (stream.read_tuple, ("ii")),
             (stream.skip, (1,)),
         )